@@ -2,6 +2,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 
+from core.sqlite import bases_sqlite
+
 # Cargar variables desde el archivo .env
 load_dotenv()
 
@@ -32,6 +34,12 @@ MEDIA_ROOT = BASE_DIR / 'media'
 STATIC_URL = 'static/'
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Sirve STATIC_ROOT sin nginx delante (se desactiva con DEBUG; core/static_assets.py)
+    'core.static_assets.ServidorEstaticos',
+    # Server-Timing, log JSON y peticiones lentas para el staff (core/perf.py)
+    'core.perf.MedicionMiddleware',
+    # Antes de sessions: guardar la sesión también cuenta como escritura (core/routers.py)
+    'core.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -44,7 +52,8 @@ ROOT_URLCONF = 'akua.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mide el tiempo de render de cada petición (core/perf.py)
+        'BACKEND': 'core.perf.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -61,11 +70,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'akua.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Perfil de SQLite para producción (core/sqlite.py): WAL, pragmas, CONN_MAX_AGE y
+# un alias 'readonly' para las vistas de solo lectura. Con DEBUG queda la configuración
+# de Django; SQLITE_TUNING=1/0 lo fuerza.
+SQLITE = {
+    'ENABLED': os.getenv('SQLITE_TUNING', '0' if DEBUG else '1') == '1',
+    'SYNCHRONOUS': 'NORMAL',
+    'CACHE_SIZE_KB': 64 * 1024,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'TIMEOUT': 10,                  # segundos esperando el candado antes de "database is locked"
+    'CONN_MAX_AGE': 600,
+    'READONLY': True,
+    # Réplicas locales de prueba: SQLITE_REPLICAS=/tmp/r1.sqlite3,/tmp/r2.sqlite3
+    # (se copian con manage.py sync_sqlite_replicas)
+    'REPLICAS': [r for r in os.getenv('SQLITE_REPLICAS', '').split(',') if r],
+}
+DATABASES = bases_sqlite(BASE_DIR / 'db.sqlite3', SQLITE)
+
+# Lecturas de las vistas de solo lectura en réplicas (core/routers.py). Tras escribir,
+# el navegador lee de 'default' durante MAX_LAG segundos (retraso de replicación tolerado).
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'MAX_LAG': int(os.getenv('REPLICA_MAX_LAG', '5')),
 }
 
 # Password validation
@@ -109,9 +136,173 @@ STATICFILES_DIRS = [
 # Donde Django pondrá todos los estáticos cuando corras collectstatic (deploy)
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# 'fotos': las fotos subidas se nombran por el hash de su contenido y no se duplican (core/storage.py)
+# 'staticfiles': en producción, nombres con hash + .gz/.br generados en collectstatic (core/static_assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'core.static_assets.CompressedManifestStaticFilesStorage',
+    },
+    'fotos': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cachés de respuestas de IA (core/ai_cache.py)
+# BACKEND: 'memory' (por proceso), 'file' (LOCATION) o 'database' (tabla core_cachedresult)
+# Con ROUTE_JOBS['RUNNER'] = 'worker' las rutas necesitan 'file' o 'database' (check core.W001)
+AI_CACHES = {
+    'rutas': {
+        'BACKEND': os.getenv('AI_ROUTE_CACHE_BACKEND', 'memory'),
+        'TTL': 60 * 60 * 24,
+        'MAX_ENTRIES': 500,
+        'LOCATION': BASE_DIR / 'cache' / 'ai',
+    },
+    # Resúmenes de SerpAPI: TTL = edad máxima de una copia vieja (stale)
+    'busquedas': {
+        'BACKEND': os.getenv('AI_SEARCH_CACHE_BACKEND', 'memory'),
+        'TTL': 60 * 60 * 24 * 7,
+        'MAX_ENTRIES': 2000,
+        'LOCATION': BASE_DIR / 'cache' / 'ai',
+    },
+    # Embeddings de las búsquedas de TripItem (core/embeddings.py: embed_consultas)
+    'consultas': {
+        'BACKEND': os.getenv('AI_QUERY_CACHE_BACKEND', 'memory'),
+        'TTL': 60 * 60 * 24 * 30,
+        'MAX_ENTRIES': 5000,
+        'LOCATION': BASE_DIR / 'cache' / 'ai',
+    },
+}
+
+# Búsqueda web para el contexto de las rutas (core/web_search.py)
+# BACKEND: 'serpapi' o 'stub' (resultados fijos sin red, para tests)
+WEB_SEARCH = {
+    'BACKEND': os.getenv('WEB_SEARCH_BACKEND', 'serpapi'),
+    'TIMEOUT': 6,                # segundos que una ruta espera una búsqueda sin caché
+    'FRESH_TTL': 60 * 60 * 24,   # después de esto se sirve la copia y se refresca en segundo plano
+}
+
+# Contexto local de las rutas: lugares y experiencias de la base (core/retrieval.py).
+# Si cubren al menos MIN_ITEMS recomendaciones (e ITEMS_PER_DAY por día) no se busca en la web.
+LOCAL_CONTEXT = {
+    'ENABLED': True,
+    'TOKEN_BUDGET': 1200,
+    'MIN_ITEMS': 6,
+    'ITEMS_PER_DAY': 3,
+}
+
+# Modelo de lenguaje para las rutas (core/itinerary.py)
+# BACKEND: 'openai' o 'stub' (respuesta fija sin red, para tests y benchmarks)
+AI_MODEL = {
+    'BACKEND': os.getenv('AI_MODEL_BACKEND', 'openai'),
+}
+
+# Peticiones de ruta idénticas y simultáneas comparten una sola llamada (core/singleflight.py)
+# CROSS_PROCESS: None (solo hilos del mismo proceso), 'file' o 'database'.
+# Entre procesos requiere que la caché 'rutas' sea compartida ('file' o 'database').
+SINGLE_FLIGHT = {
+    'CROSS_PROCESS': os.getenv('SINGLE_FLIGHT_LOCK') or None,
+    'LOCK_TIMEOUT': 120,
+    'LOCATION': BASE_DIR / 'cache' / 'locks',
+}
+
+# Cola de generación de rutas (core/jobs.py)
+# RUNNER: 'thread' (pool de hilos en el proceso web), 'worker' (manage.py run_route_worker)
+# o 'asyncio' (tareas en el event loop; solo al servir con ASGI, p. ej. uvicorn akua.asgi:application)
+ROUTE_JOBS = {
+    'RUNNER': os.getenv('ROUTE_JOBS_RUNNER', 'thread'),
+    'WORKERS': 4,
+    'STALE_AFTER': 60 * 10,  # segundos antes de reencolar un trabajo 'running' abandonado
+}
+
+# Embeddings de texto para "experiencias similares" (core/embeddings.py)
+# BACKEND: 'openai' o 'local' (vectores deterministas sin red, para tests y desarrollo)
+AI_EMBEDDINGS = {
+    'BACKEND': os.getenv('AI_EMBEDDINGS_BACKEND', 'openai'),
+    'MODEL': 'text-embedding-3-small',
+    'BATCH_SIZE': 100,   # manage.py backfill_embeddings: textos por petición
+    'CONCURRENCY': 4,    # y peticiones simultáneas
+}
+
+# Índice vectorial de TripItem (core/vectors.py)
+# BACKEND: 'exact' (fuerza bruta) o 'ivf' (aproximado, core/ann.py, para catálogos grandes).
+# LOCATION: carpeta donde se guarda el índice para abrirlo con mmap desde todos los procesos;
+# None lo construye en la memoria de cada proceso.
+VECTOR_INDEX = {
+    'BACKEND': os.getenv('VECTOR_INDEX_BACKEND', 'exact'),
+    'LOCATION': BASE_DIR / 'cache' / 'vectors',
+    'NPROBE': 8,   # solo IVF: listas revisadas por consulta (más = mejor recall, más lento)
+}
+
+# Miniaturas AVIF/WebP/JPEG de las fotos de lugares y perfiles (core/images.py).
+# Se generan al subir la foto; las que falten, con manage.py generate_image_derivatives.
+IMAGE_DERIVATIVES = {
+    'FORMATS': ['avif', 'webp', 'jpeg'],
+    'WORKERS': 2,   # hilos para generar en segundo plano al subir
+}
+
+# Servidor de estáticos dentro de la app (core/static_assets.py). Requiere collectstatic.
+# Con nginx/CDN delante se puede desactivar; en DEBUG sirve runserver.
+STATIC_SERVER = {
+    'ENABLED': not DEBUG,
+    'MAX_AGE': 60,   # segundos para archivos sin hash (los con hash: un año, immutable)
+}
+
+# Caché compartida por todos los procesos (workers, comandos de gestión, run_route_worker):
+# la caché de páginas guarda ahí las versiones de sus etiquetas y una invalidación tiene que
+# llegar a todos. En disco por defecto; con varios servidores, p. ej.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://...
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache' / 'django')),
+    }
+}
+
+# Caché de index, places y place_detail (y de sus fragmentos) con claves versionadas;
+# se invalida al guardar lugares y reseñas (core/page_cache.py). Métricas en cache/paginas/.
+# No se activa con una caché por proceso (LocMemCache): las invalidaciones no llegarían
+# a los demás procesos.
+PAGE_CACHE = {
+    'ENABLED': True,
+    'TTL': 60 * 10,
+    'FRAGMENT_TTL': 60 * 10,
+}
+
+# ETag / Last-Modified en places, place_detail y reviews (core/conditional.py).
+# Cambiar VERSION al desplegar plantillas nuevas invalida los ETag de los navegadores.
+CONDITIONAL_GET = {
+    'ENABLED': True,
+    'VERSION': os.getenv('APP_VERSION', '1'),
+}
+
+# Medición por petición (core/perf.py): Server-Timing, una línea JSON por petición en el
+# logger core.perf y las lentas en perf/lentas/ (solo staff). SAMPLE_RATE < 1 mide el detalle
+# de solo esa fracción de peticiones. Server-Timing solo para el staff o con DEBUG ('staff').
+PERF = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.getenv('PERF_SAMPLE_RATE', '1.0')),
+    'SLOW_MS': int(os.getenv('PERF_SLOW_MS', '500')),
+    'BUFFER_SIZE': 200,
+    'SERVER_TIMING': 'staff',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        # INFO: una línea por petición medida; WARNING: solo las lentas
+        'core.perf': {'handlers': ['console'], 'level': os.getenv('PERF_LOG_LEVEL', 'WARNING'), 'propagate': False},
+    },
+}
+
+# Listado de reseñas con scroll infinito (paginación por cursor en core/pagination.py)
+REVIEWS_PAGE_SIZE = 20       # reseñas por página; ?size= puede pedir menos o más hasta el máximo
+REVIEWS_MAX_PAGE_SIZE = 100
+
 # Auth redirects
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
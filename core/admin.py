@@ -4,11 +4,12 @@ from .models import UserProfile, Place, Category, Review
 
 @admin.register(Place)
 class PlaceAdmin(admin.ModelAdmin):
-    list_display = ['name', 'city', 'department', 'category', 'rating_average', 'estimated_cost']
-    list_filter = ['category', 'city', 'department']
+    list_display = ['name', 'city', 'department', 'category', 'rating_average', 'rating_seed', 'review_count', 'estimated_cost']
+    list_filter = ['categories', 'city', 'department']
     search_fields = ['name', 'city', 'short_description']
     prepopulated_fields = {'slug': ('name',)}
-    list_editable = ['rating_average']
+    list_editable = ['rating_seed']
+    readonly_fields = ['rating_average']
     ordering = ['-rating_average', 'name']
 
 @admin.register(UserProfile)
@@ -26,7 +27,7 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'place', 'qualification', 'created_at']
-    list_filter = ['qualification', 'created_at', 'place__category']
+    list_filter = ['qualification', 'created_at', 'place__categories']
     search_fields = ['title', 'description', 'user__username', 'place__name']
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'created_at'
@@ -0,0 +1,312 @@
+"""
+Caché de resultados para las llamadas externas de IA (SerpAPI / OpenAI).
+
+Las entradas se indexan por un hash de los parámetros normalizados, expiran
+por TTL y, cuando se supera ``MAX_ENTRIES``, se expulsan en orden LRU.
+El almacenamiento es intercambiable: memoria local, archivos o la tabla
+``core_cachedresult`` de la base de datos.
+
+Configuración en ``settings.AI_CACHES``::
+
+    AI_CACHES = {
+        'rutas': {'BACKEND': 'memory', 'TTL': 86400, 'MAX_ENTRIES': 500},
+    }
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_texto(valor):
+    """Minúsculas, sin tildes y con espacios colapsados."""
+    texto = unicodedata.normalize('NFKD', str(valor or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().split())
+
+
+def clave_parametros(params):
+    """Hash estable (sha256) de un diccionario de parámetros normalizados."""
+    normalizado = {}
+    for campo, valor in params.items():
+        if isinstance(valor, (list, tuple, set)):
+            normalizado[campo] = sorted({normalizar_texto(v) for v in valor if normalizar_texto(v)})
+        elif isinstance(valor, (int, float)):
+            normalizado[campo] = valor
+        else:
+            normalizado[campo] = normalizar_texto(valor)
+    crudo = json.dumps(normalizado, sort_keys=True, ensure_ascii=True)
+    return hashlib.sha256(crudo.encode('utf-8')).hexdigest()
+
+
+# ============================================
+# BACKENDS DE ALMACENAMIENTO
+# ============================================
+
+class MemoryBackend:
+    """Entradas en la memoria del proceso, mantenidas en orden LRU."""
+
+    def __init__(self, name, **options):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def count(self):
+        return len(self._data)
+
+    def evict(self, n):
+        """Elimina las ``n`` entradas usadas hace más tiempo."""
+        evicted = 0
+        with self._lock:
+            while evicted < n and self._data:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileBackend:
+    """
+    Un archivo JSON por entrada dentro de ``LOCATION``.
+    La fecha de modificación del archivo marca el último acceso (LRU).
+    """
+
+    def __init__(self, name, location=None, **options):
+        base = location or os.path.join(settings.BASE_DIR, 'cache', 'ai')
+        self.path = os.path.join(str(base), name)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding='utf-8') as fh:
+                data = json.load(fh)
+            os.utime(self._file(key))
+        except (OSError, ValueError):
+            return None
+        return data['value'], data['expires_at']
+
+    def set(self, key, value, expires_at):
+        tmp = f'{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'value': value, 'expires_at': expires_at}, fh, ensure_ascii=False)
+        os.replace(tmp, self._file(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        with os.scandir(self.path) as it:
+            return [e for e in it if e.name.endswith('.json')]
+
+    def count(self):
+        return len(self._entries())
+
+    @staticmethod
+    def _mtime(entry):
+        try:
+            return entry.stat().st_mtime
+        except FileNotFoundError:
+            # Otro hilo o proceso la borró después de listar la carpeta
+            return None
+
+    def evict(self, n):
+        fechas = {e.path: mtime for e in self._entries() if (mtime := self._mtime(e)) is not None}
+        evicted = 0
+        for path in sorted(fechas, key=fechas.get)[:n]:
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                pass
+        return evicted
+
+    def clear(self):
+        for entry in self._entries():
+            self.delete(entry.name[:-len('.json')])
+
+
+class DatabaseBackend:
+    """Entradas en la tabla ``CachedResult``, separadas por nombre de caché."""
+
+    def __init__(self, name, **options):
+        self.name = name
+
+    @property
+    def _qs(self):
+        from .models import CachedResult
+        return CachedResult.objects.filter(namespace=self.name)
+
+    def get(self, key):
+        from django.utils import timezone
+        row = self._qs.filter(key=key).values_list('value', 'expires_at').first()
+        if row is None:
+            return None
+        self._qs.filter(key=key).update(last_access=timezone.now())
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        from django.utils import timezone
+        from .models import CachedResult
+        # Un solo INSERT ... ON CONFLICT: dos procesos que guardan la misma clave no chocan
+        CachedResult.objects.bulk_create(
+            [CachedResult(
+                namespace=self.name, key=key, value=json.dumps(value, ensure_ascii=False),
+                expires_at=expires_at, last_access=timezone.now(),
+            )],
+            update_conflicts=True, unique_fields=['namespace', 'key'],
+            update_fields=['value', 'expires_at', 'last_access'],
+        )
+
+    def delete(self, key):
+        self._qs.filter(key=key).delete()
+
+    def count(self):
+        return self._qs.count()
+
+    def evict(self, n):
+        ids = list(self._qs.order_by('last_access').values_list('pk', flat=True)[:n])
+        deleted, _ = self._qs.filter(pk__in=ids).delete()
+        return deleted
+
+    def clear(self):
+        self._qs.delete()
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'file': FileBackend,
+    'database': DatabaseBackend,
+}
+
+
+# ============================================
+# CACHÉ CON TTL + LRU Y CONTADORES
+# ============================================
+
+class ResultCache:
+    """Caché con expiración por TTL, expulsión LRU y contadores de uso."""
+
+    def __init__(self, name, backend, ttl, max_entries):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _count(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def get(self, key, contar=True):
+        """
+        Devuelve el valor guardado o ``None`` si no existe o ya expiró.
+        ``contar=False`` para relecturas que no deben afectar a la tasa de aciertos.
+        """
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] < time.time():
+            self.backend.delete(key)
+            self._count('expirations')
+            entry = None
+        if not contar:
+            return entry[0] if entry is not None else None
+        if entry is None:
+            self._count('misses')
+            logger.debug('ai_cache miss cache=%s key=%s', self.name, key[:12])
+            return None
+        self._count('hits')
+        logger.debug('ai_cache hit cache=%s key=%s', self.name, key[:12])
+        return entry[0]
+
+    def set(self, key, value):
+        self.backend.set(key, value, time.time() + self.ttl)
+        overflow = self.backend.count() - self.max_entries
+        if overflow > 0:
+            self._count('evictions', self.backend.evict(overflow))
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'size': self.backend.count(),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+DEFAULTS = {'BACKEND': 'memory', 'TTL': 60 * 60 * 24, 'MAX_ENTRIES': 500}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name):
+    """Instancia (única por proceso) de la caché configurada en ``AI_CACHES[name]``."""
+    with _caches_lock:
+        if name not in _caches:
+            config = {**DEFAULTS, **getattr(settings, 'AI_CACHES', {}).get(name, {})}
+            backend = BACKENDS[config['BACKEND']](name, location=config.get('LOCATION'))
+            _caches[name] = ResultCache(name, backend, config['TTL'], config['MAX_ENTRIES'])
+        return _caches[name]
+
+
+def all_stats():
+    """Estadísticas de todas las cachés instanciadas en este proceso."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {c.name: c.stats() for c in caches}
+
+
+@receiver(setting_changed)
+def _reset_caches(setting, **kwargs):
+    if setting == 'AI_CACHES':
+        with _caches_lock:
+            _caches.clear()
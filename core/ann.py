@@ -0,0 +1,337 @@
+"""
+Índice aproximado IVF (inverted file) para catálogos grandes de ``TripItem``.
+
+Los vectores se agrupan con k-means esférico en ``nlist`` listas y se guardan
+ordenados por lista, así que cada lista es un bloque contiguo de la matriz.
+Una consulta solo se compara con las ``nprobe`` listas cuyo centroide más se
+parece a ella: con ``nprobe`` = ``nlist`` el resultado es el exacto.
+
+Las filas nuevas o modificadas (``TripItem.updated_at``) se asignan a su lista
+más cercana sin reentrenar y se guardan aparte como "agregados"; la versión
+anterior de una fila modificada queda marcada como borrada, igual que las
+filas borradas de la BD (se detectan porque el conteo deja de cuadrar). Cuando
+lo agregado y lo borrado supera ``REBUILD_RATIO`` del índice, se reentrena todo.
+
+En disco, la base y los agregados van en carpetas nuevas en cada guardado
+(``base-*``, ``agregados-*``) y ``meta.json``, reemplazado al final, dice
+cuáles leer: quien abre el índice nunca mezcla archivos de dos versiones.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .vectors import (
+    Atributos, Vocabulario, contar_filas, guardar_json, guardar_npy, ids_con_embedding, leer_filas,
+    normalizar_filas, top_k,
+)
+
+
+def asignar(matriz, centroides, bloque=65536):
+    """Lista (centroide más parecido) de cada fila, por bloques para acotar la memoria."""
+    listas = np.empty(len(matriz), dtype=np.int32)
+    for i in range(0, len(matriz), bloque):
+        listas[i:i + bloque] = np.argmax(matriz[i:i + bloque] @ centroides.T, axis=1)
+    return listas
+
+
+def kmeans_esferico(matriz, nlist, iteraciones=10, muestra_por_lista=64, semilla=0):
+    """Centroides unitarios entrenados sobre una muestra de ``nlist × muestra_por_lista`` filas."""
+    rng = np.random.default_rng(semilla)
+    n = len(matriz)
+    tam = min(n, nlist * muestra_por_lista)
+    datos = np.asarray(matriz[np.sort(rng.choice(n, tam, replace=False))] if tam < n else matriz)
+    centroides = datos[rng.choice(len(datos), nlist, replace=False)].copy()
+    for _ in range(iteraciones):
+        listas = asignar(datos, centroides)
+        orden = np.argsort(listas, kind='stable')
+        cuentas = np.bincount(listas, minlength=nlist)
+        llenas = np.flatnonzero(cuentas)
+        inicios = np.concatenate([[0], np.cumsum(cuentas)[:-1]])[llenas]
+        sumas = np.zeros_like(centroides)
+        sumas[llenas] = np.add.reduceat(datos[orden], inicios, axis=0)
+        vacias = cuentas == 0
+        if vacias.any():
+            # Una lista vacía se vuelve a sembrar con una fila al azar
+            sumas[vacias] = datos[rng.choice(len(datos), int(vacias.sum()))]
+        centroides = normalizar_filas(sumas).astype(np.float32)
+    return centroides
+
+
+class IndiceIVF:
+    ARCHIVOS = ('ids', 'matriz', 'centroides', 'offsets')
+
+    def __init__(self, ids, matriz, atributos, centroides, offsets, watermark=None, nprobe=8):
+        # Base: filas ordenadas por lista; la lista l ocupa offsets[l]:offsets[l + 1]
+        self.ids = ids
+        self.matriz = matriz
+        self.atributos = atributos
+        self.centroides = centroides
+        self.offsets = offsets
+        self.watermark = watermark
+        self.nprobe = nprobe
+        self._orden_ids = np.argsort(ids, kind='stable')
+        # Agregados desde la última construcción
+        self.ag_ids = np.empty(0, dtype=np.int64)
+        self.ag_matriz = np.empty((0, self.dimension), dtype=np.float32)
+        self.ag_listas = np.empty(0, dtype=np.int32)
+        self.ag_atributos = Atributos(
+            np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32),
+            atributos.vocab_tipos, atributos.vocab_ciudades,
+        )
+        self.borrados = np.empty(0, dtype=np.int64)
+        # Carpeta de la base en disco (``guardar``/``cargar``)
+        self._base = None
+
+    def __len__(self):
+        return len(self.ids) + len(self.ag_ids) - len(self.borrados)
+
+    @property
+    def dimension(self):
+        return self.centroides.shape[1] if self.centroides.ndim == 2 else 0
+
+    @property
+    def nlist(self):
+        return len(self.centroides)
+
+    # ---------- construcción ----------
+
+    @classmethod
+    def construir(cls, ids, matriz, atributos=None, nlist=None, watermark=None, semilla=0):
+        """``matriz`` con filas unitarias (como las de ``IndiceVectorial``)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        atributos = atributos if atributos is not None else Atributos.vacios(len(ids))
+        if not len(ids):
+            vacio = np.empty((0, 0), dtype=np.float32)
+            return cls(ids, vacio, atributos, vacio, np.zeros(1, dtype=np.int64), watermark)
+        nlist = max(1, min(nlist or int(4 * np.sqrt(len(ids))), len(ids)))
+        centroides = kmeans_esferico(matriz, nlist, semilla=semilla)
+        listas = asignar(matriz, centroides)
+        orden = np.argsort(listas, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(listas, minlength=nlist))]).astype(np.int64)
+        return cls(
+            ids[orden], np.ascontiguousarray(np.asarray(matriz)[orden], dtype=np.float32),
+            atributos.tomar(orden), centroides, offsets, watermark,
+        )
+
+    @classmethod
+    def desde_bd(cls, nlist=None):
+        ids, matriz, tipos, ciudades, costos, ultima = leer_filas()
+        matriz = normalizar_filas(matriz.astype(np.float32)) if len(ids) else matriz
+        atributos = Atributos.vacios().codificar(tipos, ciudades, costos)
+        return cls.construir(ids, matriz, atributos, nlist=nlist, watermark=ultima)
+
+    # ---------- actualización incremental ----------
+
+    def agregar(self, ids, vectores, atributos):
+        """Añade (o reemplaza) filas sin reentrenar los centroides."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        vectores = normalizar_filas(np.asarray(vectores, dtype=np.float32))
+        if not self.nlist:
+            # Índice vacío: no hay centroides todavía; se entrena con lo que llega
+            nuevo = IndiceIVF.construir(ids, vectores, atributos, watermark=self.watermark)
+            self.__dict__.update(nuevo.__dict__)
+            return
+
+        # Versiones anteriores: fuera de los agregados y marcadas como borradas en la base
+        self.quitar(ids)
+        self.ag_ids = np.concatenate([self.ag_ids, ids])
+        self.ag_matriz = np.concatenate([self.ag_matriz, vectores])
+        self.ag_listas = np.concatenate([self.ag_listas, asignar(vectores, self.centroides)])
+        self.ag_atributos = self.ag_atributos.unir(atributos)
+
+    def quitar(self, ids):
+        """Deja de devolver ``ids``: fuera de los agregados y marcados como borrados en la base."""
+        ids = np.asarray(ids, dtype=np.int64)
+        quedan = ~np.isin(self.ag_ids, ids)
+        self.ag_ids = self.ag_ids[quedan]
+        self.ag_matriz = self.ag_matriz[quedan]
+        self.ag_listas = self.ag_listas[quedan]
+        self.ag_atributos = self.ag_atributos.tomar(quedan)
+        self.borrados = np.union1d(self.borrados, ids[np.isin(ids, self.ids)])
+
+    def vigentes(self):
+        """Ids que el índice puede devolver."""
+        return np.union1d(np.setdiff1d(self.ids, self.borrados), self.ag_ids)
+
+    def sincronizar(self):
+        """
+        Agrega las filas modificadas después de ``watermark`` y quita las borradas
+        en la BD. Devuelve ``True`` si hubo cambios.
+        """
+        ids, matriz, tipos, ciudades, costos, ultima = leer_filas(desde=self.watermark)
+        cambios = bool(len(ids))
+        if cambios:
+            self.agregar(ids, matriz, self.atributos.codificar(tipos, ciudades, costos))
+            self.watermark = ultima
+        # Un COUNT por sincronización; la lista de ids solo si no cuadra
+        if contar_filas() != len(self):
+            borradas = np.setdiff1d(self.vigentes(), ids_con_embedding())
+            if len(borradas):
+                self.quitar(borradas)
+                cambios = True
+        return cambios
+
+    def necesita_reentrenar(self, proporcion):
+        return len(self.ag_ids) + len(self.borrados) > proporcion * max(len(self.ids), 1)
+
+    # ---------- consultas ----------
+
+    def vector_de(self, item_id):
+        pos = np.flatnonzero(self.ag_ids == item_id)
+        if len(pos):
+            return self.ag_matriz[pos[-1]]
+        i = np.searchsorted(self.ids, item_id, sorter=self._orden_ids)
+        if i < len(self.ids) and self.ids[self._orden_ids[i]] == item_id and item_id not in self.borrados:
+            return self.matriz[self._orden_ids[i]]
+        return None
+
+    def _candidatos(self, listas, mascara, ag_mascara):
+        """Posiciones de la base y de los agregados que caen en ``listas`` y pasan las máscaras."""
+        base = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in listas])
+        agregados = np.flatnonzero(np.isin(self.ag_listas, listas))
+        if mascara is not None:
+            base = base[mascara[base]]
+        return base, agregados[ag_mascara[agregados]]
+
+    def buscar(self, consultas, k=10, excluir=(), filtros=None, nprobe=None):
+        """
+        Mismo contrato que ``IndiceVectorial.buscar``; revisa ``nprobe`` listas por consulta.
+        Con filtros se revisan proporcionalmente más listas (``nprobe`` / fracción que
+        pasa el filtro), y si pasan tan pocas filas que revisarlas todas cuesta menos,
+        se comparan todas: un filtro estrecho no deja la respuesta vacía.
+        """
+        consultas = normalizar_filas(np.atleast_2d(np.asarray(consultas, dtype=np.float32)))
+        if not self.nlist:
+            return [[] for _ in consultas]
+        if consultas.shape[1] != self.dimension:
+            raise ValueError(f'La consulta tiene dimensión {consultas.shape[1]} y el índice {self.dimension}')
+
+        # Máscaras sobre la base (None = todas pasan) y sobre los agregados
+        excluir = np.asarray(list(excluir), dtype=np.int64)
+        mascara = self.atributos.mascara(filtros)
+        bloqueados = np.union1d(self.borrados, excluir)
+        if len(bloqueados):
+            fuera = ~np.isin(self.ids, bloqueados)
+            mascara = fuera if mascara is None else mascara & fuera
+        ag_mascara = self.ag_atributos.mascara(filtros)
+        ag_mascara = np.ones(len(self.ag_ids), dtype=bool) if ag_mascara is None else ag_mascara
+        ag_mascara &= ~np.isin(self.ag_ids, excluir)
+
+        nprobe = nprobe or self.nprobe
+        pasan = len(self.ids) if mascara is None else int(mascara.sum())
+        if filtros and pasan < len(self.ids):
+            nprobe = int(np.ceil(nprobe * len(self.ids) / max(pasan, 1)))
+        if nprobe * len(self.ids) / self.nlist >= pasan:
+            # Más barato (y exacto) comparar todas las filas que pasan el filtro
+            base = np.arange(len(self.ids)) if mascara is None else np.flatnonzero(mascara)
+            agregados = np.flatnonzero(ag_mascara)
+            ids = np.concatenate([self.ids[base], self.ag_ids[agregados]])
+            puntajes = np.concatenate(
+                [consultas @ self.matriz[base].T, consultas @ self.ag_matriz[agregados].T], axis=1,
+            )
+            return [
+                [(int(ids[m]), float(fila[m])) for m in mejores]
+                for fila, mejores in zip(puntajes, top_k(puntajes, k))
+            ]
+
+        resultados = []
+        listas_por_consulta = top_k(consultas @ self.centroides.T, min(nprobe, self.nlist))
+        for q, listas in zip(consultas, listas_por_consulta):
+            base, agregados = self._candidatos(listas, mascara, ag_mascara)
+            ids = np.concatenate([self.ids[base], self.ag_ids[agregados]])
+            puntajes = np.concatenate([self.matriz[base] @ q, self.ag_matriz[agregados] @ q])
+            mejores = top_k(puntajes[np.newaxis, :], k)[0]
+            resultados.append([(int(ids[m]), float(puntajes[m])) for m in mejores])
+        return resultados
+
+    # ---------- disco ----------
+
+    def guardar(self, carpeta):
+        base = _nueva_carpeta(carpeta, 'base')
+        for nombre in self.ARCHIVOS:
+            guardar_npy(base, f'{nombre}.npy', getattr(self, nombre))
+        self.atributos.guardar(base)
+        self._base = os.path.basename(base)
+        self._guardar_version(carpeta, _leer_meta(carpeta))
+
+    def guardar_agregados(self, carpeta):
+        """
+        Solo los agregados (pequeños), junto a la base ya guardada. Devuelve
+        ``False`` sin escribir si otro proceso guardó otra base entretanto.
+        """
+        meta = _leer_meta(carpeta)
+        if self._base is None:
+            self.guardar(carpeta)
+        elif meta is None or meta.get('base') != self._base:
+            return False
+        else:
+            self._guardar_version(carpeta, meta)
+        return True
+
+    def _guardar_version(self, carpeta, anterior):
+        agregados = _nueva_carpeta(carpeta, 'agregados')
+        for nombre in ('ag_ids', 'ag_matriz', 'ag_listas', 'borrados'):
+            guardar_npy(agregados, f'{nombre}.npy', getattr(self, nombre))
+        self.ag_atributos.guardar(agregados, prefijo='ag_')
+        guardar_json(carpeta, 'meta.json', {
+            'n': len(self),
+            'nlist': self.nlist,
+            'dimension': self.dimension,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'base': self._base,
+            'agregados': os.path.basename(agregados),
+        })
+        # Las de la versión anterior se conservan: alguien pudo leer su meta.json justo antes
+        en_uso = {self._base, os.path.basename(agregados)}
+        if anterior:
+            en_uso |= {anterior.get('base'), anterior.get('agregados')}
+        for entrada in os.scandir(carpeta):
+            if entrada.is_dir() and entrada.name not in en_uso:
+                shutil.rmtree(entrada.path, ignore_errors=True)
+
+    @classmethod
+    def cargar(cls, carpeta):
+        meta = _leer_meta(carpeta)
+        # Sin 'base'/'agregados': formato anterior, todo en la carpeta
+        base = os.path.join(carpeta, meta.get('base') or '')
+        agregados = os.path.join(carpeta, meta.get('agregados') or '')
+
+        def leer(directorio, nombre, mmap=False):
+            return np.load(os.path.join(directorio, f'{nombre}.npy'), mmap_mode='r' if mmap else None)
+
+        ids = leer(base, 'ids')
+        atributos = Atributos.cargar(base)
+        indice = cls(
+            ids, leer(base, 'matriz', mmap=bool(len(ids))), atributos,
+            leer(base, 'centroides'), leer(base, 'offsets'),
+            datetime.fromisoformat(meta['watermark']) if meta['watermark'] else None,
+        )
+        indice._base = meta.get('base')
+        ag = Atributos.cargar(agregados, prefijo='ag_')
+        # Los agregados comparten (y pueden haber ampliado) el vocabulario de la base
+        atributos.vocab_tipos = Vocabulario(ag.vocab_tipos.valores)
+        atributos.vocab_ciudades = Vocabulario(ag.vocab_ciudades.valores)
+        indice.ag_atributos = Atributos(ag.tipos, ag.ciudades, ag.costos, atributos.vocab_tipos, atributos.vocab_ciudades)
+        indice.ag_ids, indice.ag_matriz = leer(agregados, 'ag_ids'), leer(agregados, 'ag_matriz')
+        indice.ag_listas, indice.borrados = leer(agregados, 'ag_listas'), leer(agregados, 'borrados')
+        return indice
+
+
+def _leer_meta(carpeta):
+    try:
+        with open(os.path.join(carpeta, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _nueva_carpeta(carpeta, tipo):
+    ruta = os.path.join(carpeta, f'{tipo}-{time.time_ns()}-{os.getpid()}')
+    os.makedirs(ruta)
+    return ruta
@@ -6,6 +6,9 @@ class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
 
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
 
 # 🔑 Cliente global de OpenAI (API key quemada)
 client = OpenAI(
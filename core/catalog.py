@@ -0,0 +1,365 @@
+"""
+Importación y exportación del catálogo de ``Place`` en CSV o JSON Lines.
+
+``importar`` recorre las filas de un iterador (``leer_filas`` lee el archivo
+línea a línea) en lotes de ``lote``: valida cada fila con las reglas del modelo
+(``clean_fields``), busca en una consulta los lugares ya existentes del lote y
+escribe con ``bulk_create`` / ``bulk_update`` dentro de una transacción por
+lote. En memoria nunca hay más de un lote, sea cual sea el tamaño del archivo.
+
+Cada fila se identifica por ``slug`` si lo trae y si no por ``name``: si el
+lugar existe se actualizan solo las columnas presentes, si no se crea (el slug
+sale de ``slug_disponible``, igual que en ``Place.save``). Importar dos veces
+el mismo archivo no cambia nada la segunda vez: las filas iguales a la base no
+se escriben.
+
+Las celdas vacías de números y de ``photo`` cuentan como "sin dato". ``photo``
+es el nombre de un archivo que ya está en el almacén (lo que escribe
+``exportar``) o una ruta local, relativa a ``fotos``, que se sube al almacén
+de fotos (direccionado por contenido: la misma foto no se duplica). Al validar
+solo se calcula el nombre que tendrá; se suben las de las filas guardadas,
+después del commit, así una fila inválida o un lote revertido no dejan
+archivos huérfanos.
+
+Como ``bulk_create`` no dispara señales, aquí mismo se sincronizan las
+categorías, se recalculan los ratings de los lugares con ``rating_seed``
+nuevo y se invalidan las páginas cacheadas. Las miniaturas se generan después
+con ``manage.py generate_image_derivatives``.
+"""
+import csv
+import json
+import os
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import reset_queries, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .categories import invalidar_categorias, sincronizar_categorias_en_lote
+from .models import Place, slug_disponible
+from .page_cache import etiqueta_lugar, invalidar
+from .ratings import reconstruir_ratings
+
+CAMPOS = [
+    'name', 'slug', 'short_description', 'category', 'city', 'department', 'estimated_cost',
+    'rating_seed', 'events', 'restaurants', 'hotels', 'photo',
+]
+# Celda vacía = sin dato (en el resto de campos de texto vacía = dejar en blanco)
+OPCIONALES = {'slug', 'estimated_cost', 'rating_seed', 'photo'}
+FORMATOS = ('csv', 'jsonl')
+MAX_ERRORES = 20
+
+
+class ErrorDeFila(Exception):
+    pass
+
+
+def formato_de(ruta, formato=None):
+    """``formato`` o el de la extensión de ``ruta`` (``.csv``, ``.jsonl``, ``.ndjson``)."""
+    if formato:
+        return formato
+    extension = os.path.splitext(str(ruta))[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"No se reconoce el formato de {ruta}: usa --formato csv o jsonl")
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+def leer_filas(archivo, formato):
+    """Genera ``(línea, datos)`` de un archivo de texto abierto, sin cargarlo entero."""
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for datos in lector:
+            yield lector.line_num, datos
+        return
+    for linea, texto in enumerate(archivo, 1):
+        if not texto.strip():
+            continue
+        try:
+            datos = json.loads(texto)
+        except ValueError as e:
+            yield linea, ErrorDeFila(f"JSON inválido: {e}")
+            continue
+        yield linea, datos if isinstance(datos, dict) else ErrorDeFila("se esperaba un objeto JSON")
+
+
+def _limpiar(datos):
+    """Solo los campos conocidos, como texto, sin los opcionales vacíos."""
+    if isinstance(datos, ErrorDeFila):
+        raise datos
+    limpios = {}
+    for campo in CAMPOS:
+        if campo not in datos or datos[campo] is None:
+            continue
+        valor = str(datos[campo]).strip()
+        if valor or campo not in OPCIONALES:
+            limpios[campo] = valor
+    if not limpios.get('name') and not limpios.get('slug'):
+        raise ErrorDeFila("falta name (o slug para actualizar)")
+    return limpios
+
+
+# ============================================
+# FOTOS
+# ============================================
+
+def _foto(valor, fotos, locales):
+    """
+    Nombre en el almacén para el valor de la columna ``photo``, sin escribir
+    nada: si es un archivo local que falta subir se anota en ``locales``
+    (``nombre -> ruta``) para ``_subir_fotos``.
+    """
+    campo = Place._meta.get_field('photo')
+    if campo.storage.exists(valor):
+        return valor
+    ruta = valor if os.path.isabs(valor) else os.path.join(fotos or '', valor)
+    if not os.path.isfile(ruta):
+        raise ErrorDeFila(f"no existe la foto {valor}")
+    nombre = campo.generate_filename(None, os.path.basename(ruta))
+    # El nombre que tendrá al subirla (core/storage.py la nombra por su contenido)
+    por_contenido = getattr(campo.storage, 'nombre_por_contenido', None)
+    if por_contenido:
+        with open(ruta, 'rb') as f:
+            nombre = por_contenido(nombre, f)
+    else:
+        nombre = campo.storage.get_available_name(nombre)
+    if not campo.storage.exists(nombre):
+        locales[nombre] = ruta
+    return nombre
+
+
+def _subir_fotos(places, locales, stats):
+    """Sube las fotos locales de los lugares guardados (tras el commit)."""
+    storage = Place._meta.get_field('photo').storage
+    subidas = {}
+    for place in places:
+        nombre = place.photo.name
+        if nombre not in locales:
+            continue
+        if nombre not in subidas:
+            try:
+                with open(locales[nombre], 'rb') as f:
+                    subidas[nombre] = storage.save(nombre, File(f))
+            except OSError as e:
+                subidas[nombre] = None
+                _error(stats, place._linea, f"no se pudo subir la foto {locales[nombre]}: {e}")
+        guardado = subidas[nombre]
+        if guardado and guardado != nombre:
+            # Almacén sin nombres por contenido: otro archivo tomó el nombre mientras tanto
+            Place.objects.filter(pk=place.pk).update(photo=guardado)
+
+
+# ============================================
+# IMPORTACIÓN
+# ============================================
+
+def _existentes(filas):
+    """Los lugares del lote ya guardados, por slug y por nombre (una consulta)."""
+    slugs = {datos['slug'] for _, datos in filas if datos.get('slug')}
+    nombres = {datos['name'] for _, datos in filas if datos.get('name')}
+    por_slug, por_nombre = {}, {}
+    for place in Place.objects.filter(Q(slug__in=slugs) | Q(name__in=nombres)):
+        por_slug[place.slug] = place
+        por_nombre[place.name] = place
+    return por_slug, por_nombre
+
+
+def _valor(place, campo):
+    valor = getattr(place, campo)
+    if campo == 'photo':
+        return valor.name or None
+    if campo in ('estimated_cost', 'rating_seed') and valor is not None:
+        return Decimal(valor)
+    return valor
+
+
+def _asignar(place, datos, fotos, locales):
+    """Aplica y valida ``datos`` (con las reglas de los campos del modelo); devuelve los que cambiaron."""
+    crudos = {campo: getattr(place, campo) for campo in datos}
+    anteriores = {campo: _valor(place, campo) for campo in datos}
+    try:
+        for campo, valor in datos.items():
+            setattr(place, campo, _foto(valor, fotos, locales) if campo == 'photo' else valor)
+        place.clean_fields(exclude=[f.name for f in Place._meta.fields if f.name not in datos or f.name == 'photo'])
+    except (ErrorDeFila, ValidationError) as e:
+        # Una fila inválida no debe dejar a medias un lugar que otra fila del lote sí cambia
+        for campo, valor in crudos.items():
+            setattr(place, campo, valor)
+        if isinstance(e, ErrorDeFila):
+            raise
+        raise ErrorDeFila('; '.join(f'{campo}: {" ".join(m)}' for campo, m in e.message_dict.items()))
+    return [campo for campo in datos if _valor(place, campo) != anteriores[campo]]
+
+
+def _procesar_lote(filas, stats, fotos, simular):
+    por_slug, por_nombre = _existentes(filas)
+    nuevos, cambiados, campos = {}, {}, set()
+    locales = {}
+    for linea, datos in filas:
+        try:
+            place = por_slug.get(datos['slug']) if datos.get('slug') else por_nombre.get(datos['name'])
+            if place is None:
+                # Una fila repetida en el mismo lote modifica el lugar que crea la anterior
+                clave = datos.get('slug') or datos['name']
+                place = nuevos.get(clave) or Place()
+                _asignar(place, datos, fotos, locales)
+                if not place.name or not place.short_description:
+                    raise ErrorDeFila("un lugar nuevo necesita name y short_description")
+                place._linea = linea
+                nuevos[clave] = place
+            else:
+                slug_anterior = place.slug
+                cambios = _asignar(place, datos, fotos, locales)
+                if cambios:
+                    place._linea = linea
+                    # Si cambia el slug, el detalle cacheado con el slug viejo también queda viejo
+                    place._slugs = getattr(place, '_slugs', set()) | {slug_anterior, place.slug}
+                    cambiados[place.pk] = place
+                    campos.update(cambios)
+                elif place.pk not in cambiados:
+                    stats['sin_cambios'] += 1
+        except ErrorDeFila as e:
+            _error(stats, linea, e)
+
+    nuevos = _con_slug(_sin_conflictos(list(nuevos.values()), stats))
+    cambiados = {place.pk: place for place in _sin_conflictos(list(cambiados.values()), stats)}
+    with transaction.atomic():
+        if nuevos:
+            for place in nuevos:
+                # Lo que hace Place.save al crear
+                place.rating_average = place.rating_seed
+            Place.objects.bulk_create(nuevos)
+            sincronizar_categorias_en_lote(nuevos)
+        if cambiados:
+            ahora = timezone.now()
+            for place in cambiados.values():
+                place.updated_at = ahora
+            Place.objects.bulk_update(cambiados.values(), sorted(campos | {'updated_at'}))
+            if 'category' in campos:
+                sincronizar_categorias_en_lote(cambiados.values())
+            if 'rating_seed' in campos:
+                reconstruir_ratings(Place.objects.filter(pk__in=cambiados))
+        if simular:
+            transaction.set_rollback(True)
+        elif nuevos or cambiados:
+            guardados = nuevos + list(cambiados.values())
+            transaction.on_commit(lambda: _subir_fotos(guardados, locales, stats))
+            etiquetas = ['lugares'] + [etiqueta_lugar(slug) for p in cambiados.values() for slug in p._slugs]
+            transaction.on_commit(lambda: _invalidar(etiquetas))
+    stats['creados'] += len(nuevos)
+    stats['actualizados'] += len(cambiados)
+
+
+def _invalidar(etiquetas):
+    invalidar_categorias()
+    invalidar(*etiquetas)
+
+
+def _sin_conflictos(places, stats):
+    """Descarta (como inválidos) los que repiten el nombre o el slug de otro lugar, guardado o del lote."""
+    nombres = {p.name for p in places}
+    slugs = {p.slug for p in places if p.slug}
+    guardados = Place.objects.filter(Q(name__in=nombres) | Q(slug__in=slugs)).values_list('pk', 'name', 'slug')
+    # (campo, valor) -> pk del lugar guardado o el objeto del lote (los nuevos aún no tienen pk)
+    ocupados = {(campo, valor): pk for pk, nombre, slug in guardados for campo, valor in (('name', nombre), ('slug', slug))}
+    validos = []
+    for place in places:
+        choques = []
+        for campo in ('name', 'slug'):
+            valor = getattr(place, campo)
+            dueno = ocupados.get((campo, valor))
+            if valor and dueno is not None and dueno is not place and dueno != place.pk:
+                choques.append(f"{campo} {valor} ya es de otro lugar")
+        if choques:
+            _error(stats, place._linea, '; '.join(choques))
+            continue
+        ocupados[('name', place.name)] = place.pk or place
+        if place.slug:
+            ocupados[('slug', place.slug)] = place.pk or place
+        validos.append(place)
+    return validos
+
+
+def _con_slug(nuevos):
+    """Slug para los lugares nuevos que no lo traen, como en ``Place.save`` (sin consultar uno por uno)."""
+    deseados = [(p, slugify(p.name)[:200] or 'lugar') for p in nuevos if not p.slug]
+    tomados = set(Place.objects.filter(slug__in=[slug for _, slug in deseados]).values_list('slug', flat=True))
+    del_lote = {p.slug for p in nuevos if p.slug}
+    for place, slug in deseados:
+        if slug in tomados or slug in del_lote:
+            slug = slug_disponible(place.name, ocupados=del_lote)
+        place.slug = slug
+        del_lote.add(slug)
+    return nuevos
+
+
+def _error(stats, linea, mensaje):
+    stats['invalidos'] += 1
+    if len(stats['errores']) < MAX_ERRORES:
+        stats['errores'].append(f"línea {linea}: {mensaje}")
+
+
+def importar(filas, lote=500, fotos=None, simular=False, progreso=None):
+    """
+    Crea o actualiza lugares desde ``filas`` (``(línea, datos)`` de ``leer_filas``).
+    Devuelve los contadores; ``progreso(stats)`` se llama tras cada lote.
+    """
+    stats = {
+        'filas': 0, 'creados': 0, 'actualizados': 0, 'sin_cambios': 0, 'invalidos': 0,
+        'errores': [], 'segundos': 0.0, 'por_segundo': 0.0,
+    }
+    inicio = time.perf_counter()
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, lote))
+        if not bloque:
+            break
+        validas = []
+        for linea, datos in bloque:
+            try:
+                validas.append((linea, _limpiar(datos)))
+            except ErrorDeFila as e:
+                _error(stats, linea, e)
+        _procesar_lote(validas, stats, fotos, simular)
+        if settings.DEBUG:
+            # Django guarda el SQL de cada consulta (los INSERT de bulk_create son enormes)
+            reset_queries()
+        stats['filas'] += len(bloque)
+        stats['segundos'] = time.perf_counter() - inicio
+        stats['por_segundo'] = stats['filas'] / stats['segundos'] if stats['segundos'] else 0.0
+        if progreso:
+            progreso(stats)
+    return stats
+
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def exportar(destino, formato, queryset=None, chunk_size=2000):
+    """Escribe los lugares en ``destino`` (archivo de texto abierto) por trozos. Devuelve cuántos."""
+    queryset = Place.objects.all() if queryset is None else queryset
+    filas = queryset.order_by('pk').values_list(*CAMPOS).iterator(chunk_size=chunk_size)
+    escritor = csv.writer(destino) if formato == 'csv' else None
+    if escritor:
+        escritor.writerow(CAMPOS)
+    total = 0
+    for fila in filas:
+        valores = ['' if v is None else str(v) for v in fila]
+        if escritor:
+            escritor.writerow(valores)
+        else:
+            destino.write(json.dumps(dict(zip(CAMPOS, valores)), ensure_ascii=False) + '\n')
+        total += 1
+    return total
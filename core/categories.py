@@ -0,0 +1,99 @@
+"""
+Categorías normalizadas de ``Place``.
+
+El texto libre ``Place.category`` ("Naturaleza / Aventura, Cultura & Gastronomía")
+se separa una sola vez al guardar el lugar y se refleja en la relación
+``Place.categories``; los filtros usan esa relación (join indexado) en vez de
+``icontains`` y la lista de categorías para los filtros se sirve desde la caché
+de Django, que se invalida en cada escritura (ver ``core/signals.py``).
+"""
+import re
+
+from django.core.cache import cache
+from django.utils.text import slugify
+
+CLAVE_LISTA = 'core:categorias:nombres'
+# Respaldo por si otro proceso escribió (la invalidación solo llega a esta caché)
+TTL_LISTA = 60 * 5
+
+# Separadores típicos: coma, slash, ampersand, ' y '
+SEPARADORES = re.compile(r'[,/&]| y ', flags=re.IGNORECASE)
+
+
+def separar_categorias(raw):
+    """
+    Separa una cadena de categorías tipo:
+    'Naturaleza / Aventura, Cultura & Gastronomía'
+    en ['Naturaleza', 'Aventura', 'Cultura', 'Gastronomía']
+    """
+    partes = [p.strip() for p in SEPARADORES.split(raw or '')]
+    return [p for p in partes if p]
+
+
+def sincronizar_categorias(place):
+    """Crea las categorías que falten y deja ``place.categories`` igual al texto de ``place.category``."""
+    from .models import Category
+
+    categorias = {}
+    for nombre in separar_categorias(place.category):
+        slug = slugify(nombre)
+        if slug and slug not in categorias:
+            categorias[slug], _ = Category.objects.get_or_create(slug=slug, defaults={'name': nombre})
+    place.categories.set(categorias.values())
+
+
+def sincronizar_categorias_en_lote(places):
+    """
+    ``sincronizar_categorias`` para muchos lugares en unas pocas consultas (cargas
+    masivas con ``bulk_create``). No dispara ``m2m_changed``: quien llama invalida
+    las cachés.
+    """
+    from .models import Category, Place
+
+    por_lugar = {
+        place.pk: {slug: nombre for nombre in separar_categorias(place.category) if (slug := slugify(nombre))}
+        for place in places
+    }
+    nombres = {}
+    for categorias in por_lugar.values():
+        for slug, nombre in categorias.items():
+            nombres.setdefault(slug, nombre)
+    Category.objects.bulk_create(
+        [Category(name=nombre, slug=slug) for slug, nombre in nombres.items()], ignore_conflicts=True,
+    )
+    ids = dict(Category.objects.filter(slug__in=nombres).values_list('slug', 'pk'))
+    Relacion = Place.categories.through
+    Relacion.objects.filter(place_id__in=por_lugar).delete()
+    Relacion.objects.bulk_create([
+        Relacion(place_id=pk, category_id=ids[slug])
+        for pk, categorias in por_lugar.items()
+        for slug in categorias
+    ])
+
+
+def nombres_categorias():
+    """Nombres de las categorías con al menos un lugar, en orden alfabético (cacheado)."""
+    from .models import Category
+
+    nombres = cache.get(CLAVE_LISTA)
+    if nombres is None:
+        nombres = list(
+            Category.objects.filter(places__isnull=False)
+            .order_by('name').values_list('name', flat=True).distinct()
+        )
+        cache.set(CLAVE_LISTA, nombres, TTL_LISTA)
+    return nombres
+
+
+def nombres_canonicos(nombres):
+    """
+    Lleva los nombres de un filtro (``?category=naturaleza``) al ``Category.name``
+    guardado ("Naturaleza"), comparando por slug: sin mayúsculas ni tildes, como
+    ``sincronizar_categorias``. Los desconocidos quedan igual; sin repetidos.
+    """
+    por_slug = {slugify(nombre): nombre for nombre in nombres_categorias()}
+    return list(dict.fromkeys(por_slug.get(slugify(nombre), nombre) for nombre in nombres if nombre))
+
+
+def invalidar_categorias():
+    cache.delete(CLAVE_LISTA)
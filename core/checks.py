@@ -0,0 +1,27 @@
+"""
+Comprobaciones de configuración (``manage.py check``, ``runserver`` y los
+comandos como ``run_route_worker`` las ejecutan al arrancar).
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from . import ai_cache, jobs
+
+
+@register()
+def cache_de_rutas_compartida(app_configs, **kwargs):
+    """
+    Con ``RUNNER = 'worker'`` las rutas se generan en otro proceso: si la caché
+    de rutas es de memoria, la web nunca ve lo que el worker guardó y repite
+    las llamadas a SerpAPI y OpenAI.
+    """
+    if jobs.get_config()['RUNNER'] != 'worker':
+        return []
+    config = {**ai_cache.DEFAULTS, **getattr(settings, 'AI_CACHES', {}).get('rutas', {})}
+    if config['BACKEND'] != 'memory':
+        return []
+    return [Warning(
+        "AI_CACHES['rutas'] usa el backend 'memory' con ROUTE_JOBS['RUNNER'] = 'worker'.",
+        hint="Usa 'file' o 'database' (AI_ROUTE_CACHE_BACKEND) para compartir la caché con el worker.",
+        id='core.W001',
+    )]
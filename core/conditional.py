@@ -0,0 +1,110 @@
+"""
+GET condicional (``ETag`` / ``Last-Modified``) para places, place_detail y reviews.
+
+Los validadores salen de una sola consulta de agregados (``Max('updated_at')`` y
+``Count``) sobre las tablas que se muestran, sin cargar filas ni renderizar: si
+el cliente o la CDN manda ``If-None-Match`` o ``If-Modified-Since`` y nada
+cambió, ``condition()`` responde ``304`` vacío antes de llamar a la vista.
+
+El ``ETag`` incluye además el usuario (la barra de navegación y los botones de
+editar/borrar de sus reseñas cambian), el token CSRF en las páginas que lo
+llevan en un formulario (se rota al iniciar sesión), los parámetros GET y ``settings.CONDITIONAL_GET['VERSION']`` (para invalidar
+al desplegar plantillas nuevas). Los conteos cubren los borrados, que no mueven
+ningún ``updated_at``; por eso ``Last-Modified`` solo se usa cuando el cliente
+no manda ``If-None-Match``. Como la respuesta depende del usuario, va con
+``Cache-Control: private``: solo la reutiliza el navegador que la pidió.
+
+Los ratings se guardan con UPDATE pero cambian con las reseñas, que ya están en
+los agregados; las miniaturas mueven ``updated_at`` en su UPDATE (core/images.py).
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+DEFAULTS = {'ENABLED': True, 'VERSION': '1'}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CONDITIONAL_GET', {})}
+
+
+def _agregados(qs):
+    return qs.order_by().aggregate(ultimo=Max('updated_at'), filas=Count('pk'))
+
+
+def _estado_lugares():
+    from .models import Place, Review
+
+    return [_agregados(Place.objects.all()), _agregados(Review.objects.all())]
+
+
+def _estado_lugar(slug):
+    from .models import Place
+
+    fila = (
+        Place.objects.filter(slug=slug).order_by()
+        .values('pk', 'updated_at')
+        .annotate(ultima_resena=Max('reviews__updated_at'), resenas=Count('reviews'))
+        .first()
+    )
+    if fila is None:
+        return None
+    return [{'ultimo': fila['updated_at'], 'filas': 1}, {'ultimo': fila['ultima_resena'], 'filas': fila['resenas']}]
+
+
+def _estado_resenas():
+    from .models import Place, Review, UserProfile
+
+    return [_agregados(Review.objects.all()), _agregados(Place.objects.all()), _agregados(UserProfile.objects.all())]
+
+
+def validadores(estado, csrf=False):
+    """``estado(request, *args, **kwargs) -> [{'ultimo', 'filas'}, ...]`` → decorador ``condition``.
+
+    ``csrf=True`` para las páginas que incluyen ``{% csrf_token %}``.
+    """
+    def calcular(request, *args, **kwargs):
+        # condition() pide el ETag y la fecha por separado: una sola consulta por petición
+        if not hasattr(request, '_validadores'):
+            partes = estado(request, *args, **kwargs)
+            if partes is None:
+                request._validadores = (None, None)
+            else:
+                fechas = [p['ultimo'] for p in partes if p['ultimo'] is not None]
+                firma = repr((
+                    get_config()['VERSION'], request.user.pk,
+                    request.META.get('CSRF_COOKIE') if csrf else None,
+                    sorted(request.GET.lists()), [(p['ultimo'], p['filas']) for p in partes],
+                ))
+                request._validadores = (
+                    hashlib.md5(firma.encode(), usedforsecurity=False).hexdigest(),
+                    max(fechas, default=None),
+                )
+        return request._validadores
+
+    decorador = condition(
+        etag_func=lambda request, *args, **kwargs: calcular(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: calcular(request, *args, **kwargs)[1],
+    )
+
+    def aplicar(view):
+        condicional = decorador(view)
+
+        @wraps(view)
+        def envuelta(request, *args, **kwargs):
+            if not get_config()['ENABLED']:
+                return view(request, *args, **kwargs)
+            response = condicional(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+        return envuelta
+    return aplicar
+
+
+lugares_condicional = validadores(lambda request: _estado_lugares())
+lugar_condicional = validadores(lambda request, slug: _estado_lugar(slug))
+resenas_condicional = validadores(lambda request: _estado_resenas(), csrf=True)
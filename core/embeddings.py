@@ -0,0 +1,267 @@
+"""
+Embeddings de texto para la búsqueda semántica de ``TripItem``.
+
+Configuración en ``settings.AI_EMBEDDINGS``::
+
+    AI_EMBEDDINGS = {'BACKEND': 'openai', 'MODEL': 'text-embedding-3-small'}
+
+``BACKEND = 'local'`` calcula vectores deterministas sin red (hashing de
+palabras y trigramas), para tests y entornos sin clave de OpenAI.
+
+``generar_embeddings`` rellena ``TripItem.embedding`` por lotes: recorre las
+filas sin embedding por id, manda ``BATCH_SIZE`` textos por petición con a lo
+sumo ``CONCURRENCY`` peticiones en curso, reintenta con espera exponencial y
+guarda cada lote con ``bulk_update``. Lo guardado no se repite, así que tras
+una interrupción basta con volver a ejecutarlo.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .ai_cache import clave_parametros, get_cache, normalizar_texto
+from .perf import medir
+from .web_search import FaltaConfiguracion
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIEmbeddings:
+    """Embeddings de OpenAI; ``embed`` recibe una lista de textos en una sola petición."""
+
+    def __init__(self, model='text-embedding-3-small', dimensions=None, **options):
+        self.model = model
+        self.dimensions = dimensions
+        self._client = None
+
+    def _cliente(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            if not os.getenv('OPENAI_API_KEY'):
+                raise FaltaConfiguracion("Falta la clave OPENAI_API_KEY en el archivo .env")
+            self._client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._client
+
+    def embed(self, textos):
+        extra = {'dimensions': self.dimensions} if self.dimensions else {}
+        with medir('openai'):
+            response = self._cliente().embeddings.create(model=self.model, input=list(textos), **extra)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+class LocalEmbeddings:
+    """
+    Embeddings deterministas sin red: cada palabra y trigrama del texto
+    normalizado suma ±1 en una posición elegida por su hash (blake2b, estable
+    entre procesos). Textos con palabras en común quedan cerca.
+    """
+
+    def __init__(self, dimensions=None, **options):
+        self.dimensions = dimensions or 256
+
+    def _rasgos(self, texto):
+        palabras = normalizar_texto(texto).split()
+        for palabra in palabras:
+            yield palabra
+            relleno = f' {palabra} '
+            for i in range(len(relleno) - 2):
+                yield relleno[i:i + 3]
+
+    def embed(self, textos):
+        vectores = np.zeros((len(textos), self.dimensions), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            for rasgo in self._rasgos(texto):
+                h = int.from_bytes(hashlib.blake2b(rasgo.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectores[fila, h % self.dimensions] += 1 if h >> 63 else -1
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        normas[normas == 0] = 1
+        return (vectores / normas).tolist()
+
+
+BACKENDS = {
+    'openai': OpenAIEmbeddings,
+    'local': LocalEmbeddings,
+}
+
+DEFAULTS = {
+    'BACKEND': 'openai',
+    'MODEL': 'text-embedding-3-small',
+    'DIMENSIONS': None,      # None = la del modelo (256 en 'local')
+    'BATCH_SIZE': 100,       # textos por petición
+    'CONCURRENCY': 4,        # peticiones simultáneas
+    'MAX_RETRIES': 5,
+    'BACKOFF': 1.0,          # segundos antes del primer reintento; se duplica en cada uno
+}
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AI_EMBEDDINGS', {})}
+
+
+def get_embedder():
+    with _state_lock:
+        if 'backend' not in _state:
+            config = get_config()
+            _state['backend'] = BACKENDS[config['BACKEND']](model=config['MODEL'], dimensions=config['DIMENSIONS'])
+        return _state['backend']
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    if setting == 'AI_EMBEDDINGS':
+        with _state_lock:
+            _state.clear()
+
+
+def embed_textos(textos):
+    return get_embedder().embed(textos)
+
+
+def embed_consultas(textos):
+    """
+    ``embed_textos`` para búsquedas de usuarios, con caché ``consultas``: la
+    misma consulta (sin distinguir mayúsculas ni tildes) no vuelve a OpenAI.
+    """
+    config = get_config()
+    cache = get_cache('consultas')
+    claves = [
+        clave_parametros({'modelo': f"{config['BACKEND']}:{config['MODEL']}:{config['DIMENSIONS']}", 'texto': t})
+        for t in textos
+    ]
+    vectores = [cache.get(k) for k in claves]
+    faltan = [i for i, v in enumerate(vectores) if v is None]
+    if faltan:
+        for i, vector in zip(faltan, embed_textos([textos[i] for i in faltan])):
+            vectores[i] = list(vector)
+            cache.set(claves[i], vectores[i])
+    return vectores
+
+
+# ============================================
+# GENERACIÓN POR LOTES
+# ============================================
+
+def texto_para_embedding(item):
+    """Texto de un ``TripItem`` que se convierte en vector."""
+    partes = [item.name, item.description, item.get_place_type_display(), item.city, item.country]
+    return '. '.join(p for p in partes if p)
+
+
+def embed_con_reintentos(textos, config=None):
+    """
+    ``embed_textos`` con reintentos y espera exponencial con jitter ante
+    errores transitorios (límite de peticiones, red, 5xx). Una clave ausente
+    no se reintenta.
+    """
+    config = config or get_config()
+    for intento in range(config['MAX_RETRIES'] + 1):
+        try:
+            return embed_textos(textos)
+        except FaltaConfiguracion:
+            raise
+        except Exception as e:
+            if intento == config['MAX_RETRIES']:
+                raise
+            espera = config['BACKOFF'] * 2 ** intento * random.uniform(0.5, 1.5)
+            logger.warning('Lote de embeddings fallido (%s); reintento %s en %.1fs', e, intento + 1, espera)
+            time.sleep(espera)
+
+
+def _lotes_pendientes(qs, tamano, limite):
+    """Lotes de ``TripItem`` en orden de id, leídos por cursor (``pk > último``) sin OFFSET."""
+    ultimo, entregados = 0, 0
+    campos = ('pk', 'name', 'description', 'place_type', 'city', 'country')
+    while limite is None or entregados < limite:
+        n = tamano if limite is None else min(tamano, limite - entregados)
+        lote = list(qs.filter(pk__gt=ultimo).order_by('pk').only(*campos)[:n])
+        if not lote:
+            return
+        ultimo = lote[-1].pk
+        entregados += len(lote)
+        yield lote
+
+
+def generar_embeddings(qs=None, todos=False, limite=None, batch_size=None, concurrency=None, progreso=None):
+    """
+    Calcula y guarda los embeddings de ``qs`` (por defecto todos los
+    ``TripItem``); solo los que no tienen, salvo ``todos=True``. Las
+    peticiones corren en un pool de hilos y la escritura, en orden de id, en
+    el hilo que llama: ``ultimo_id`` es siempre un punto de reanudación válido.
+    ``progreso(estadisticas)`` se invoca tras guardar cada lote. Devuelve
+    ``{'procesados', 'fallidos', 'lotes', 'ultimo_id', 'segundos', 'por_segundo'}``.
+    """
+    from .models import TripItem
+    from .vectors import invalidar_indice
+
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    concurrency = concurrency or config['CONCURRENCY']
+    qs = TripItem.objects.all() if qs is None else qs
+    if not todos:
+        qs = qs.filter(embedding=None)
+
+    stats = {'procesados': 0, 'fallidos': 0, 'lotes': 0, 'ultimo_id': None, 'segundos': 0.0, 'por_segundo': 0.0}
+    inicio = time.perf_counter()
+
+    def actualizar_ritmo():
+        stats['segundos'] = time.perf_counter() - inicio
+        stats['por_segundo'] = stats['procesados'] / stats['segundos'] if stats['segundos'] else 0.0
+
+    def guardar(future, lote):
+        try:
+            vectores = future.result()
+        except FaltaConfiguracion:
+            raise
+        except Exception as e:
+            # Quedan sin embedding y se intentan en la próxima ejecución
+            logger.error('Lote de %s TripItem (desde id %s) descartado: %s', len(lote), lote[0].pk, e)
+            stats['fallidos'] += len(lote)
+        else:
+            ahora = timezone.now()
+            for item, vector in zip(lote, vectores):
+                item.set_embedding(vector)
+                # bulk_update no aplica auto_now; el índice IVF se sincroniza por updated_at
+                item.updated_at = ahora
+            TripItem.objects.bulk_update(lote, ['embedding', 'updated_at'])
+            stats['procesados'] += len(lote)
+            stats['lotes'] += 1
+        stats['ultimo_id'] = lote[-1].pk
+        actualizar_ritmo()
+        if progreso:
+            progreso(dict(stats))
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='embeddings')
+    en_curso = deque()
+    try:
+        for lote in _lotes_pendientes(qs, batch_size, limite):
+            # Como mucho ``concurrency`` lotes pidiéndose a la vez
+            if len(en_curso) >= concurrency:
+                guardar(*en_curso.popleft())
+            textos = [texto_para_embedding(item) for item in lote]
+            en_curso.append((pool.submit(embed_con_reintentos, textos, config), lote))
+        while en_curso:
+            guardar(*en_curso.popleft())
+    finally:
+        for future, _ in en_curso:
+            future.cancel()
+        pool.shutdown(wait=True)
+        if stats['procesados']:
+            # bulk_update no emite post_save
+            invalidar_indice()
+
+    actualizar_ritmo()
+    return stats
@@ -0,0 +1,247 @@
+"""
+Versiones reducidas (AVIF, WebP y JPEG) de ``Place.photo`` y ``UserProfile.photo``.
+
+Cada original se convierte a varios anchos sin ampliarlo. Los archivos se
+guardan en el storage de media por defecto con nombres deterministas que incluyen
+el hash del contenido::
+
+    derivados/places_photos/Montería.3fa9c1d2e4b5.480w.webp
+
+Si el original cambia, cambia el hash y con él la URL: los navegadores nunca
+ven una versión vieja y los derivados se pueden cachear para siempre. Los del
+original anterior se borran al registrar los nuevos (si nadie más lo usa). Qué se
+generó (original, hash, anchos y formatos) se guarda en ``<campo>_derivatives``
+del modelo, así las plantillas arman el ``srcset`` sin tocar el disco
+(``{% picture %}`` en core/templatetags/imagenes.py).
+
+Se generan al subir una foto (después del commit, en un hilo aparte) y en
+bloque con ``manage.py generate_image_derivatives``.
+
+Los formatos que el Pillow instalado no sabe escribir (AVIF sin libavif) se
+descartan al importar el módulo, con un aviso en el log.
+
+Configuración en ``settings.IMAGE_DERIVATIVES``::
+
+    IMAGE_DERIVATIVES = {'FORMATS': ['avif', 'webp', 'jpeg'], 'WORKERS': 2}
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PREFIX': 'derivados',
+    'FORMATS': ['avif', 'webp', 'jpeg'],
+    'QUALITY': {'avif': 55, 'webp': 78, 'jpeg': 80},
+    # Anchos por campo: tarjetas/portada de lugares y avatares (60-120 px en pantalla, x2 para retina)
+    'WIDTHS': {
+        'core.Place.photo': [240, 480, 960, 1600],
+        'core.UserProfile.photo': [64, 128, 256],
+    },
+    'BACKGROUND': True,      # al subir, generar en un hilo tras el commit
+    'WORKERS': 2,
+}
+
+FORMATOS_PIL = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+TIPOS_MIME = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# Nombre de cada formato en ``PIL.features`` (AVIF requiere Pillow compilado con libavif)
+FEATURES_PIL = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def formatos_soportados():
+    """Los formatos de ``FORMATOS_PIL`` que este Pillow sabe escribir; avisa de los que faltan."""
+    from PIL import features
+
+    soportados = {f for f, nombre in FEATURES_PIL.items() if features.check(nombre)}
+    faltan = sorted(set(FORMATOS_PIL) - soportados)
+    if faltan:
+        logger.warning('Pillow no puede escribir %s: no se generarán esos derivados', ', '.join(faltan))
+    return soportados
+
+
+# Se comprueba una vez por proceso
+SOPORTADOS = formatos_soportados()
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'IMAGE_DERIVATIVES', {})}
+    config['QUALITY'] = {**DEFAULTS['QUALITY'], **config['QUALITY']}
+    return config
+
+
+def clave_campo(fieldfile):
+    return f'{fieldfile.instance._meta.label}.{fieldfile.field.name}'
+
+
+def campo_derivados(fieldfile):
+    return f'{fieldfile.field.name}_derivatives'
+
+
+def nombre_derivado(nombre, digest, ancho, formato, prefijo):
+    """'places_photos/Cali.jpg' → 'derivados/places_photos/Cali.<digest>.480w.webp'"""
+    base, _ = os.path.splitext(nombre)
+    return f'{prefijo}/{base}.{digest}.{ancho}w.{formato}'
+
+
+def anchos_para(ancho_original, anchos):
+    """Los anchos que no amplían la imagen; si todos la ampliarían, solo su ancho original."""
+    return [a for a in anchos if a <= ancho_original] or [ancho_original]
+
+
+# ============================================
+# GENERACIÓN
+# ============================================
+
+def generar(nombre, anchos, origen=None, config=None):
+    """
+    Crea los derivados del original ``nombre`` (leído de ``origen``; los que ya
+    existan no se rehacen). Los derivados van al storage por defecto, con su
+    propio nombre: el de las fotos renombra por contenido. Devuelve la
+    descripción que se guarda en ``<campo>_derivatives``.
+    """
+    from PIL import Image, ImageOps
+
+    origen = origen or default_storage
+    storage = default_storage
+    config = config or get_config()
+    with origen.open(nombre, 'rb') as f:
+        datos = f.read()
+    digest = hashlib.sha256(datos).hexdigest()[:12]
+
+    with Image.open(io.BytesIO(datos)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen.load()
+    tiene_alfa = imagen.mode in ('RGBA', 'LA') or 'transparency' in imagen.info
+    imagen = imagen.convert('RGBA' if tiene_alfa else 'RGB')
+
+    anchos = anchos_para(imagen.width, sorted(set(anchos)))
+    formatos = [f for f in config['FORMATS'] if f in SOPORTADOS]
+    for ancho in anchos:
+        alto = max(1, round(imagen.height * ancho / imagen.width))
+        reducida = None
+        for formato in formatos:
+            destino = nombre_derivado(nombre, digest, ancho, formato, config['PREFIX'])
+            if storage.exists(destino):
+                continue
+            if reducida is None:
+                reducida = imagen if ancho == imagen.width else imagen.resize((ancho, alto), Image.LANCZOS)
+            salida = io.BytesIO()
+            copia = reducida.convert('RGB') if formato == 'jpeg' else reducida
+            opciones = {'optimize': True, 'progressive': True} if formato == 'jpeg' else {}
+            copia.save(salida, FORMATOS_PIL[formato], quality=config['QUALITY'][formato], **opciones)
+            storage.save(destino, ContentFile(salida.getvalue()))
+    return {'fuente': nombre, 'hash': digest, 'anchos': anchos, 'formatos': formatos}
+
+
+def generar_para(instance, campo='photo', forzar=False):
+    """Genera los derivados de ``instance.<campo>`` y los registra con un UPDATE (sin señales)."""
+    fieldfile = getattr(instance, campo)
+    destino = campo_derivados(fieldfile)
+    anteriores = getattr(instance, destino)
+    if not fieldfile:
+        derivados = {}
+    elif not forzar and anteriores.get('fuente') == fieldfile.name:
+        return anteriores
+    else:
+        anchos = get_config()['WIDTHS'].get(clave_campo(fieldfile), [])
+        derivados = generar(fieldfile.name, anchos, fieldfile.storage)
+    # updated_at: la página cambia (srcset) y los ETag dependen de él (core/conditional.py)
+    cambios = {destino: derivados, 'updated_at': timezone.now()}
+    type(instance).objects.filter(pk=instance.pk).update(**cambios)
+    for campo_modelo, valor in cambios.items():
+        setattr(instance, campo_modelo, valor)
+    if (anteriores.get('fuente'), anteriores.get('hash')) != (derivados.get('fuente'), derivados.get('hash')):
+        borrar_derivados(instance, campo, anteriores)
+    if instance._meta.label == 'core.Place':
+        # El UPDATE no dispara señales: las páginas cacheadas aún tienen el <img> sin srcset
+        from .page_cache import etiqueta_lugar, invalidar
+        invalidar('lugares', etiqueta_lugar(instance.slug))
+    return derivados
+
+
+def borrar_derivados(instance, campo, derivados):
+    """
+    Borra los archivos de ``derivados`` (la descripción que ``instance`` ya no
+    usa) salvo que otro registro tenga todavía ese original: las fotos se
+    nombran por contenido y dos lugares pueden compartir archivo y derivados.
+    """
+    fuente = derivados.get('fuente')
+    if not fuente or type(instance).objects.filter(**{campo: fuente}).exclude(pk=instance.pk).exists():
+        return
+    prefijo = get_config()['PREFIX']
+    for ancho in derivados.get('anchos', []):
+        for formato in derivados.get('formatos', []):
+            nombre = nombre_derivado(fuente, derivados['hash'], ancho, formato, prefijo)
+            try:
+                default_storage.delete(nombre)
+            except OSError as e:
+                logger.warning('No se pudo borrar el derivado %s: %s', nombre, e)
+
+
+def pendiente(instance, campo='photo'):
+    """La foto cambió (o se quitó) desde la última generación."""
+    fieldfile = getattr(instance, campo)
+    return (fieldfile.name or None) != getattr(instance, campo_derivados(fieldfile)).get('fuente')
+
+
+def _executor():
+    with _state_lock:
+        if 'executor' not in _state:
+            _state['executor'] = ThreadPoolExecutor(
+                max_workers=get_config()['WORKERS'], thread_name_prefix='imagenes'
+            )
+        return _state['executor']
+
+
+def _generar_en_hilo(modelo, pk, campo):
+    try:
+        instance = modelo.objects.filter(pk=pk).first()
+        if instance is not None and pendiente(instance, campo):
+            generar_para(instance, campo)
+    except Exception:
+        logger.exception('No se pudieron generar los derivados de %s %s', modelo.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def programar(instance, campo='photo'):
+    """Tras el commit, genera los derivados en segundo plano (o en el acto si ``BACKGROUND`` es False)."""
+    modelo, pk = type(instance), instance.pk
+    if get_config()['BACKGROUND']:
+        transaction.on_commit(lambda: _executor().submit(_generar_en_hilo, modelo, pk, campo))
+    else:
+        transaction.on_commit(lambda: _generar_en_hilo(modelo, pk, campo))
+
+
+# ============================================
+# SRCSET
+# ============================================
+
+def variantes(fieldfile):
+    """``{formato: [(url, ancho), ...]}`` de los derivados registrados; vacío si no hay."""
+    if not fieldfile:
+        return {}
+    derivados = getattr(fieldfile.instance, campo_derivados(fieldfile), None) or {}
+    if derivados.get('fuente') != fieldfile.name:
+        return {}
+    prefijo = get_config()['PREFIX']
+    return {
+        formato: [
+            (default_storage.url(nombre_derivado(fieldfile.name, derivados['hash'], ancho, formato, prefijo)), ancho)
+            for ancho in derivados['anchos']
+        ]
+        for formato in derivados['formatos']
+    }
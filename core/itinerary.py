@@ -0,0 +1,370 @@
+"""
+Generación de rutas turísticas con IA: contexto local (``Place`` y ``TripItem``,
+ver core/retrieval.py), contexto web (SerpAPI) si lo local no alcanza y modelo (OpenAI).
+
+Las respuestas se guardan en la caché ``rutas`` indexadas por los parámetros
+normalizados, así que dos solicitudes equivalentes comparten el resultado.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+from .ai_cache import clave_parametros, get_cache
+from .perf import medir
+from .retrieval import contexto_local
+from .singleflight import SingleFlight, acandado_entre_procesos, candado_entre_procesos
+from . import web_search
+from .web_search import FaltaConfiguracion
+
+# Cargar variables desde openAI.env
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'openAI.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+# Peticiones idénticas en curso comparten una sola llamada a SerpAPI/OpenAI
+vuelos = SingleFlight()
+
+MODELO = "gpt-4o-mini"
+SISTEMA = "Eres un asistente experto en turismo colombiano."
+
+
+def leer_parametros(data):
+    """Extrae del POST los parámetros del formulario de ``donde_ir``."""
+    return {
+        'ciudad': data.get("ciudad"),
+        'pais': data.get("pais"),
+        'presupuesto': data.get("presupuesto"),
+        'dias': data.get("dias"),
+        'intereses': data.getlist("intereses"),
+        'evento': data.get("evento"),
+        'barrio': data.get("barrio"),
+    }
+
+
+def clave_ruta(params):
+    """Clave de caché: los mismos datos con otras mayúsculas, tildes u orden comparten entrada."""
+    return clave_parametros({**params, 'dias': int(params['dias'])})
+
+
+def construir_prompt(params):
+    p = params
+    return (
+        f"Genera una ruta turística personalizada en {p['ciudad']}, {p['pais']}, "
+        f"para {p['dias']} días, con un presupuesto aproximado de {p['presupuesto']} por persona cada día. "
+        f"El viajero está interesado en eventos tipo {p['evento']}. "
+        f"El hospedaje está en la zona {p['barrio']}. "
+        f"Incluye actividades, costos estimados y lugares cercanos relevantes a mi zona de hospedaje."
+        f"Necesito que devuelvas un texto conciso y completo con la información solicitada. "
+        f"Separa los días de forma visible en la respuesta, y devuelve una propuesta para cada uno de los {p['dias']} dias"
+        f"y termina siempre con una recomendación final o conclusión."
+    )
+
+
+def buscar_contexto_web(params):
+    """Resumen de resultados web (caché ``busquedas``, ver core/web_search.py)."""
+    return web_search.resumen_web(params)
+
+
+def _contexto_suficiente(params, local):
+    if local['suficiente']:
+        logger.info(
+            'Ruta para %s sin búsqueda web: %s recomendaciones locales (%s tokens)',
+            params['ciudad'], local['recomendaciones'], local['tokens'],
+        )
+    return local['suficiente']
+
+
+def buscar_contexto(params):
+    """``(resumen_web, texto_local)``; la búsqueda web solo si el contexto local no alcanza."""
+    local = contexto_local(params)
+    if _contexto_suficiente(params, local):
+        return '', local['texto']
+    return buscar_contexto_web(params), local['texto']
+
+
+def construir_mensajes(params, resumen_web, texto_local=''):
+    secciones = []
+    if texto_local:
+        secciones.append(
+            "Lugares y experiencias verificados de la base de datos de Akua. Básate en ellos "
+            "y respeta sus costos; no inventes lugares que contradigan estos datos:\n"
+            f"{texto_local}"
+        )
+    if resumen_web:
+        secciones.append(
+            "Usa la siguiente información web reciente para construir una respuesta turística completa:\n"
+            f"{resumen_web}"
+        )
+    prompt_final = '\n\n'.join(secciones + [f"Solicitud del usuario:\n{construir_prompt(params)}"])
+    return [
+        {"role": "system", "content": SISTEMA},
+        {"role": "user", "content": prompt_final},
+    ]
+
+
+# ============================================
+# BACKENDS DEL MODELO
+# ============================================
+
+class OpenAIBackend:
+    """gpt-4o-mini con los clientes síncrono y asíncrono de OpenAI."""
+
+    def __init__(self, **options):
+        # Inicializar clientes de OpenAI con la API key del archivo .env
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.aclient = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+    def _kwargs(self, mensajes, **extra):
+        return dict(model=MODELO, messages=mensajes, max_tokens=2000, temperature=0.7, **extra)
+
+    def complete(self, mensajes):
+        response = self.client.chat.completions.create(**self._kwargs(mensajes))
+        return response.choices[0].message.content
+
+    def stream(self, mensajes):
+        for chunk in self.client.chat.completions.create(**self._kwargs(mensajes, stream=True)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def acomplete(self, mensajes):
+        response = await self.aclient.chat.completions.create(**self._kwargs(mensajes))
+        return response.choices[0].message.content
+
+    async def astream(self, mensajes):
+        async for chunk in await self.aclient.chat.completions.create(**self._kwargs(mensajes, stream=True)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubBackend:
+    """Respuesta fija sin red; ``STUB_LATENCY`` simula la espera hasta el primer token."""
+
+    def __init__(self, latency=0, **options):
+        self.latency = latency
+
+    def _texto(self, mensajes):
+        return f"### Día 1\n- **Ruta de prueba**: {mensajes[-1]['content'][-80:]}\n\nRecomendación final: disfruta."
+
+    def complete(self, mensajes):
+        time.sleep(self.latency)
+        return self._texto(mensajes)
+
+    def stream(self, mensajes):
+        time.sleep(self.latency)
+        for palabra in self._texto(mensajes).split(' '):
+            yield palabra + ' '
+
+    async def acomplete(self, mensajes):
+        await asyncio.sleep(self.latency)
+        return self._texto(mensajes)
+
+    async def astream(self, mensajes):
+        await asyncio.sleep(self.latency)
+        for palabra in self._texto(mensajes).split(' '):
+            yield palabra + ' '
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend,
+}
+
+_modelo = {}
+_modelo_lock = threading.Lock()
+
+
+def get_modelo():
+    """Backend configurado en ``settings.AI_MODEL`` (una instancia por proceso)."""
+    with _modelo_lock:
+        if 'backend' not in _modelo:
+            config = {'BACKEND': 'openai', 'STUB_LATENCY': 0, **getattr(settings, 'AI_MODEL', {})}
+            _modelo['backend'] = BACKENDS[config['BACKEND']](latency=config['STUB_LATENCY'])
+        return _modelo['backend']
+
+
+@receiver(setting_changed)
+def _reset_modelo(setting, **kwargs):
+    if setting == 'AI_MODEL':
+        with _modelo_lock:
+            _modelo.clear()
+
+
+def consultar_modelo(mensajes):
+    with medir('openai'):
+        return get_modelo().complete(mensajes)
+
+
+def consultar_modelo_stream(mensajes):
+    """
+    Igual que ``consultar_modelo`` pero va entregando los fragmentos de texto.
+    ``openai`` cuenta hasta el último fragmento.
+    """
+    with medir('openai'):
+        yield from get_modelo().stream(mensajes)
+
+
+def itinerario_en_cache(params):
+    """Texto guardado para estos parámetros, o ``None`` si hay que generarlo."""
+    return get_cache('rutas').get(clave_ruta(params))
+
+
+def _generar(params, key):
+    """Llamadas externas del líder (ver core/singleflight.py)."""
+    cache = get_cache('rutas')
+    with candado_entre_procesos(key) as coordinado:
+        # Otro proceso pudo generarla mientras esperábamos el candado
+        if coordinado:
+            resultado = cache.get(key, contar=False)
+            if resultado is not None:
+                return resultado
+
+        resultado = consultar_modelo(construir_mensajes(params, *buscar_contexto(params)))
+        cache.set(key, resultado)
+        return resultado
+
+
+def generar_itinerario(params):
+    """
+    Devuelve ``(texto, reutilizado)``; ``reutilizado`` indica que el texto salió
+    de la caché o de otra petición idéntica en curso.
+    Solo llama a SerpAPI y OpenAI cuando la combinación no está en caché.
+    """
+    key = clave_ruta(params)
+    resultado = get_cache('rutas').get(key)
+    if resultado is not None:
+        return resultado, True
+    return vuelos.do(key, lambda: _generar(params, key))
+
+
+def _generar_stream(params, key):
+    cache = get_cache('rutas')
+    with candado_entre_procesos(key) as coordinado:
+        if coordinado:
+            resultado = cache.get(key, contar=False)
+            if resultado is not None:
+                yield resultado
+                return
+
+        partes = []
+        for fragmento in consultar_modelo_stream(construir_mensajes(params, *buscar_contexto(params))):
+            partes.append(fragmento)
+            yield fragmento
+        cache.set(key, ''.join(partes))
+
+
+def generar_itinerario_stream(params):
+    """
+    Versión por fragmentos de ``generar_itinerario``: entrega el texto a medida
+    que llega del modelo y lo guarda en caché al terminar. Quien se une a una
+    generación idéntica en curso recibe el texto completo cuando esta termina.
+    """
+    key = clave_ruta(params)
+    resultado = get_cache('rutas').get(key)
+    if resultado is not None:
+        yield resultado
+        return
+    yield from vuelos.do_stream(key, lambda: _generar_stream(params, key))
+
+
+# ============================================
+# VERSIONES ASÍNCRONAS (vistas bajo ASGI)
+# ============================================
+
+def _descartar(tarea):
+    """Evita el aviso de excepción no recuperada si nadie llega a esperar la tarea."""
+    tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def abuscar_contexto(params):
+    """Versión asíncrona de ``buscar_contexto``."""
+    local = await sync_to_async(contexto_local)(params)
+    if _contexto_suficiente(params, local):
+        return '', local['texto']
+    return await web_search.aresumen_web(params), local['texto']
+
+
+def _lanzar_busqueda(params):
+    """
+    Empieza la búsqueda de contexto (local y, si hace falta, web) en una tarea,
+    para que corra mientras se espera el candado entre procesos. Solo la lanza
+    quien va a generar: ni los aciertos de caché ni quienes se unen a una
+    generación en curso pagan SerpAPI ni embeddings.
+    """
+    busqueda = asyncio.ensure_future(abuscar_contexto(params))
+    # Puede quedar sin esperar (otro proceso dejó la ruta en caché)
+    _descartar(busqueda)
+    return busqueda
+
+
+async def _agenerar(params, key):
+    cache = get_cache('rutas')
+    busqueda = _lanzar_busqueda(params)
+    async with acandado_entre_procesos(key) as coordinado:
+        if coordinado:
+            resultado = await sync_to_async(cache.get)(key, contar=False)
+            if resultado is not None:
+                busqueda.cancel()
+                return resultado
+
+        mensajes = construir_mensajes(params, *await busqueda)
+        with medir('openai'):
+            resultado = await get_modelo().acomplete(mensajes)
+        await sync_to_async(cache.set)(key, resultado)
+        return resultado
+
+
+async def agenerar_itinerario(params):
+    """Versión asíncrona de ``generar_itinerario``."""
+    resultado = await sync_to_async(itinerario_en_cache)(params)
+    if resultado is not None:
+        return resultado, True
+
+    key = clave_ruta(params)
+    return await vuelos.ado(key, lambda: _agenerar(params, key))
+
+
+async def aconsultar_modelo_stream(mensajes):
+    """Versión asíncrona de ``consultar_modelo_stream``."""
+    with medir('openai'):
+        async for fragmento in get_modelo().astream(mensajes):
+            yield fragmento
+
+
+async def _agenerar_stream(params, key):
+    cache = get_cache('rutas')
+    busqueda = _lanzar_busqueda(params)
+    async with acandado_entre_procesos(key) as coordinado:
+        if coordinado:
+            resultado = await sync_to_async(cache.get)(key, contar=False)
+            if resultado is not None:
+                busqueda.cancel()
+                yield resultado
+                return
+
+        partes = []
+        async for fragmento in aconsultar_modelo_stream(construir_mensajes(params, *await busqueda)):
+            partes.append(fragmento)
+            yield fragmento
+        await sync_to_async(cache.set)(key, ''.join(partes))
+
+
+async def agenerar_itinerario_stream(params):
+    """Versión asíncrona de ``generar_itinerario_stream``."""
+    resultado = await sync_to_async(itinerario_en_cache)(params)
+    if resultado is not None:
+        yield resultado
+        return
+
+    key = clave_ruta(params)
+    async for fragmento in vuelos.ado_stream(key, lambda: _agenerar_stream(params, key)):
+        yield fragmento
@@ -0,0 +1,209 @@
+"""
+Cola de generación de rutas en segundo plano, guardada en la tabla ``RouteJob``.
+
+``generar_ruta_ai`` solo encola y devuelve el id del trabajo; ``donde_ir.html``
+consulta ``route_job_status`` hasta que el trabajo termina y la ruta queda
+guardada. No hace falta ningún broker externo:
+
+- ``RUNNER = 'thread'``: un pool de hilos dentro del propio proceso web.
+- ``RUNNER = 'worker'``: los trabajos quedan pendientes y los ejecuta
+  ``python manage.py run_route_worker`` en otro proceso.
+- ``RUNNER = 'asyncio'``: tareas en el event loop del servidor ASGI, con los
+  clientes asíncronos de SerpAPI y OpenAI (solo bajo ASGI).
+
+Los runners dentro del proceso ('thread' y 'asyncio') se ponen en marcha con
+el primer trabajo: reencolan los abandonados por un proceso caído
+(``STALE_AFTER``) y retoman los pendientes.
+
+Configuración en ``settings.ROUTE_JOBS``::
+
+    ROUTE_JOBS = {'RUNNER': 'thread', 'WORKERS': 4, 'STALE_AFTER': 600}
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .itinerary import FaltaConfiguracion, agenerar_itinerario, generar_itinerario
+from .models import Route, RouteJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {'RUNNER': 'thread', 'WORKERS': 4, 'STALE_AFTER': 60 * 10}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ROUTE_JOBS', {})}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+        _executor = ThreadPoolExecutor(
+            max_workers=get_config()['WORKERS'], thread_name_prefix='route-jobs'
+        )
+        # Al arrancar: lo que dejó a medias un proceso anterior
+        for job_id in retomar():
+            _executor.submit(_ejecutar_en_hilo, job_id)
+        return _executor
+
+
+def guardar_ruta(user, params, resultado):
+    return Route.objects.create(
+        user=user,
+        city=params['ciudad'],
+        country=params['pais'],
+        days=int(params['dias']),
+        budget=params['presupuesto'],
+        ai_response=resultado
+    )
+
+
+def encolar(user, params):
+    """Crea el trabajo y, con el runner de hilos, lo lanza al confirmar la transacción."""
+    job = RouteJob.objects.create(user=user, params=params)
+    if get_config()['RUNNER'] == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_ejecutar_en_hilo, job.pk))
+    return job
+
+
+def _ejecutar_en_hilo(job_id):
+    try:
+        ejecutar(job_id)
+    finally:
+        # Los hilos del pool no pasan por request_finished
+        close_old_connections()
+
+
+def reclamar(job_id):
+    """Marca el trabajo como en proceso. Falso si otro worker ya lo tomó."""
+    return RouteJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    ) == 1
+
+
+def ejecutar(job_id, reclamado=False):
+    """Genera la ruta del trabajo y guarda el ``Route``. Devuelve el trabajo actualizado."""
+    if not reclamado and not reclamar(job_id):
+        return None
+
+    job = RouteJob.objects.select_related('user').get(pk=job_id)
+    try:
+        resultado, _ = generar_itinerario(job.params)
+        job.route = guardar_ruta(job.user, job.params, resultado)
+        job.status = 'done'
+    except FaltaConfiguracion as e:
+        job.status = 'error'
+        job.error = str(e)
+    except Exception as e:
+        logger.exception('Error en el trabajo de ruta %s', job_id)
+        job.status = 'error'
+        job.error = f"No se pudo generar la ruta: {str(e)}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=['route', 'status', 'error', 'finished_at'])
+    return job
+
+
+def siguiente_pendiente():
+    """Id del trabajo pendiente más antiguo (o ``None``)."""
+    return (
+        RouteJob.objects.filter(status='pending')
+        .order_by('created_at').values_list('pk', flat=True).first()
+    )
+
+
+def reencolar_abandonados():
+    """Devuelve a 'pending' los trabajos que quedaron 'running' tras caerse un worker."""
+    limite = timezone.now() - timedelta(seconds=get_config()['STALE_AFTER'])
+    return RouteJob.objects.filter(status='running', started_at__lt=limite).update(
+        status='pending', started_at=None
+    )
+
+
+def retomar():
+    """Reencola los abandonados y devuelve los ids pendientes, del más antiguo al más nuevo."""
+    reencolados = reencolar_abandonados()
+    if reencolados:
+        logger.warning('Trabajos de ruta abandonados reencolados: %s', reencolados)
+    return list(
+        RouteJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)
+    )
+
+
+# ============================================
+# VERSIÓN ASÍNCRONA (RUNNER = 'asyncio')
+# ============================================
+
+# Referencias fuertes: el event loop solo guarda referencias débiles a las tareas
+_tareas = set()
+# Event loops en los que ya se retomaron los pendientes
+_loops = weakref.WeakSet()
+
+
+def _lanzar(job_id):
+    tarea = asyncio.get_running_loop().create_task(aejecutar(job_id))
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+
+
+async def aencolar(user, params):
+    """Como ``encolar``; con el runner 'asyncio' el trabajo corre en el event loop actual."""
+    if get_config()['RUNNER'] != 'asyncio':
+        return await sync_to_async(encolar)(user, params)
+
+    loop = asyncio.get_running_loop()
+    if loop not in _loops:
+        _loops.add(loop)
+        for job_id in await sync_to_async(retomar)():
+            _lanzar(job_id)
+    job = await RouteJob.objects.acreate(user=user, params=params)
+    _lanzar(job.pk)
+    return job
+
+
+async def aejecutar(job_id):
+    """Versión asíncrona de ``ejecutar``."""
+    reclamado = await RouteJob.objects.filter(pk=job_id, status='pending').aupdate(
+        status='running', started_at=timezone.now()
+    )
+    if not reclamado:
+        return None
+
+    job = await RouteJob.objects.select_related('user').aget(pk=job_id)
+    try:
+        resultado, _ = await agenerar_itinerario(job.params)
+        job.route = await aguardar_ruta(job.user, job.params, resultado)
+        job.status = 'done'
+    except FaltaConfiguracion as e:
+        job.status = 'error'
+        job.error = str(e)
+    except Exception as e:
+        logger.exception('Error en el trabajo de ruta %s', job_id)
+        job.status = 'error'
+        job.error = f"No se pudo generar la ruta: {str(e)}"
+    job.finished_at = timezone.now()
+    await job.asave(update_fields=['route', 'status', 'error', 'finished_at'])
+    return job
+
+
+async def aguardar_ruta(user, params, resultado):
+    return await Route.objects.acreate(
+        user=user,
+        city=params['ciudad'],
+        country=params['pais'],
+        days=int(params['dias']),
+        budget=params['presupuesto'],
+        ai_response=resultado
+    )
@@ -0,0 +1,51 @@
+"""Utilidades compartidas por los comandos de benchmark (no es un comando)."""
+import os
+import shutil
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def base_temporal():
+    """
+    Crea una base de datos SQLite temporal en disco con todas las migraciones
+    y la elimina (con su carpeta) al terminar. En disco (y no en memoria) para que varios hilos
+    puedan escribir a la vez como en producción. La caché también va al
+    directorio temporal: la del proyecto tiene páginas de otra base.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='akua-bench-')
+    for alias in connections:
+        test = connections[alias].settings_dict.setdefault('TEST', {})
+        test['NAME'] = os.path.join(tmpdir, f'{alias}.sqlite3')
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tmpdir, 'cache'),
+        }}):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def resumen_latencias(latencias):
+    """p50/p95/p99 y media en milisegundos."""
+    if not latencias:
+        return {'p50_ms': 0, 'p95_ms': 0, 'p99_ms': 0, 'media_ms': 0}
+    ordenadas = sorted(latencias)
+
+    def pct(p):
+        return round(ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))] * 1000, 2)
+
+    return {
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'media_ms': round(statistics.fmean(ordenadas) * 1000, 2),
+    }
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.embeddings import generar_embeddings, get_config
+from core.models import TripItem
+from core.web_search import FaltaConfiguracion
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los embeddings de los TripItem que no tienen (por lotes, con peticiones "
+        "concurrentes y reintentos). Si se interrumpe, al volver a ejecutarlo continúa "
+        "con los que faltan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Textos por petición (AI_EMBEDDINGS['BATCH_SIZE'])")
+        parser.add_argument('--concurrency', type=int, help="Peticiones simultáneas (AI_EMBEDDINGS['CONCURRENCY'])")
+        parser.add_argument('--limite', type=int, help="Procesa como mucho este número de elementos")
+        parser.add_argument('--todos', action='store_true', help="Recalcula también los que ya tienen embedding")
+        parser.add_argument('--desde-id', type=int, default=0, help="Empieza después de este id (útil con --todos)")
+
+    def handle(self, *args, **options):
+        qs = TripItem.objects.filter(pk__gt=options['desde_id'])
+        pendientes = qs.count() if options['todos'] else qs.filter(embedding=None).count()
+        config = get_config()
+        self.stdout.write(
+            f"{pendientes} elementos por procesar con '{config['BACKEND']}' ({config['MODEL']})"
+        )
+
+        ultimo = {'id': None}
+
+        def progreso(stats):
+            ultimo['id'] = stats['ultimo_id']
+            self.stdout.write(
+                f"  {stats['procesados']}/{pendientes} ({stats['por_segundo']:.1f} elementos/s)"
+            )
+
+        try:
+            stats = generar_embeddings(
+                qs, todos=options['todos'], limite=options['limite'],
+                batch_size=options['batch_size'], concurrency=options['concurrency'], progreso=progreso,
+            )
+        except FaltaConfiguracion as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            raise CommandError(
+                f"Interrumpido; lo guardado se conserva. Para seguir: --desde-id {ultimo['id'] or options['desde_id']}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Embeddings generados: {stats['procesados']} en {stats['segundos']:.1f}s "
+            f"({stats['por_segundo']:.1f} elementos/s); fallidos: {stats['fallidos']}"
+        ))
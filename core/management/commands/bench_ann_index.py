@@ -0,0 +1,119 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.ann import IndiceIVF
+from core.vectors import IndiceVectorial
+
+from ._bench import resumen_latencias
+
+TIPOS = ['hotel', 'restaurant', 'attraction', 'activity', 'transport']
+CIUDADES = ['Bogotá', 'Medellín', 'Cali', 'Cartagena', 'Santa Marta', 'Montería', 'Pereira', 'Leticia']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el índice aproximado IVF con el exacto sobre vectores sintéticos agrupados: "
+        "tiempo de construcción, recall@k y latencia por consulta para varios nprobe, "
+        "con y sin filtros (place_type, ciudad y costo máximo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200_000)
+        parser.add_argument('--dim', type=int, default=256)
+        parser.add_argument('--grupos', type=int, default=500, help="Grupos de los datos sintéticos")
+        parser.add_argument('--nlist', type=int, default=None, help="Por defecto 4·√n")
+        parser.add_argument('--nprobe', type=int, action='append', help="Repetible. Por defecto 1, 4, 8, 16 y 32")
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        n, dim, k = options['items'], options['dim'], options['k']
+        vectores, consultas, (tipos, ciudades, costos) = self._datos(n, dim, options['grupos'], options['consultas'])
+        ids = np.arange(1, n + 1)
+
+        exacto = IndiceVectorial.desde_vectores(ids, vectores, tipos, ciudades, costos)
+        t0 = time.perf_counter()
+        ivf = IndiceIVF.construir(exacto.ids, exacto.matriz, exacto.atributos, nlist=options['nlist'])
+        construir = time.perf_counter() - t0
+        del vectores
+
+        escenarios = {
+            'sin_filtros': None,
+            'con_filtros': {'place_type': 'hotel', 'max_cost': 300_000},
+            'filtro_estrecho': {'place_type': 'activity', 'city': 'Leticia', 'max_cost': 100_000},
+        }
+        resultado = {
+            'items': n,
+            'dim': dim,
+            'nlist': ivf.nlist,
+            'k': k,
+            'construir_ivf_s': round(construir, 3),
+            'escenarios': {},
+        }
+        for nombre, filtros in escenarios.items():
+            esperados, latencias = self._medir(exacto, consultas, k, filtros)
+            escenario = {'exacto': resumen_latencias(latencias), 'ivf': {}}
+            for nprobe in options['nprobe'] or [1, 4, 8, 16, 32]:
+                obtenidos, latencias = self._medir(ivf, consultas, k, filtros, nprobe=nprobe)
+                escenario['ivf'][nprobe] = {
+                    'recall': self._recall(esperados, obtenidos),
+                    **resumen_latencias(latencias),
+                }
+            resultado['escenarios'][nombre] = escenario
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+        else:
+            self._imprimir(resultado)
+
+    @staticmethod
+    def _datos(n, dim, grupos, num_consultas):
+        """Vectores alrededor de ``grupos`` centros (como temas de experiencias) y atributos al azar."""
+        rng = np.random.default_rng(42)
+        centros = rng.standard_normal((grupos, dim), dtype=np.float32)
+        asignados = rng.integers(grupos, size=n)
+        vectores = centros[asignados] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+        consultas = centros[rng.integers(grupos, size=num_consultas)]
+        consultas = consultas + 0.6 * rng.standard_normal(consultas.shape, dtype=np.float32)
+        tipos = rng.choice(TIPOS, n).tolist()
+        ciudades = rng.choice(CIUDADES, n).tolist()
+        costos = rng.integers(20_000, 1_000_000, n).astype(float)
+        costos[rng.random(n) < 0.1] = np.nan
+        return vectores, consultas, (tipos, ciudades, [None if np.isnan(c) else c for c in costos])
+
+    @staticmethod
+    def _medir(indice, consultas, k, filtros, **opciones):
+        resultados, latencias = [], []
+        for q in consultas:
+            t0 = time.perf_counter()
+            resultados.append(indice.buscar(q, k, filtros=filtros, **opciones)[0])
+            latencias.append(time.perf_counter() - t0)
+        return resultados, latencias
+
+    @staticmethod
+    def _recall(esperados, obtenidos):
+        """Fracción de los vecinos exactos que también devuelve el IVF."""
+        aciertos = total = 0
+        for exactos, aproximados in zip(esperados, obtenidos):
+            ids = {i for i, _ in exactos}
+            aciertos += len(ids & {i for i, _ in aproximados})
+            total += len(ids)
+        return round(aciertos / total, 4) if total else 1.0
+
+    def _imprimir(self, r):
+        self.stdout.write(
+            f"{r['items']:,} vectores de {r['dim']} dims, nlist {r['nlist']}: "
+            f"construir IVF {r['construir_ivf_s']}s"
+        )
+        for nombre, e in r['escenarios'].items():
+            x = e['exacto']
+            self.stdout.write(f"  {nombre}: exacto p50 {x['p50_ms']}ms, p95 {x['p95_ms']}ms")
+            for nprobe, m in e['ivf'].items():
+                self.stdout.write(
+                    f"    nprobe {nprobe:>3}: recall@{r['k']} {m['recall']:.3f}, "
+                    f"p50 {m['p50_ms']}ms, p95 {m['p95_ms']}ms"
+                )
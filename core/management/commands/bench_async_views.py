@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from ._bench import base_temporal, resumen_latencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara cuántas rutas por streaming se atienden a la vez bajo WSGI (N workers "
+        "síncronos) y bajo ASGI (un solo event loop), con SerpAPI y OpenAI simulados "
+        "con una latencia fija."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help="Workers síncronos de gunicorn simulados (WSGI)")
+        parser.add_argument('--latencia-busqueda', type=float, default=0.2)
+        parser.add_argument('--latencia-modelo', type=float, default=0.5)
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        ajustes = override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            WEB_SEARCH={'BACKEND': 'stub', 'STUB_LATENCY': options['latencia_busqueda'], 'TIMEOUT': 60},
+            AI_MODEL={'BACKEND': 'stub', 'STUB_LATENCY': options['latencia_modelo']},
+            AI_CACHES={'rutas': {'BACKEND': 'memory'}, 'busquedas': {'BACKEND': 'memory'}},
+        )
+        with base_temporal(), ajustes:
+            user = User.objects.create_user('bench', 'bench@akua.co', 'bench-password')
+            resultados = {
+                'wsgi': self._wsgi(user, options['peticiones'], options['workers']),
+                'asgi': asyncio.run(self._asgi(user, options['peticiones'])),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        latencia = options['latencia_busqueda'] + options['latencia_modelo']
+        self.stdout.write(
+            f"{options['peticiones']} rutas, latencia simulada {latencia:.2f}s por ruta, "
+            f"{options['workers']} workers WSGI"
+        )
+        for modo, r in resultados.items():
+            self.stdout.write(
+                f"  {modo.upper()}: {r['segundos']:.2f}s total, {r['rutas_por_segundo']:.1f} rutas/s, "
+                f"máx. en curso {r['max_en_curso']}, p50 {r['p50_ms']}ms, p95 {r['p95_ms']}ms, "
+                f"errores {r['errores']}"
+            )
+
+    @staticmethod
+    def _datos(modo, i):
+        # Ciudades distintas: ninguna petición sale de la caché
+        return {
+            'ciudad': f'Ciudad {modo} {i}', 'pais': 'Colombia', 'presupuesto': '$60–90',
+            'dias': '2', 'evento': '', 'barrio': '', 'intereses': ['Cultura'],
+        }
+
+    def _medir(self, latencias, errores, inicio, en_curso_max):
+        total = time.perf_counter() - inicio
+        return {
+            'segundos': round(total, 3),
+            'rutas_por_segundo': round(len(latencias) / total, 2),
+            'max_en_curso': en_curso_max,
+            'errores': errores,
+            **resumen_latencias(latencias),
+        }
+
+    def _wsgi(self, user, peticiones, workers):
+        estado = {'en_curso': 0, 'max': 0, 'errores': 0}
+        latencias = []
+        lock = threading.Lock()
+
+        def una(i):
+            client = Client()
+            client.force_login(user)
+            t0 = time.perf_counter()
+            with lock:
+                estado['en_curso'] += 1
+                estado['max'] = max(estado['max'], estado['en_curso'])
+            response = client.post('/generar_ruta_ai/stream/', self._datos('wsgi', i))
+            cuerpo = b''.join(response.streaming_content)
+            with lock:
+                estado['en_curso'] -= 1
+                if b'event: fin' not in cuerpo:
+                    estado['errores'] += 1
+                latencias.append(time.perf_counter() - t0)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(una, range(peticiones)))
+        return self._medir(latencias, estado['errores'], inicio, estado['max'])
+
+    async def _asgi(self, user, peticiones):
+        estado = {'en_curso': 0, 'max': 0, 'errores': 0}
+        latencias = []
+        client = AsyncClient()
+        await client.aforce_login(user)
+
+        async def una(i):
+            t0 = time.perf_counter()
+            estado['en_curso'] += 1
+            estado['max'] = max(estado['max'], estado['en_curso'])
+            response = await client.post('/generar_ruta_ai/stream/', self._datos('asgi', i))
+            cuerpo = b''.join([chunk async for chunk in response.streaming_content])
+            estado['en_curso'] -= 1
+            if b'event: fin' not in cuerpo:
+                estado['errores'] += 1
+            latencias.append(time.perf_counter() - t0)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una(i) for i in range(peticiones)))
+        return self._medir(latencias, estado['errores'], inicio, estado['max'])
@@ -0,0 +1,217 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core.categories import nombres_categorias
+from core.models import Place
+
+from ._bench import base_temporal, resumen_latencias
+
+BUSQUEDAS = ['', '', 'playa', 'cascada', 'museo', 'mirador', 'laguna', 'parque natural', 'medellin', 'cartagena']
+DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) consultas"')
+TPL = re.compile(r'tpl;dur=([\d.]+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga datos sintéticos (generate_synthetic_data) en una base temporal y mide index, "
+        "places (?q=&category=), place_detail, reviews y dashboard con varios niveles de "
+        "concurrencia: p50/p95/p99, peticiones por segundo y consultas SQL por petición "
+        "(del Server-Timing de core/perf.py). OpenAI y SerpAPI quedan simulados. El resultado "
+        "se guarda en JSON para comparar corridas (--comparar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lugares', type=int, default=300)
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--resenas', type=int, default=10000)
+        parser.add_argument('--rutas', type=int, default=1000)
+        parser.add_argument('--concurrencia', default='1,4,16', help="Niveles separados por comas (hilos cliente)")
+        parser.add_argument('--peticiones', type=int, default=200, help="Peticiones por endpoint y nivel")
+        parser.add_argument('--calentamiento', type=int, default=10, help="Peticiones sin medir por endpoint")
+        parser.add_argument('--sin-cache', action='store_true', help="Sin caché de páginas ni GET condicional")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help="Archivo JSON (por defecto benchmarks/endpoints-<fecha>.json)")
+        parser.add_argument('--comparar', help="JSON de una corrida anterior para mostrar la diferencia")
+
+    def handle(self, *args, **options):
+        try:
+            niveles = [int(n) for n in options['concurrencia'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrencia debe ser una lista de enteros, p. ej. 1,4,16")
+        anterior = self._leer(options['comparar']) if options['comparar'] else None
+
+        ajustes = {
+            'ALLOWED_HOSTS': ['testserver'],
+            'WEB_SEARCH': {'BACKEND': 'stub'},
+            'AI_MODEL': {'BACKEND': 'stub'},
+            'AI_EMBEDDINGS': {'BACKEND': 'local'},
+            'AI_CACHES': {'rutas': {'BACKEND': 'memory'}, 'busquedas': {'BACKEND': 'memory'}},
+            # Todas medidas y ninguna al buffer de lentas
+            'PERF': {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SLOW_MS': float('inf'), 'SERVER_TIMING': True},
+        }
+        if options['sin_cache']:
+            ajustes['PAGE_CACHE'] = {'ENABLED': False}
+            ajustes['CONDITIONAL_GET'] = {'ENABLED': False}
+
+        with base_temporal(), override_settings(**ajustes):
+            call_command(
+                'generate_synthetic_data', lugares=options['lugares'], usuarios=options['usuarios'],
+                resenas=options['resenas'], rutas=options['rutas'], semilla=options['semilla'],
+                stdout=self.stdout,
+            )
+            rng = random.Random(options['semilla'])
+            endpoints = self._endpoints(rng)
+            resultados = {}
+            for nombre, (urls, usuarios) in endpoints.items():
+                self._correr(urls, usuarios, options['calentamiento'], 1)
+                resultados[nombre] = {
+                    str(nivel): self._correr(urls, usuarios, options['peticiones'], nivel)
+                    for nivel in niveles
+                }
+
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': self._commit(),
+            'django': django.get_version(),
+            'parametros': {
+                clave: options[clave] for clave in (
+                    'lugares', 'usuarios', 'resenas', 'rutas', 'peticiones', 'calentamiento', 'sin_cache', 'semilla',
+                )
+            } | {'concurrencia': niveles},
+            'resultados': resultados,
+        }
+        salida = Path(options['salida'] or Path(settings.BASE_DIR) / 'benchmarks' / (
+            f"endpoints-{datetime.now():%Y%m%d-%H%M%S}.json"
+        ))
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+
+        self._imprimir(resultados, anterior)
+        self.stdout.write(f"Resultado guardado en {salida}")
+
+    # ============================================
+    # ENDPOINTS Y CARGA
+    # ============================================
+
+    def _endpoints(self, rng):
+        """``nombre -> (urls, usuarios)``; cada petición elige una URL y, si hay, un usuario al azar."""
+        slugs = list(Place.objects.values_list('slug', flat=True))
+        categorias = [''] + nombres_categorias()
+        usuarios = list(User.objects.filter(routes__isnull=False).distinct()[:50])
+        busquedas = [
+            f'/places/?q={q}&category={c}'
+            for q, c in ((rng.choice(BUSQUEDAS), rng.choice(categorias)) for _ in range(50))
+        ]
+        return {
+            'index': (['/'], None),
+            'places': (busquedas, None),
+            'place_detail': ([f'/places/{slug}/' for slug in rng.sample(slugs, min(len(slugs), 100))], None),
+            'reviews': (['/reviews/'], None),
+            'dashboard': (['/dashboard/'], usuarios),
+        }
+
+    def _correr(self, urls, usuarios, peticiones, concurrencia):
+        latencias, consultas, db_ms, tpl_ms = [], [], [], []
+        errores = 0
+        lock = threading.Lock()
+        local = threading.local()
+
+        def una(i):
+            nonlocal errores
+            rng = random.Random(i)
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                if usuarios:
+                    local.client.force_login(rng.choice(usuarios))
+            t0 = time.perf_counter()
+            response = local.client.get(rng.choice(urls))
+            latencia = time.perf_counter() - t0
+            timing = response.get('Server-Timing', '')
+            sql, tpl = DB.search(timing), TPL.search(timing)
+            with lock:
+                latencias.append(latencia)
+                if response.status_code != 200:
+                    errores += 1
+                if sql:
+                    db_ms.append(float(sql.group(1)))
+                    consultas.append(int(sql.group(2)))
+                if tpl:
+                    tpl_ms.append(float(tpl.group(1)))
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            list(pool.map(una, range(peticiones)))
+        total = time.perf_counter() - inicio
+
+        def media(valores):
+            return round(statistics.fmean(valores), 2) if valores else 0
+
+        return {
+            'peticiones': peticiones,
+            'errores': errores,
+            'segundos': round(total, 3),
+            'peticiones_por_segundo': round(peticiones / total, 2),
+            **resumen_latencias(latencias),
+            'consultas_media': media(consultas),
+            'consultas_max': max(consultas, default=0),
+            'db_ms_media': media(db_ms),
+            'tpl_ms_media': media(tpl_ms),
+        }
+
+    # ============================================
+    # INFORME
+    # ============================================
+
+    @staticmethod
+    def _commit():
+        try:
+            resultado = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return resultado.stdout.strip() or None
+
+    @staticmethod
+    def _leer(ruta):
+        try:
+            return json.loads(Path(ruta).read_text())['resultados']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+    def _imprimir(self, resultados, anterior):
+        for nombre, niveles in resultados.items():
+            for nivel, r in niveles.items():
+                linea = (
+                    f"  {nombre:<13} c={nivel:<3} {r['peticiones_por_segundo']:>8.1f} req/s  "
+                    f"p50 {r['p50_ms']:>7}ms  p95 {r['p95_ms']:>7}ms  p99 {r['p99_ms']:>7}ms  "
+                    f"{r['consultas_media']:>5} consultas  errores {r['errores']}"
+                )
+                previo = (anterior or {}).get(nombre, {}).get(nivel)
+                if previo:
+                    linea += (
+                        f"  | antes p95 {previo['p95_ms']}ms ({self._cambio(previo['p95_ms'], r['p95_ms'])}), "
+                        f"{previo['peticiones_por_segundo']} req/s "
+                        f"({self._cambio(previo['peticiones_por_segundo'], r['peticiones_por_segundo'])})"
+                    )
+                self.stdout.write(linea)
+
+    @staticmethod
+    def _cambio(antes, ahora):
+        return f"{(ahora - antes) / antes * 100:+.0f}%" if antes else 'n/d'
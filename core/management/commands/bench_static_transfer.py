@@ -0,0 +1,159 @@
+import json
+import re
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.views.static import serve
+
+from core.models import Place
+
+from ._bench import base_temporal
+
+# Atributos src/href y url(...) de estilos en línea
+ASSET = re.compile(r'(?:(?:src|href)="|url\([\'"]?)(/static/[^"\')?#]+)')
+
+CONFIGURACIONES = {
+    # Antes: StaticFilesStorage servido con django.views.static.serve (sin Cache-Control ni compresión)
+    'antes': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    # Ahora: nombres con hash + .gz/.br servidos por core.static_assets.ServidorEstaticos
+    'ahora': 'core.static_assets.CompressedManifestStaticFilesStorage',
+}
+
+
+def bytes_cabeceras(respuesta):
+    return len(f'HTTP/1.1 {respuesta.status_code}\r\n') + sum(
+        len(f'{k}: {v}\r\n') for k, v in respuesta.items()
+    ) + 2
+
+
+def bytes_cuerpo(respuesta):
+    if respuesta.status_code == 304:
+        return 0
+    return int(respuesta.get('Content-Length') or len(b''.join(respuesta)))
+
+
+def max_age(respuesta):
+    coincidencia = re.search(r'max-age=(\d+)', respuesta.get('Cache-Control', ''))
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide los bytes y peticiones de estáticos al visitar por primera vez y de nuevo "
+        "las páginas index y places, antes (StaticFilesStorage + django.views.static.serve) "
+        "y ahora (manifest con hash, .gz/.br y ServidorEstaticos). La visita repetida simula "
+        "la caché del navegador: lo que sigue fresco no se pide y lo demás se revalida con "
+        "If-None-Match / If-Modified-Since. No se aplica frescura heurística."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lugares', type=int, default=12)
+        parser.add_argument(
+            '--intervalo', type=int, default=3600,
+            help="Segundos entre la primera visita y la repetida (default: 3600)",
+        )
+        parser.add_argument('--accept-encoding', default='gzip, deflate, br')
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        resultados = {}
+        with base_temporal():
+            for i in range(options['lugares']):
+                Place.objects.create(
+                    name=f'Lugar {i}', slug=f'lugar-{i}', city='Cali', department='Valle del Cauca',
+                    short_description='Lugar de prueba', category='Cultura', rating_average=4.5,
+                )
+            for nombre, backend in CONFIGURACIONES.items():
+                resultados[nombre] = self._medir(nombre, backend, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        for nombre, r in resultados.items():
+            self.stdout.write(f"{nombre.upper()} ({CONFIGURACIONES[nombre]})")
+            for pagina, visitas in r.items():
+                for visita in ('primera', 'repetida'):
+                    v = visitas[visita]
+                    self.stdout.write(
+                        f"  {pagina:<7} {visita:<9} estáticos: {v['peticiones']} peticiones, "
+                        f"{v['bytes']:>9,} bytes ({v['bytes_cuerpo']:,} de cuerpo); "
+                        f"HTML {v['bytes_html']:,} bytes"
+                    )
+        for pagina in resultados['ahora']:
+            antes = resultados['antes'][pagina]['repetida']['bytes']
+            ahora = resultados['ahora'][pagina]['repetida']['bytes']
+            peticiones = (
+                resultados['antes'][pagina]['repetida']['peticiones'],
+                resultados['ahora'][pagina]['repetida']['peticiones'],
+            )
+            self.stdout.write(
+                f"{pagina}: visita repetida {antes:,} → {ahora:,} bytes y "
+                f"{peticiones[0]} → {peticiones[1]} peticiones de estáticos"
+            )
+
+    def _medir(self, nombre, backend, options):
+        raiz = tempfile.mkdtemp(prefix=f'akua-static-{nombre}-')
+        ajustes = override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            STATIC_ROOT=raiz,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': backend},
+                'fotos': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+            },
+            STATIC_SERVER={'ENABLED': nombre == 'ahora'},
+        )
+        try:
+            with ajustes:
+                call_command('collectstatic', interactive=False, verbosity=0)
+                cliente = Client(HTTP_ACCEPT_ENCODING=options['accept_encoding'])
+                if nombre == 'ahora':
+                    pedir = lambda url, **cabeceras: cliente.get(url, **cabeceras)
+                else:
+                    fabrica = RequestFactory(HTTP_ACCEPT_ENCODING=options['accept_encoding'])
+                    pedir = lambda url, **cabeceras: serve(
+                        fabrica.get(url, **cabeceras), url[len('/static/'):], document_root=raiz
+                    )
+                return {
+                    pagina: self._visitas(cliente, pedir, reverse(pagina), options['intervalo'])
+                    for pagina in ('index', 'places')
+                }
+        finally:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+    def _visitas(self, cliente, pedir, url, intervalo):
+        html = cliente.get(url)
+        html_bytes = bytes_cabeceras(html) + len(html.content)
+        assets = list(dict.fromkeys(ASSET.findall(html.content.decode())))
+
+        primera = {'peticiones': 0, 'bytes': 0, 'bytes_cuerpo': 0, 'bytes_html': html_bytes}
+        cache = {}
+        for asset in assets:
+            respuesta = pedir(asset)
+            primera['peticiones'] += 1
+            primera['bytes_cuerpo'] += bytes_cuerpo(respuesta)
+            primera['bytes'] += bytes_cabeceras(respuesta) + bytes_cuerpo(respuesta)
+            cache[asset] = respuesta
+
+        repetida = {'peticiones': 0, 'bytes': 0, 'bytes_cuerpo': 0, 'bytes_html': html_bytes, 'revalidadas': 0}
+        for asset, anterior in cache.items():
+            edad = max_age(anterior)
+            if edad is not None and edad > intervalo:
+                continue
+            condicionales = {}
+            if anterior.get('ETag'):
+                condicionales['HTTP_IF_NONE_MATCH'] = anterior['ETag']
+            if anterior.get('Last-Modified'):
+                condicionales['HTTP_IF_MODIFIED_SINCE'] = anterior['Last-Modified']
+            respuesta = pedir(asset, **condicionales)
+            repetida['peticiones'] += 1
+            repetida['revalidadas'] += respuesta.status_code == 304
+            repetida['bytes_cuerpo'] += bytes_cuerpo(respuesta)
+            repetida['bytes'] += bytes_cabeceras(respuesta) + bytes_cuerpo(respuesta)
+        return {'assets': len(assets), 'primera': primera, 'repetida': repetida}
@@ -0,0 +1,123 @@
+import json
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.vectors import IndiceVectorial
+
+from ._bench import resumen_latencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el índice vectorial de TripItem con vectores aleatorios: construcción, "
+        "guardado y apertura con mmap, latencia de una consulta y rendimiento por lotes. "
+        "Para tamaños pequeños lo compara con decodificar pickle fila por fila."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--items', type=int, action='append',
+            help="Número de vectores (repetible). Por defecto 10000 y 1000000.",
+        )
+        parser.add_argument('--dim', type=int, default=256, help="Dimensión de los vectores")
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--lote', type=int, default=32, help="Consultas por lote")
+        parser.add_argument(
+            '--max-pickle', type=int, default=20000,
+            help="Hasta este tamaño se mide también la búsqueda con pickle por fila",
+        )
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        resultados = {}
+        for n in options['items'] or [10_000, 1_000_000]:
+            resultados[n] = self._medir(n, options)
+            if not options['json']:
+                self._imprimir(n, resultados[n])
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+
+    def _medir(self, n, options):
+        rng = np.random.default_rng(42)
+        dim, k = options['dim'], options['k']
+        vectores = rng.standard_normal((n, dim), dtype=np.float32)
+        consultas = rng.standard_normal((options['consultas'], dim), dtype=np.float32)
+
+        t0 = time.perf_counter()
+        indice = IndiceVectorial.desde_vectores(np.arange(1, n + 1), vectores)
+        construir = time.perf_counter() - t0
+        del vectores
+
+        carpeta = tempfile.mkdtemp(prefix='akua-vectores-')
+        try:
+            t0 = time.perf_counter()
+            indice.guardar(carpeta)
+            guardar = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            mapeado = IndiceVectorial.cargar(carpeta)
+            abrir = time.perf_counter() - t0
+
+            mapeado.buscar(consultas[:1], k)  # calienta las páginas del mmap
+            latencias = []
+            for q in consultas:
+                t0 = time.perf_counter()
+                mapeado.buscar(q, k)
+                latencias.append(time.perf_counter() - t0)
+
+            lote = options['lote']
+            t0 = time.perf_counter()
+            for i in range(0, len(consultas), lote):
+                mapeado.buscar(consultas[i:i + lote], k)
+            por_lotes = time.perf_counter() - t0
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+        resultado = {
+            'dim': dim,
+            'memoria_mb': round(indice.matriz.nbytes / 2**20, 1),
+            'construir_s': round(construir, 3),
+            'guardar_s': round(guardar, 3),
+            'abrir_mmap_ms': round(abrir * 1000, 2),
+            'consulta': resumen_latencias(latencias),
+            'lote': lote,
+            'consultas_por_segundo_en_lotes': round(len(consultas) / por_lotes, 1),
+        }
+        if n <= options['max_pickle']:
+            resultado['pickle_por_fila'] = self._pickle(indice, consultas[:5], k)
+        return resultado
+
+    @staticmethod
+    def _pickle(indice, consultas, k):
+        """El formato anterior: un pickle por fila, decodificado y comparado en Python."""
+        filas = [(int(i), pickle.dumps(v.tolist())) for i, v in zip(indice.ids, indice.matriz)]
+        latencias = []
+        for q in consultas:
+            q = (q / np.linalg.norm(q)).tolist()
+            t0 = time.perf_counter()
+            puntajes = []
+            for pk, datos in filas:
+                v = pickle.loads(datos)
+                puntajes.append((sum(a * b for a, b in zip(q, v)), pk))
+            sorted(puntajes, reverse=True)[:k]
+            latencias.append(time.perf_counter() - t0)
+        return resumen_latencias(latencias)
+
+    def _imprimir(self, n, r):
+        c = r['consulta']
+        self.stdout.write(
+            f"{n:,} vectores de {r['dim']} dims ({r['memoria_mb']} MB): construir {r['construir_s']}s, "
+            f"guardar {r['guardar_s']}s, abrir con mmap {r['abrir_mmap_ms']}ms"
+        )
+        self.stdout.write(
+            f"  consulta top-k: p50 {c['p50_ms']}ms, p95 {c['p95_ms']}ms, p99 {c['p99_ms']}ms; "
+            f"en lotes de {r['lote']}: {r['consultas_por_segundo_en_lotes']} consultas/s"
+        )
+        if 'pickle_por_fila' in r:
+            p = r['pickle_por_fila']
+            self.stdout.write(f"  pickle por fila (antes): p50 {p['p50_ms']}ms, p95 {p['p95_ms']}ms")
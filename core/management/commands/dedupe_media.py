@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.images import pendiente, programar
+from core.models import Place, UserProfile
+from core.storage import almacen_fotos, hash_contenido
+
+# (modelo, campo, carpeta de upload_to)
+CAMPOS = [
+    (Place, 'photo', 'places_photos'),
+    (UserProfile, 'photo', 'profile_photos'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca fotos con contenido idéntico en las carpetas de media (p. ej. Cali.jpeg y "
+        "Cali_kzRDbIm.jpeg), apunta Place.photo y UserProfile.photo a una sola copia y "
+        "borra las demás. Sin --aplicar solo informa."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help="Reapunta los campos y borra los duplicados")
+
+    def handle(self, *args, **options):
+        storage = almacen_fotos()
+        referencias = self._referencias()
+        grupos = self._duplicados(storage)
+
+        recuperables = reapuntados = borrados = 0
+        for archivos in grupos:
+            canonico = min(archivos, key=lambda n: (n not in referencias, len(n), n))
+            sobran = [n for n in archivos if n != canonico]
+            tamano = storage.size(canonico)
+            recuperables += tamano * len(sobran)
+            self.stdout.write(f"{canonico} ({tamano:,} bytes) ← {', '.join(sobran)}")
+            if options['aplicar']:
+                with transaction.atomic():
+                    reapuntados += self._reapuntar(sobran, canonico)
+                for nombre in sobran:
+                    # Solo si ningún campo sigue usándolo (p. ej. otro modelo no listado aquí)
+                    if not self._referenciado(nombre):
+                        storage.delete(nombre)
+                        borrados += 1
+
+        resumen = f"{len(grupos)} grupos de duplicados; {recuperables:,} bytes recuperables"
+        if options['aplicar']:
+            resumen += f"; {reapuntados} registros reapuntados, {borrados} archivos borrados"
+        else:
+            resumen += " (simulación: usa --aplicar)"
+        self.stdout.write(self.style.SUCCESS(resumen))
+
+    @staticmethod
+    def _referencias():
+        nombres = set()
+        for modelo, campo, _ in CAMPOS:
+            nombres.update(modelo.objects.exclude(**{campo: ''}).values_list(campo, flat=True))
+        return nombres
+
+    @staticmethod
+    def _referenciado(nombre):
+        return any(modelo.objects.filter(**{campo: nombre}).exists() for modelo, campo, _ in CAMPOS)
+
+    @staticmethod
+    def _duplicados(storage):
+        """Grupos de archivos con el mismo contenido; solo se calcula el hash de los de igual tamaño."""
+        por_tamano = defaultdict(list)
+        for carpeta in sorted({c for _, _, c in CAMPOS}):
+            if not storage.exists(carpeta):
+                continue
+            for archivo in storage.listdir(carpeta)[1]:
+                nombre = f'{carpeta}/{archivo}'
+                por_tamano[storage.size(nombre)].append(nombre)
+
+        por_hash = defaultdict(list)
+        for nombres in por_tamano.values():
+            if len(nombres) < 2:
+                continue
+            for nombre in nombres:
+                with storage.open(nombre, 'rb') as f:
+                    por_hash[hash_contenido(f)].append(nombre)
+        return [sorted(nombres) for nombres in por_hash.values() if len(nombres) > 1]
+
+    @staticmethod
+    def _reapuntar(sobran, canonico):
+        """
+        UPDATE sin señales; los derivados se copian de un registro que ya use
+        ``canonico``. Si ninguno los tiene, se programan tras el commit.
+        """
+        total = 0
+        for modelo, campo, _ in CAMPOS:
+            derivados_campo = f'{campo}_derivatives'
+            derivados = (
+                modelo.objects.filter(**{campo: canonico})
+                .values_list(derivados_campo, flat=True).first()
+            ) or {}
+            pks = list(modelo.objects.filter(**{f'{campo}__in': sobran}).values_list('pk', flat=True))
+            total += modelo.objects.filter(pk__in=pks).update(**{campo: canonico, derivados_campo: derivados})
+            for instance in modelo.objects.filter(pk__in=pks).only('pk', campo, derivados_campo):
+                if pendiente(instance, campo):
+                    programar(instance, campo)
+        return total
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import FORMATOS, exportar, formato_de
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta los lugares a CSV o JSON Lines por trozos (memoria constante). El archivo "
+        "se puede volver a cargar con import_places."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o - para la salida estándar")
+        parser.add_argument('--formato', choices=FORMATOS, help="Por defecto según la extensión (jsonl con -)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Filas leídas por consulta")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        try:
+            formato = formato_de(ruta, options['formato'] or ('jsonl' if ruta == '-' else None))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        inicio = time.perf_counter()
+        try:
+            destino = sys.stdout if ruta == '-' else open(ruta, 'w', encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir {ruta}: {e}")
+        try:
+            total = exportar(destino, formato, chunk_size=options['chunk_size'])
+        finally:
+            if destino is not sys.stdout:
+                destino.close()
+        segundos = time.perf_counter() - inicio
+        # Con - la salida estándar es el archivo: el resumen va a stderr
+        salida = self.stderr if ruta == '-' else self.stdout
+        salida.write(f"{total} lugares exportados en {segundos:.1f}s ({total / segundos if segundos else 0:.0f} filas/s)")
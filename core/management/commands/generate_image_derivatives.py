@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.images import generar_para, pendiente
+from core.models import Place, UserProfile
+
+MODELOS = {'places': Place, 'profiles': UserProfile}
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las miniaturas AVIF/WebP/JPEG de las fotos de lugares y perfiles que aún no "
+        "las tienen (o cuya foto cambió). Pillow libera el GIL al redimensionar y codificar, "
+        "así que los hilos trabajan en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=sorted(MODELOS), action='append', help="Por defecto todos")
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--forzar', action='store_true', help="Vuelve a registrar también las ya generadas")
+
+    def handle(self, *args, **options):
+        instancias = []
+        for nombre in options['modelo'] or sorted(MODELOS):
+            qs = MODELOS[nombre].objects.exclude(photo='').exclude(photo=None).order_by('pk')
+            instancias += [i for i in qs if options['forzar'] or pendiente(i)]
+        self.stdout.write(f"{len(instancias)} fotos por procesar con {options['workers']} hilos")
+
+        inicio = time.perf_counter()
+        hechas = fallidas = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futuros = {pool.submit(self._generar, i, options['forzar']): i for i in instancias}
+            for futuro in as_completed(futuros):
+                instancia = futuros[futuro]
+                try:
+                    derivados = futuro.result()
+                except Exception as e:
+                    fallidas += 1
+                    self.stderr.write(f"  {instancia.photo.name}: {e}")
+                    continue
+                hechas += 1
+                self.stdout.write(f"  {instancia.photo.name}: {', '.join(map(str, derivados['anchos']))} px")
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Derivados generados para {hechas} fotos en {segundos:.1f}s; fallidas: {fallidas}"
+        ))
+
+    @staticmethod
+    def _generar(instancia, forzar):
+        try:
+            return generar_para(instancia, forzar=forzar)
+        finally:
+            close_old_connections()
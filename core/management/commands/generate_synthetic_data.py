@@ -0,0 +1,236 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import slugify
+
+from core.categories import invalidar_categorias, sincronizar_categorias_en_lote
+from core.models import Place, Review, Route, UserProfile
+from core.page_cache import invalidar
+from core.ratings import reconstruir_ratings
+
+CIUDADES = [
+    ('Cartagena', 'Bolívar'), ('Santa Marta', 'Magdalena'), ('Medellín', 'Antioquia'),
+    ('Guatapé', 'Antioquia'), ('Jardín', 'Antioquia'), ('Bogotá', 'Cundinamarca'),
+    ('Villa de Leyva', 'Boyacá'), ('Salento', 'Quindío'), ('Filandia', 'Quindío'),
+    ('Cali', 'Valle del Cauca'), ('Popayán', 'Cauca'), ('San Agustín', 'Huila'),
+    ('Barichara', 'Santander'), ('San Gil', 'Santander'), ('Leticia', 'Amazonas'),
+    ('Pasto', 'Nariño'), ('Ipiales', 'Nariño'), ('Montería', 'Córdoba'),
+    ('Riohacha', 'La Guajira'), ('Capurganá', 'Chocó'), ('Nuquí', 'Chocó'),
+    ('Mompox', 'Bolívar'), ('Manizales', 'Caldas'), ('Villavicencio', 'Meta'),
+]
+
+TIPOS = [
+    'Parque Natural', 'Playa', 'Cascada', 'Mirador', 'Laguna', 'Museo', 'Plaza',
+    'Reserva', 'Termales', 'Cañón', 'Mercado', 'Sendero', 'Cerro', 'Isla', 'Jardín Botánico',
+]
+NOMBRES = [
+    'del Río Claro', 'La Esperanza', 'El Peñol', 'de los Nevados', 'Las Gachas', 'El Cocora',
+    'de Santa Cruz', 'Los Colores', 'del Silencio', 'La Chorrera', 'El Encanto', 'de Oro',
+    'San Pedro', 'Los Frailejones', 'del Sol', 'La Candelaria', 'Tayrona', 'El Jaguar',
+    'de las Flores', 'Las Palmas', 'El Dorado', 'del Viento', 'La Macarena', 'Los Guácharos',
+]
+
+# Mezclas de categorías con su peso: lo habitual es una o dos por lugar
+CATEGORIAS = [
+    ('Naturaleza / Aventura', 18), ('Playa, Relax', 12), ('Cultura & Historia', 12),
+    ('Gastronomía', 8), ('Naturaleza', 10), ('Aventura, Deportes', 6), ('Cultura', 8),
+    ('Vida nocturna', 4), ('Familiar, Naturaleza', 6), ('Arte, Cultura & Historia', 4),
+    ('Relax', 4), ('Compras', 2), ('Naturaleza / Aventura, Gastronomía', 6),
+]
+
+DESCRIPCIONES = [
+    'Un rincón {adj} para desconectarse y disfrutar del paisaje {region}.',
+    'Ideal para caminar, tomar fotos y probar la comida típica {region}.',
+    'Uno de los destinos más {adj}s {region}, con historia y buena comida.',
+    'Aguas cristalinas, senderos {adj}s y atardeceres que no se olvidan.',
+    'Visita obligada si vas a {ciudad}: {adj}, tranquilo y lleno de vida.',
+]
+ADJETIVOS = ['tranquilo', 'mágico', 'colorido', 'espectacular', 'auténtico', 'verde', 'único', 'acogedor']
+EVENTOS = [
+    'Festival de música en diciembre', 'Mercado campesino los domingos', 'Avistamiento de aves al amanecer',
+    'Ferias y fiestas en agosto', 'Caminatas guiadas los fines de semana', 'Noches de salsa los viernes',
+]
+RESTAURANTES = [
+    'Cocina de la Abuela', 'El Fogón Paisa', 'Mar y Coco', 'La Fonda del Camino', 'Sabores del Pacífico',
+    'Café de Origen', 'Arepas Doña Rosa', 'Asadero El Llanero',
+]
+HOTELES = [
+    'Hostal La Montaña', 'Hotel Boutique Colonial', 'Glamping Estrellas', 'Posada del Río',
+    'Ecohotel Los Árboles', 'Casa Hotel El Balcón',
+]
+
+TITULOS = {
+    5: ['¡Espectacular!', 'Volvería mil veces', 'Un paraíso', 'Imperdible'],
+    4: ['Muy recomendado', 'Muy bonito', 'Gran experiencia', 'Vale la pena'],
+    3: ['Bien, sin más', 'Aceptable', 'Bonito pero lleno', 'Regular'],
+    2: ['Esperaba más', 'Caro para lo que es', 'Poco cuidado'],
+    1: ['No lo recomiendo', 'Mala experiencia', 'Decepcionante'],
+}
+FRASES = {
+    5: ['El paisaje es increíble y la gente muy amable.', 'Todo estuvo perfecto, desde la comida hasta los guías.'],
+    4: ['Muy lindo, aunque el acceso es un poco difícil.', 'Buena comida y buen ambiente, volvería.'],
+    3: ['Bonito, pero había demasiada gente el fin de semana.', 'La experiencia fue normal, nada especial.'],
+    2: ['Los precios son altos y el lugar está descuidado.', 'Nos tocó esperar mucho y la atención fue lenta.'],
+    1: ['Estaba cerrado y nadie nos avisó.', 'Sucio, caro y mal atendido.'],
+}
+# Las reseñas reales se cargan hacia las notas altas
+PESOS_NOTA = [(1, 4), (2, 6), (3, 15), (4, 35), (5, 40)]
+
+NOMBRES_PILA = ['Camila', 'Andrés', 'Valentina', 'Santiago', 'Mariana', 'Juan', 'Laura', 'Felipe', 'Daniela', 'Sebastián']
+APELLIDOS = ['Gómez', 'Rodríguez', 'Martínez', 'López', 'García', 'Hernández', 'Ramírez', 'Torres', 'Castro', 'Ortiz']
+ACTIVIDADES = [
+    'Recorrido a pie por el centro histórico', 'Almuerzo típico en el mercado', 'Caminata al mirador',
+    'Tarde de playa y atardecer', 'Visita al museo local', 'Café en una finca cafetera', 'Paseo en lancha',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera lugares, usuarios con perfil, reseñas y rutas sintéticos (texto en español, "
+        "mezclas de categorías realistas) para medir Akua a escala. Se insertan por lotes y "
+        "después se reconstruyen los ratings y se invalidan las cachés de páginas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lugares', type=int, default=200)
+        parser.add_argument('--usuarios', type=int, default=500)
+        parser.add_argument('--resenas', type=int, default=5000)
+        parser.add_argument('--rutas', type=int, default=1000)
+        parser.add_argument('--semilla', type=int, default=42, help="Misma semilla, mismos datos")
+        parser.add_argument('--prefijo', default='sintetico', help="Prefijo de los nombres de usuario")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por bulk_create")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.lote = options['lote']
+        with transaction.atomic():
+            lugares = self._lugares(options['lugares'])
+            usuarios = self._usuarios(options['usuarios'], options['prefijo'])
+            resenas = self._resenas(options['resenas'], lugares, usuarios)
+            rutas = self._rutas(options['rutas'], usuarios)
+            # bulk_create no pasa por las señales: contadores y cachés se ponen al día aquí
+            reconstruir_ratings(Place.objects.filter(pk__in=[p.pk for p in lugares]))
+        invalidar_categorias()
+        invalidar('lugares')
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(lugares)} lugares, {len(usuarios)} usuarios, {resenas} reseñas y {rutas} rutas generados"
+        ))
+
+    def _texto(self, plantillas, ciudad, departamento):
+        return self.rng.choice(plantillas).format(
+            adj=self.rng.choice(ADJETIVOS), region=f'de {departamento}', ciudad=ciudad,
+        )
+
+    def _lugares(self, n):
+        nombres = set(Place.objects.values_list('name', flat=True))
+        slugs = set(Place.objects.values_list('slug', flat=True))
+        categorias, pesos = zip(*CATEGORIAS)
+        lugares = []
+        while len(lugares) < n:
+            ciudad, departamento = self.rng.choice(CIUDADES)
+            nombre = f'{self.rng.choice(TIPOS)} {self.rng.choice(NOMBRES)}'
+            if nombre in nombres:
+                nombre = f'{nombre} ({ciudad})'
+            sufijo = 2
+            base = nombre
+            while nombre in nombres or slugify(nombre) in slugs:
+                nombre = f'{base} {sufijo}'
+                sufijo += 1
+            nombres.add(nombre)
+            slugs.add(slugify(nombre))
+            seed = self.rng.choice([0, 0, 3.5, 4.0, 4.5])
+            lugares.append(Place(
+                name=nombre,
+                slug=slugify(nombre),
+                short_description=self._texto(DESCRIPCIONES, ciudad, departamento)[:200],
+                events=', '.join(self.rng.sample(EVENTOS, self.rng.randint(0, 2))),
+                restaurants=', '.join(self.rng.sample(RESTAURANTES, self.rng.randint(0, 3))),
+                hotels=', '.join(self.rng.sample(HOTELES, self.rng.randint(0, 2))),
+                estimated_cost=self.rng.randrange(20, 900) * 1000,
+                category=self.rng.choices(categorias, pesos)[0],
+                rating_seed=seed,
+                rating_average=seed,
+                city=ciudad,
+                department=departamento,
+            ))
+        Place.objects.bulk_create(lugares, batch_size=self.lote)
+
+        sincronizar_categorias_en_lote(lugares)
+        return lugares
+
+    def _usuarios(self, n, prefijo):
+        # Un solo hash: con el hasher por defecto cada hash cuesta cientos de ms
+        clave = make_password(f'{prefijo}-password')
+        existentes = set(User.objects.filter(username__startswith=prefijo).values_list('username', flat=True))
+        usuarios = []
+        i = 0
+        while len(usuarios) < n:
+            i += 1
+            username = f'{prefijo}{i}'
+            if username in existentes:
+                continue
+            nombre, apellido = self.rng.choice(NOMBRES_PILA), self.rng.choice(APELLIDOS)
+            usuarios.append(User(
+                username=username, first_name=nombre, last_name=apellido,
+                email=f'{username}@akua.co', password=clave,
+            ))
+        User.objects.bulk_create(usuarios, batch_size=self.lote)
+
+        intereses = [clave for clave, _ in UserProfile.EVENT_CHOICES]
+        presupuestos = [clave for clave, _ in UserProfile.BUDGET_CHOICES]
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user=usuario,
+                age=self.rng.randint(18, 70),
+                visited_places=', '.join(c for c, _ in self.rng.sample(CIUDADES, self.rng.randint(0, 5))),
+                budget_preference=self.rng.choice(presupuestos),
+                interests=', '.join(self.rng.sample(intereses, self.rng.randint(1, 3))),
+                biography=f'Viajero de {self.rng.choice(CIUDADES)[0]}. Me encantan los lugares {self.rng.choice(ADJETIVOS)}s y la buena comida.',
+            )
+            for usuario in usuarios
+        ], batch_size=self.lote)
+        return usuarios
+
+    def _resenas(self, n, lugares, usuarios):
+        if not lugares or not usuarios:
+            return 0
+        notas, pesos = zip(*PESOS_NOTA)
+        # Unos pocos lugares concentran la mayoría de las reseñas
+        popularidad = [1 / (i + 1) for i in range(len(lugares))]
+        resenas = []
+        for lugar in self.rng.choices(lugares, popularidad, k=n):
+            nota = self.rng.choices(notas, pesos)[0]
+            resenas.append(Review(
+                title=self.rng.choice(TITULOS[nota]),
+                description=' '.join(self.rng.sample(FRASES[nota], len(FRASES[nota]))),
+                qualification=nota,
+                user=self.rng.choice(usuarios),
+                place=lugar,
+            ))
+        Review.objects.bulk_create(resenas, batch_size=self.lote)
+        return len(resenas)
+
+    def _rutas(self, n, usuarios):
+        if not usuarios:
+            return 0
+        presupuestos = ['$0–30', '$30–60', '$60–90', '$90–150', '$150+']
+        rutas = []
+        for _ in range(n):
+            ciudad, departamento = self.rng.choice(CIUDADES)
+            dias = self.rng.randint(1, 5)
+            texto = '\n\n'.join(
+                f'### Día {dia}\n' + '\n'.join(
+                    f'- **{actividad}**: {self._texto(DESCRIPCIONES, ciudad, departamento)}'
+                    for actividad in self.rng.sample(ACTIVIDADES, 3)
+                )
+                for dia in range(1, dias + 1)
+            )
+            rutas.append(Route(
+                user=self.rng.choice(usuarios), city=ciudad, country='Colombia', days=dias,
+                budget=self.rng.choice(presupuestos), ai_response=texto + '\n\nRecomendación final: disfruta.',
+            ))
+        Route.objects.bulk_create(rutas, batch_size=self.lote)
+        return len(rutas)
@@ -0,0 +1,66 @@
+import os
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import FORMATOS, formato_de, importar, leer_filas
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa lugares desde CSV o JSON Lines leyendo el archivo en streaming: valida cada "
+        "fila, crea o actualiza por slug o nombre (volver a importar el mismo archivo no cambia "
+        "nada) y escribe por lotes, una transacción por lote. Ver core/catalog.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o - para la entrada estándar")
+        parser.add_argument('--formato', choices=FORMATOS, help="Por defecto según la extensión")
+        parser.add_argument('--lote', type=int, default=500, help="Filas por transacción")
+        parser.add_argument('--fotos', help="Carpeta de las fotos con ruta relativa (por defecto la del archivo)")
+        parser.add_argument('--simular', action='store_true', help="Valida y cuenta sin guardar nada")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        try:
+            formato = formato_de(ruta, options['formato'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        fotos = options['fotos'] or (os.path.dirname(os.path.abspath(ruta)) if ruta != '-' else os.getcwd())
+
+        def progreso(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {stats['filas']} filas ({stats['por_segundo']:.0f} filas/s)")
+
+        try:
+            # La entrada estándar no es nuestra: no se cierra al terminar
+            archivo = nullcontext(sys.stdin) if ruta == '-' else open(ruta, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir {ruta}: {e}")
+        with archivo as entrada:
+            stats = importar(
+                leer_filas(entrada, formato), lote=options['lote'], fotos=fotos,
+                simular=options['simular'], progreso=progreso,
+            )
+
+        for error in stats['errores']:
+            self.stderr.write(f"  {error}")
+        if stats['invalidos'] > len(stats['errores']):
+            self.stderr.write(f"  ... y {stats['invalidos'] - len(stats['errores'])} filas inválidas más")
+        memoria = (
+            f", memoria máx. {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB" if resource else ''
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Simulación: ' if options['simular'] else ''}{stats['filas']} filas en {stats['segundos']:.1f}s "
+            f"({stats['por_segundo']:.0f} filas/s{memoria}): {stats['creados']} creados, "
+            f"{stats['actualizados']} actualizados, {stats['sin_cambios']} sin cambios, "
+            f"{stats['invalidos']} inválidos"
+        ))
+        if stats['creados'] or stats['actualizados']:
+            self.stdout.write("Miniaturas de las fotos nuevas: manage.py generate_image_derivatives")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Place
+from core.web_search import FaltaConfiguracion, refrescar
+
+
+class Command(BaseCommand):
+    help = "Precarga la caché de búsquedas web para las ciudades registradas en Place.city"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pais', default='Colombia')
+        parser.add_argument(
+            '--evento', action='append', dest='eventos',
+            help="Tipo de evento a precargar (repetible). Por defecto solo la búsqueda sin evento.",
+        )
+        parser.add_argument(
+            '--intereses', default='',
+            help="Intereses separados por comas, igual que los envía el formulario de donde_ir.",
+        )
+
+    def handle(self, *args, **options):
+        eventos = options['eventos'] or ['']
+        intereses = [i.strip() for i in options['intereses'].split(',') if i.strip()]
+        ciudades = (
+            Place.objects.exclude(city='').order_by('city')
+            .values_list('city', flat=True).distinct()
+        )
+
+        ok = fallidas = 0
+        for ciudad in ciudades:
+            for evento in eventos:
+                params = {'ciudad': ciudad, 'pais': options['pais'], 'evento': evento, 'intereses': intereses}
+                try:
+                    refrescar(params)
+                    ok += 1
+                except FaltaConfiguracion as e:
+                    raise CommandError(str(e))
+                except Exception as e:
+                    fallidas += 1
+                    self.stderr.write(f"{ciudad} / {evento or '-'}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Búsquedas precargadas: {ok} (fallidas: {fallidas})"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Place
+from core.ratings import reconstruir_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        "Rehace review_count, rating_sum y rating_average de los lugares a partir de "
+        "las reseñas (reparación tras cargas masivas o cambios hechos fuera del ORM)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', action='append', dest='slugs', help="Solo este lugar (repetible)")
+
+    def handle(self, *args, **options):
+        places = Place.objects.all()
+        if options['slugs']:
+            places = places.filter(slug__in=options['slugs'])
+        with transaction.atomic():
+            filas = reconstruir_ratings(places)
+        self.stdout.write(self.style.SUCCESS(f"Ratings reconstruidos para {filas} lugares"))
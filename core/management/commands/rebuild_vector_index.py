@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.vectors import get_config, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde cero el índice vectorial de TripItem configurado en "
+        "VECTOR_INDEX (con el IVF, reentrena los centroides y descarta los agregados)."
+    )
+
+    def handle(self, *args, **options):
+        indice = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice '{get_config()['BACKEND']}' reconstruido con {len(indice)} vectores"
+        ))
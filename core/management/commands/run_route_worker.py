@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos de generación de rutas pendientes (ROUTE_JOBS['RUNNER'] = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Trabajos simultáneos (por defecto ROUTE_JOBS['WORKERS'])")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre consultas si no hay trabajos")
+        parser.add_argument('--once', action='store_true', help="Vacía la cola y termina")
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or jobs.get_config()['WORKERS']
+        reencolados = jobs.reencolar_abandonados()
+        if reencolados:
+            self.stdout.write(f"Trabajos abandonados reencolados: {reencolados}")
+
+        procesados = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            en_curso = set()
+            while True:
+                en_curso = {f for f in en_curso if not f.done()}
+                job_id = None
+                if len(en_curso) < workers:
+                    job_id = jobs.siguiente_pendiente()
+
+                if job_id is not None:
+                    # Otro worker puede haberlo tomado entre la consulta y el reclamo
+                    if jobs.reclamar(job_id):
+                        en_curso.add(pool.submit(self._ejecutar, job_id))
+                        procesados += 1
+                    continue
+
+                if options['once'] and job_id is None and not en_curso:
+                    break
+                time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f"Trabajos procesados: {procesados}"))
+
+    def _ejecutar(self, job_id):
+        try:
+            jobs.ejecutar(job_id, reclamado=True)
+        finally:
+            close_old_connections()
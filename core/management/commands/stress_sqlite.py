@@ -0,0 +1,182 @@
+import json
+import random
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+
+from core.models import Place, Review, Route
+from core.sqlite import bases_sqlite
+
+from ._bench import base_temporal, resumen_latencias
+
+PERFILES = {
+    # La configuración de Django por defecto (la que había en settings)
+    'django': {'ENABLED': False},
+    # El perfil de producción de core/sqlite.py
+    'produccion': {'ENABLED': True, 'READONLY': False},
+}
+
+
+@contextmanager
+def perfil_activo(nombre_bd, perfil):
+    """Cambia la configuración del alias ``default`` para las conexiones que se abran dentro."""
+    connections.close_all()
+    original = dict(connections.settings['default'])
+    nuevo = bases_sqlite(nombre_bd, perfil)['default']
+    connections.settings['default'].update({
+        'NAME': nombre_bd,
+        'OPTIONS': nuevo.get('OPTIONS', {}),
+        'CONN_MAX_AGE': nuevo.get('CONN_MAX_AGE', 0),
+        'CONN_HEALTH_CHECKS': nuevo.get('CONN_HEALTH_CHECKS', False),
+    })
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connections.settings['default'].clear()
+        connections.settings['default'].update(original)
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de SQLite: hilos que crean reseñas (lectura + escritura en la misma "
+        "transacción) y rutas mientras otros leen el listado de lugares, con la configuración "
+        "de Django por defecto y con el perfil de producción (WAL, pragmas, transacciones "
+        "IMMEDIATE y CONN_MAX_AGE). Cada operación simula una petición: las conexiones se "
+        "cierran al terminar salvo que CONN_MAX_AGE las mantenga."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=8)
+        parser.add_argument('--lectores', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=5.0, help="Duración de cada perfil")
+        parser.add_argument('--lugares', type=int, default=200)
+        parser.add_argument(
+            '--timeout', type=float, default=None,
+            help="busy_timeout (s) para ambos perfiles; por defecto el de cada uno",
+        )
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        resultados = {}
+        with base_temporal():
+            self._sembrar(options['lugares'], options['escritores'])
+            plantilla = connections['default'].settings_dict['NAME']
+            connections.close_all()
+            for nombre, perfil in PERFILES.items():
+                copia = f'{plantilla}.{nombre}'
+                shutil.copyfile(plantilla, copia)
+                if options['timeout'] is not None:
+                    perfil = {**perfil, 'TIMEOUT': options['timeout']}
+                with perfil_activo(copia, perfil):
+                    resultados[nombre] = self._carga(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        self.stdout.write(
+            f"{options['escritores']} escritores + {options['lectores']} lectores, "
+            f"{options['segundos']:.0f}s por perfil"
+        )
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"  {nombre:<11} escrituras {r['escrituras_por_segundo']:>8.1f}/s, "
+                f"lecturas {r['lecturas_por_segundo']:>8.1f}/s, "
+                f"bloqueos {r['bloqueos_escritura']} ({r['tasa_bloqueo']:.1%} de las escrituras) "
+                f"+ {r['bloqueos_lectura']} en lecturas, "
+                f"escritura p50 {r['escritura']['p50_ms']}ms p95 {r['escritura']['p95_ms']}ms, "
+                f"lectura p50 {r['lectura']['p50_ms']}ms, otros errores {r['errores']}"
+            )
+
+    def _sembrar(self, lugares, escritores):
+        Place.objects.bulk_create(
+            Place(name=f'Lugar {i}', slug=f'lugar-{i}', city='Cali', short_description='Prueba')
+            for i in range(lugares)
+        )
+        User.objects.bulk_create(User(username=f'stress{i}') for i in range(escritores))
+
+    def _carga(self, options):
+        lugares = list(Place.objects.values_list('pk', flat=True))
+        usuarios = list(User.objects.values_list('pk', flat=True))
+        connections.close_all()
+
+        fin = time.perf_counter() + options['segundos']
+        lock = threading.Lock()
+        estado = {
+            'escrituras': 0, 'lecturas': 0,
+            'bloqueos_escritura': 0, 'bloqueos_lectura': 0, 'errores': 0,
+        }
+        latencias = {'escritura': [], 'lectura': []}
+
+        def peticion(funcion, tipo):
+            inicio = time.perf_counter()
+            try:
+                funcion()
+            except OperationalError as e:
+                with lock:
+                    estado[f'bloqueos_{tipo}' if 'locked' in str(e) else 'errores'] += 1
+            else:
+                with lock:
+                    estado[f'{tipo}s'] += 1
+                    latencias[tipo].append(time.perf_counter() - inicio)
+            finally:
+                # Como request_finished: cierra la conexión si CONN_MAX_AGE no la mantiene
+                close_old_connections()
+
+        def escritor(i):
+            azar = random.Random(i)
+            usuario = usuarios[i % len(usuarios)]
+
+            def resena():
+                with transaction.atomic():
+                    place = Place.objects.get(pk=azar.choice(lugares))
+                    Review.objects.create(
+                        title='Prueba', description='Carga', qualification=azar.randint(1, 5),
+                        user_id=usuario, place=place,
+                    )
+
+            def ruta():
+                Route.objects.create(
+                    user_id=usuario, city='Cali', country='Colombia', days=2, budget='$60–90',
+                    ai_response='x' * 2000,
+                )
+
+            while time.perf_counter() < fin:
+                peticion(resena if azar.random() < 0.7 else ruta, 'escritura')
+
+        def lector(i):
+            azar = random.Random(-i)
+
+            def listado():
+                list(Place.objects.order_by('-rating_average', 'name')[:20])
+                Review.objects.filter(place_id=azar.choice(lugares)).count()
+
+            while time.perf_counter() < fin:
+                peticion(listado, 'lectura')
+
+        hilos = [threading.Thread(target=escritor, args=(i,)) for i in range(options['escritores'])]
+        hilos += [threading.Thread(target=lector, args=(i,)) for i in range(options['lectores'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+        connections.close_all()
+
+        intentos = estado['escrituras'] + estado['bloqueos_escritura']
+        return {
+            **estado,
+            'segundos': round(total, 2),
+            'escrituras_por_segundo': round(estado['escrituras'] / total, 1),
+            'lecturas_por_segundo': round(estado['lecturas'] / total, 1),
+            'tasa_bloqueo': round(estado['bloqueos_escritura'] / intentos, 4) if intentos else 0.0,
+            'escritura': resumen_latencias(latencias['escritura']),
+            'lectura': resumen_latencias(latencias['lectura']),
+        }
@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia la base SQLite principal a las réplicas locales (SQLITE_REPLICAS) con la API "
+        "de backup de SQLite. Con --cada N se repite cada N segundos: ese intervalo es el "
+        "retraso de replicación que ven las vistas de solo lectura."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0, help="Repetir cada N segundos (0: una vez)")
+
+    def handle(self, *args, **options):
+        principal = connections.settings['default']['NAME']
+        destinos = [
+            connections.settings[alias]['NAME'] for alias in settings.DATABASE_REPLICAS['ALIASES']
+            if connections.settings[alias]['NAME'] != principal
+        ]
+        if not destinos:
+            raise CommandError("No hay réplicas en archivos distintos de la base principal (SQLITE_REPLICAS)")
+
+        while True:
+            inicio = time.perf_counter()
+            origen = sqlite3.connect(principal)
+            try:
+                for destino in destinos:
+                    copia = sqlite3.connect(destino)
+                    try:
+                        origen.backup(copia)
+                    finally:
+                        copia.close()
+            finally:
+                origen.close()
+            self.stdout.write(
+                f"{len(destinos)} réplica(s) sincronizadas en {(time.perf_counter() - inicio) * 1000:.0f}ms"
+            )
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_route'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=64)),
+                ('value', models.TextField()),
+                ('expires_at', models.FloatField()),
+                ('last_access', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['namespace', 'last_access'], name='core_cached_namespa_fdf7fb_idx')],
+                'unique_together': {('namespace', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    from core.place_search import asegurar_indice
+    asegurar_indice(schema_editor.connection)
+
+
+def eliminar_indice(apps, schema_editor):
+    from core.place_search import eliminar_indice
+    eliminar_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_singleflightlock'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:33
+
+import re
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def poblar_categorias(apps, schema_editor):
+    """Separa el texto de `Place.category` en filas de `Category` enlazadas al lugar."""
+    Place = apps.get_model('core', 'Place')
+    Category = apps.get_model('core', 'Category')
+    por_slug = {c.slug: c for c in Category.objects.all()}
+    for place in Place.objects.exclude(category=''):
+        partes = [p.strip() for p in re.split(r'[,/&]| y ', place.category, flags=re.IGNORECASE)]
+        enlazadas = []
+        for nombre in filter(None, partes):
+            slug = slugify(nombre)
+            if not slug:
+                continue
+            if slug not in por_slug:
+                por_slug[slug] = Category.objects.create(name=nombre, slug=slug)
+            enlazadas.append(por_slug[slug])
+        place.categories.set(enlazadas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_place_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='categories',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='places', to='core.category', verbose_name='Categorías'),
+        ),
+        migrations.RunPython(poblar_categorias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:34
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def poblar_contadores(apps, schema_editor):
+    """
+    Cuenta las reseñas de cada lugar y deduce el rating inicial que deja el
+    promedio actual igual: promedio = (suma + inicial) / (n + 1).
+    """
+    Place = apps.get_model('core', 'Place')
+    totales = {
+        fila['place']: fila
+        for fila in apps.get_model('core', 'Review').objects.values('place').annotate(n=Count('pk'), s=Sum('qualification'))
+    }
+    for place in Place.objects.all():
+        fila = totales.get(place.pk, {'n': 0, 's': 0})
+        place.review_count, place.rating_sum = fila['n'], fila['s'] or 0
+        if not place.review_count:
+            place.rating_seed = place.rating_average
+        else:
+            semilla = place.rating_average * (place.review_count + 1) - place.rating_sum
+            if Decimal('0') < semilla <= Decimal('5'):
+                place.rating_seed = semilla.quantize(Decimal('0.01'))
+            else:
+                place.rating_seed = Decimal('0')
+                place.rating_average = (Decimal(place.rating_sum) / place.review_count).quantize(Decimal('0.01'))
+        place.save(update_fields=['review_count', 'rating_sum', 'rating_seed', 'rating_average'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_place_categories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='rating_seed',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=3, verbose_name='Calificación Inicial'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de Calificaciones'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de Reseñas'),
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
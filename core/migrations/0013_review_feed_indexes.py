@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_place_rating_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['-created_at', '-id'], name='core_review_created_54a360_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['place', '-created_at', '-id'], name='core_review_place_i_9ffea2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['qualification', '-created_at', '-id'], name='core_review_qualifi_1026dd_idx'),
+        ),
+    ]
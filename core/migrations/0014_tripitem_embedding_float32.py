@@ -0,0 +1,39 @@
+import pickle
+
+import numpy as np
+from django.db import migrations
+
+
+def pickle_a_float32(apps, schema_editor):
+    """Convierte los embeddings guardados con pickle al formato float32 de core/vectors.py."""
+    TripItem = apps.get_model('core', 'TripItem')
+    for item in TripItem.objects.exclude(embedding=None).only('pk', 'embedding').iterator():
+        datos = bytes(item.embedding)
+        # Cabecera de pickle (protocolo 2 a 5) y el STOP final
+        if not (datos[:1] == b'\x80' and datos[1:2] in (b'\x02', b'\x03', b'\x04', b'\x05') and datos.endswith(b'.')):
+            continue
+        try:
+            vector = pickle.loads(datos)
+        except Exception:
+            continue
+        item.embedding = np.asarray(vector, dtype='<f4').tobytes()
+        item.save(update_fields=['embedding'])
+
+
+def float32_a_pickle(apps, schema_editor):
+    TripItem = apps.get_model('core', 'TripItem')
+    for item in TripItem.objects.exclude(embedding=None).only('pk', 'embedding').iterator():
+        vector = np.frombuffer(bytes(item.embedding), dtype='<f4').tolist()
+        item.embedding = pickle.dumps(vector)
+        item.save(update_fields=['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_review_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(pickle_a_float32, float32_a_pickle),
+    ]
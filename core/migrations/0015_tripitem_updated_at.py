@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_tripitem_embedding_float32'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
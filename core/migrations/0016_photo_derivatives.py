@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_tripitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:54
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_photo_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.almacen_fotos, upload_to='places_photos/', verbose_name='Foto Principal'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.almacen_fotos, upload_to='profile_photos/'),
+        ),
+    ]
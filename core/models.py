@@ -1,8 +1,9 @@
 from django.db import models
-import pickle
+import uuid
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
+from .storage import almacen_fotos
 
 class TripItem(models.Model):
     PLACE_TYPES = [
@@ -33,14 +34,18 @@ class TripItem(models.Model):
     image = models.ImageField(upload_to='places/', null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Permite al índice vectorial aproximado ponerse al día solo con lo modificado
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def set_embedding(self, vector):
-        """Convierte y guarda una lista de floats como binario"""
-        self.embedding = pickle.dumps(vector)
+        """Convierte y guarda una lista de floats como binario (float32)"""
+        from .vectors import codificar_vector
+        self.embedding = codificar_vector(vector)
 
     def get_embedding(self):
-        """Devuelve el vector original"""
-        return pickle.loads(self.embedding) if self.embedding else None
+        """Devuelve el vector como lista de floats"""
+        from .vectors import decodificar_vector
+        return decodificar_vector(bytes(self.embedding)).tolist() if self.embedding else None
 
     def __str__(self):
         return f"{self.name} ({self.place_type})"
@@ -65,7 +70,9 @@ class UserProfile(models.Model):
     ]
     
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    photo = models.ImageField(upload_to='profile_photos/', blank=True, null=True)
+    photo = models.ImageField(upload_to='profile_photos/', storage=almacen_fotos, blank=True, null=True)
+    # Miniaturas AVIF/WebP/JPEG generadas de `photo` (core/images.py)
+    photo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     age = models.PositiveIntegerField(
         blank=True, 
         null=True,
@@ -132,10 +139,13 @@ class Place(models.Model):
     # Foto principal
     photo = models.ImageField(
         upload_to='places_photos/',
+        storage=almacen_fotos,
         verbose_name="Foto Principal",
         blank=True,
         null=True
     )
+    # Miniaturas AVIF/WebP/JPEG generadas de `photo` (core/images.py)
+    photo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     # Descripción
     short_description = models.CharField(
@@ -180,6 +190,15 @@ class Place(models.Model):
         help_text="Ej: Playa, Montaña, Cultural"
     )
     
+    # Categorías normalizadas a partir de `category` (se sincronizan en save())
+    categories = models.ManyToManyField(
+        'Category',
+        related_name='places',
+        blank=True,
+        editable=False,
+        verbose_name="Categorías"
+    )
+    
     rating_average = models.DecimalField(
         max_digits=3,
         decimal_places=2,
@@ -187,6 +206,18 @@ class Place(models.Model):
         verbose_name="Calificación Promedio"
     )
     
+    # Rating inicial (ficticio): si es > 0 cuenta como 1 voto en el promedio
+    rating_seed = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0.00,
+        verbose_name="Calificación Inicial"
+    )
+    
+    # Contadores de reseñas: solo los cambian los UPDATE atómicos de core/ratings.py
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Número de Reseñas")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Suma de Calificaciones")
+    
     # Campos adicionales útiles
     city = models.CharField(max_length=100, blank=True, verbose_name="Ciudad")
     department = models.CharField(max_length=100, blank=True, verbose_name="Departamento")
@@ -194,10 +225,45 @@ class Place(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    CAMPOS_RATING = ('review_count', 'rating_sum', 'rating_average')
+    CAMPOS_FOTO = ('photo', 'photo_derivatives')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Foto tal como está en la BD: si no cambia, save() no escribe la foto ni sus derivados
+        instance._foto_original = instance.__dict__.get('photo')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = slug_disponible(self.name, excluir_pk=self.pk)
+        recalcular = False
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Una instancia vieja no debe pisar los contadores que cambiaron otras reseñas
+            # ni los derivados que se generaron después de cargarla (core/images.py)
+            excluidos = set(self.CAMPOS_RATING)
+            if '_foto_original' in self.__dict__ and self.photo.name == self._foto_original:
+                excluidos.update(self.CAMPOS_FOTO)
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in excluidos
+            ]
+            recalcular = True
+        elif self._state.adding:
+            # Al crear, el promedio parte del rating inicial (antes se cargaba en rating_average)
+            if not self.rating_seed and self.rating_average:
+                self.rating_seed = self.rating_average
+            self.rating_average = self.rating_seed
         super().save(*args, **kwargs)
+        self._foto_original = self.photo.name
+        if recalcular:
+            from .ratings import recalcular_promedio
+            recalcular_promedio(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'category' in update_fields:
+            from .categories import sincronizar_categorias
+            sincronizar_categorias(self)
     
     def __str__(self):
         return self.name
@@ -207,6 +273,23 @@ class Place(models.Model):
         verbose_name_plural = "Lugares"
         ordering = ['-rating_average', 'name']
 
+def slug_disponible(nombre, ocupados=(), excluir_pk=None):
+    """
+    ``slugify(nombre)`` o, si ya lo usa otro lugar (o está en ``ocupados``), el
+    primero libre de ``<slug>-2``, ``<slug>-3``... ("Montería" y "Monteria" son
+    nombres distintos con el mismo slug).
+    """
+    base = slugify(nombre)[:200] or 'lugar'
+    usados = set(
+        Place.objects.filter(models.Q(slug=base) | models.Q(slug__startswith=f'{base}-'))
+        .exclude(pk=excluir_pk).values_list('slug', flat=True)
+    )
+    slug, n = base, 2
+    while slug in usados or slug in ocupados:
+        slug, n = f'{base}-{n}', n + 1
+    return slug
+
+
 class Category(models.Model):
     """Categorías de lugares (Nature, Culture, Adventure, etc.)"""
     name = models.CharField(max_length=100, verbose_name="Nombre")
@@ -259,10 +342,25 @@ class Review(models.Model):
         verbose_name = "Reseña"
         verbose_name_plural = "Reseñas"
         ordering = ['-created_at']
+        # Índices para la paginación por cursor (created_at, id), con y sin filtros
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['place', '-created_at', '-id']),
+            models.Index(fields=['qualification', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lugar y calificación tal como están en la BD, para ajustar los contadores al editar
+        instance._rating_original = (
+            instance.__dict__.get('place_id'), instance.__dict__.get('qualification')
+        )
+        return instance
+    
     def get_category(self):
         """Obtiene la categoría del lugar asociado"""
         return self.place.category if self.place else None
@@ -390,3 +488,56 @@ class Route(models.Model):
             url = f"https://www.google.com/maps/dir/?api=1&destination={destination_encoded}&travelmode=driving"
 
         return url
+
+
+class CachedResult(models.Model):
+    """Entrada del backend 'database' de las cachés de IA (ver core/ai_cache.py)"""
+    namespace = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)
+    value = models.TextField()
+    expires_at = models.FloatField()
+    last_access = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('namespace', 'key')]
+        indexes = [models.Index(fields=['namespace', 'last_access'])]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key[:12]}"
+
+
+class RouteJob(models.Model):
+    """Generación de ruta en segundo plano (cola en la base de datos, ver core/jobs.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En proceso'),
+        ('done', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='route_jobs')
+    params = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    route = models.ForeignKey(Route, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.params.get('ciudad')} - {self.get_status_display()}"
+
+
+class SingleFlightLock(models.Model):
+    """Candado entre procesos para generar una misma ruta una sola vez (core/singleflight.py)"""
+    key = models.CharField(max_length=64, unique=True)
+    owner = models.CharField(max_length=32)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.key[:12]
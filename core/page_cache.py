@@ -0,0 +1,201 @@
+"""
+Caché de páginas y fragmentos con claves versionadas.
+
+``@cachear_vista('places')`` guarda el HTML de la vista por parámetros GET y
+estado de sesión (anónimo o con sesión: la barra de navegación solo depende de
+eso). ``{% cachear %}`` (core/templatetags/cache_paginas.py) hace lo mismo con
+un trozo de plantilla.
+
+Cada entrada depende de etiquetas (``'lugares'``, ``'lugar:cali'``) y su clave
+incluye la versión actual de cada una. Al guardar o borrar un ``Place`` o una
+``Review`` (core/signals.py) se cambia la versión de las etiquetas afectadas:
+las entradas viejas dejan de leerse y expiran solas, sin vaciar la caché.
+
+- ``'lugares'``: listados (index, places); cualquier lugar o calificación.
+- ``'lugar:<slug>'``: el detalle de ese lugar.
+
+Las versiones son marcas de tiempo en nanosegundos, no contadores: si la caché
+expulsa una versión, la nueva nunca coincide con una clave vieja. Con réplicas
+(core/routers.py), lo que se guarda en los ``MAX_LAG`` segundos siguientes a
+una invalidación dura solo ``MAX_LAG``: pudo leerse de una réplica atrasada.
+
+Las versiones tienen que ser las mismas en todos los procesos (workers, comandos
+de gestión que importan o generan lugares): hace falta una caché compartida
+(``CACHES`` en settings). Con ``LocMemCache``, que es por proceso, la caché de
+páginas no se activa.
+
+Aciertos y fallos por vista y fragmento en ``estadisticas()`` (vista
+``page_cache_stats``, solo staff).
+
+Configuración en ``settings.PAGE_CACHE``::
+
+    PAGE_CACHE = {'ENABLED': True, 'TTL': 600}
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 60 * 10,           # respaldo por si otro proceso escribió sin pasar por las señales
+    'FRAGMENT_TTL': 60 * 10,
+}
+PREFIJO = 'core:paginas'
+
+_lock = threading.Lock()
+_contadores = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_avisado = False
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+def activa(config):
+    """``ENABLED`` y una caché compartida entre procesos."""
+    global _avisado
+    if not config['ENABLED']:
+        return False
+    if isinstance(caches['default'], LocMemCache):
+        if not _avisado:
+            _avisado = True
+            logger.warning("PAGE_CACHE desactivada: la caché 'default' es por proceso (LocMemCache)")
+        return False
+    return True
+
+
+# ============================================
+# VERSIONES POR ETIQUETA
+# ============================================
+
+def _clave_version(etiqueta):
+    return f'{PREFIJO}:version:{etiqueta}'
+
+
+def versiones(etiquetas):
+    """La versión de cada etiqueta; crea las que falten."""
+    claves = [_clave_version(e) for e in etiquetas]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            cache.add(clave, time.time_ns(), None)
+            actuales[clave] = cache.get(clave)
+    return [actuales[clave] for clave in claves]
+
+
+def invalidar(*etiquetas):
+    """Nueva versión para cada etiqueta: las entradas que dependían de ella ya no se leen."""
+    ahora = time.time_ns()
+    cache.set_many({_clave_version(e): ahora for e in etiquetas}, None)
+
+
+def etiqueta_lugar(slug):
+    # Por slug: el detalle se pide por slug y así no hace falta buscar el lugar
+    return f'lugar:{slug}'
+
+
+def clave(tipo, nombre, etiquetas, *partes):
+    """La clave de la entrada y la versión más reciente de sus etiquetas (para ``ttl``)."""
+    actuales = versiones(etiquetas)
+    resumen = hashlib.md5(repr(partes).encode(), usedforsecurity=False).hexdigest()
+    return f"{PREFIJO}:{tipo}:{nombre}:{'.'.join(map(str, actuales))}:{resumen}", max(actuales, default=0)
+
+
+def ttl(segundos, ultima_version):
+    """``segundos``, o solo ``MAX_LAG`` si hay réplicas que aún podrían no tener el último cambio."""
+    from .routers import get_config as config_replicas
+
+    replicas = config_replicas()
+    if replicas['ALIASES'] and (time.time_ns() - ultima_version) / 1e9 < replicas['MAX_LAG']:
+        return min(segundos, replicas['MAX_LAG'])
+    return segundos
+
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+def contar(tipo, nombre, acierto):
+    with _lock:
+        _contadores[f'{tipo}:{nombre}']['hits' if acierto else 'misses'] += 1
+
+
+def estadisticas():
+    with _lock:
+        contadores = {nombre: dict(c) for nombre, c in _contadores.items()}
+    hits = sum(c['hits'] for c in contadores.values())
+    total = hits + sum(c['misses'] for c in contadores.values())
+    for c in contadores.values():
+        consultas = c['hits'] + c['misses']
+        c['hit_ratio'] = round(c['hits'] / consultas, 4) if consultas else 0.0
+    return {
+        'entradas': contadores,
+        'hits': hits,
+        'misses': total - hits,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _contadores.clear()
+
+
+# ============================================
+# VISTAS
+# ============================================
+
+def estado_sesion(request):
+    return 'usuario' if request.user.is_authenticated else 'anonimo'
+
+
+def cachear_vista(nombre, etiquetas=('lugares',)):
+    """
+    Cachea la respuesta 200 de un GET. ``etiquetas`` es una tupla o una función
+    ``(request, *args, **kwargs) -> etiquetas`` para las que dependen de la URL.
+    Solo para páginas cuyo HTML depende de los datos, los parámetros y el estado
+    de sesión (no del usuario concreto ni de un token CSRF).
+    """
+    def decorador(view):
+        @wraps(view)
+        def envuelta(request, *args, **kwargs):
+            config = get_config()
+            if not activa(config) or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            dependencias = etiquetas(request, *args, **kwargs) if callable(etiquetas) else etiquetas
+            k, ultima = clave(
+                'vista', nombre, dependencias,
+                args, sorted(kwargs.items()), sorted(request.GET.lists()), estado_sesion(request),
+            )
+            guardada = cache.get(k)
+            contar('vista', nombre, guardada is not None)
+            if guardada is not None:
+                contenido, tipo = guardada
+                response = HttpResponse(contenido, content_type=tipo)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = view(request, *args, **kwargs)
+            cacheable = (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            )
+            if cacheable:
+                cache.set(k, (response.content, response['Content-Type']), ttl(config['TTL'], ultima))
+                response['X-Cache'] = 'MISS'
+            return response
+        return envuelta
+    return decorador
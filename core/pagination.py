@@ -0,0 +1,46 @@
+"""
+Paginación por cursor (keyset) para listados ordenados por ``(created_at, id)``.
+
+En vez de ``OFFSET`` cada página continúa después de la última fila vista,
+así que el coste no crece con la profundidad y el orden es estable aunque se
+publiquen reseñas mientras se hace scroll. El cursor es opaco para el cliente.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+def codificar_cursor(obj):
+    crudo = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve ``(created_at, id)``."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode('utf-8')
+        creado, pk = crudo.rsplit('|', 1)
+        return datetime.fromisoformat(creado), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise CursorInvalido(cursor) from e
+
+
+def pagina_por_cursor(qs, cursor=None, tamano=20):
+    """
+    Devuelve ``(items, siguiente_cursor)`` ordenando del más reciente al más
+    antiguo. ``siguiente_cursor`` es ``None`` en la última página.
+    """
+    qs = qs.order_by('-created_at', '-id')
+    if cursor:
+        creado, pk = decodificar_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=creado) | Q(created_at=creado, id__lt=pk))
+    items = list(qs[:tamano + 1])
+    siguiente = codificar_cursor(items[tamano - 1]) if len(items) > tamano else None
+    return items[:tamano], siguiente
@@ -0,0 +1,316 @@
+"""
+Medición por petición: tiempo total, SQL, plantillas y llamadas a OpenAI y SerpAPI.
+
+``MedicionMiddleware`` abre una ``Medicion`` por petición (en un ``ContextVar``,
+así la ven también las vistas asíncronas y sus tareas) y al terminar:
+
+- añade ``Server-Timing`` (``total``, ``db``, ``tpl``, ``openai``, ``serpapi``),
+  visible en la pestaña de red del navegador. Con ``SERVER_TIMING = 'staff'``
+  (por defecto) solo para el staff o con ``DEBUG``: los tiempos de SQL y de los
+  servicios externos no se muestran a cualquiera. ``True`` lo añade siempre
+  (bench_endpoints) y ``False`` nunca;
+- escribe una línea JSON en el logger ``core.perf`` (INFO; WARNING si es lenta);
+- guarda las lentas (``SLOW_MS``) en un buffer circular por proceso que el
+  staff consulta en la vista ``slow_requests``.
+
+De dónde sale cada tiempo:
+
+- SQL: un ``execute_wrapper`` que se instala en cada conexión al abrirse
+  (consultas y su duración).
+- Plantillas: el backend ``PlantillasMedidas`` (``TEMPLATES`` en settings);
+  solo cuenta el render exterior, no los ``include``.
+- Servicios externos: ``with medir('openai'):`` en los puntos donde la petición
+  espera la respuesta (core/itinerary.py, core/embeddings.py, core/web_search.py).
+
+Las respuestas en streaming se generan después de salir del middleware: la
+``Medicion`` sigue abierta mientras se envía el cuerpo y el log y el buffer se
+escriben al terminar, con el tiempo completo. ``Server-Timing`` va en las
+cabeceras y solo puede llevar lo medido hasta ese momento.
+
+Con ``SAMPLE_RATE < 1`` solo se mide el detalle de esa fracción de peticiones;
+las demás cuestan una lectura del reloj y, si son lentas, igual van al buffer
+(solo con el tiempo total).
+
+Configuración en ``settings.PERF``::
+
+    PERF = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SLOW_MS': 500, 'BUFFER_SIZE': 200, 'SERVER_TIMING': 'staff'}
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,       # fracción de peticiones medidas en detalle
+    'SLOW_MS': 500,           # desde aquí la petición va al buffer y al log como WARNING
+    'BUFFER_SIZE': 200,       # peticiones lentas guardadas por proceso
+    'SERVER_TIMING': 'staff',  # True: siempre; 'staff': staff o DEBUG; False: nunca
+}
+SERVICIOS = ('openai', 'serpapi')
+
+_medicion = ContextVar('medicion', default=None)
+_lock = threading.Lock()
+_lentas = deque(maxlen=DEFAULTS['BUFFER_SIZE'])
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PERF', {})}
+
+
+# ============================================
+# MEDICIÓN DE LA PETICIÓN ACTUAL
+# ============================================
+
+class Medicion:
+    """Tiempos acumulados (segundos) y número de llamadas por categoría."""
+
+    def __init__(self):
+        self.tiempos = {}
+        self.llamadas = {}
+        self._abiertas = {}
+
+    def sumar(self, categoria, segundos, llamadas=1):
+        self.tiempos[categoria] = self.tiempos.get(categoria, 0.0) + segundos
+        self.llamadas[categoria] = self.llamadas.get(categoria, 0) + llamadas
+
+
+@contextmanager
+def medir(categoria):
+    """Suma el tiempo del bloque a ``categoria`` en la petición actual (anidados: solo el exterior)."""
+    medicion = _medicion.get()
+    if medicion is None or medicion._abiertas.get(categoria):
+        yield
+        return
+    medicion._abiertas[categoria] = True
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion._abiertas[categoria] = False
+        medicion.sumar(categoria, time.perf_counter() - inicio)
+
+
+def _sql(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.sumar('db', time.perf_counter() - inicio)
+
+
+def instalar_sql(connection):
+    """
+    Receptor de ``connection_created`` (core/signals.py). Las conexiones son por
+    hilo: así también se miden las de los hilos de ``sync_to_async`` bajo ASGI.
+    """
+    if _sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql)
+
+
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        with medir('tpl'):
+            return super().render(context, request)
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """``DjangoTemplates`` que suma el tiempo de render a la petición actual."""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name).template, self)
+
+
+# ============================================
+# PETICIONES LENTAS
+# ============================================
+
+def _guardar_lenta(registro, tamano):
+    global _lentas
+    with _lock:
+        if _lentas.maxlen != tamano:
+            _lentas = deque(_lentas, maxlen=tamano)
+        _lentas.append(registro)
+
+
+def lentas():
+    """Las peticiones lentas guardadas, de la más reciente a la más antigua."""
+    with _lock:
+        return list(reversed(_lentas))
+
+
+def vaciar_lentas():
+    with _lock:
+        _lentas.clear()
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+def _ms(segundos):
+    return round(segundos * 1000, 2)
+
+
+def registro_de(request, response, total, medicion):
+    coincidencia = getattr(request, 'resolver_match', None)
+    registro = {
+        'ts': round(time.time(), 3),
+        'metodo': request.method,
+        'ruta': request.path,
+        'vista': coincidencia.view_name if coincidencia else None,
+        'estado': response.status_code,
+        'total_ms': _ms(total),
+        'muestreada': medicion is not None,
+    }
+    if medicion is not None:
+        registro['db_ms'] = _ms(medicion.tiempos.get('db', 0))
+        registro['consultas'] = medicion.llamadas.get('db', 0)
+        registro['tpl_ms'] = _ms(medicion.tiempos.get('tpl', 0))
+        for servicio in SERVICIOS:
+            registro[f'{servicio}_ms'] = _ms(medicion.tiempos.get(servicio, 0))
+            registro[f'{servicio}_llamadas'] = medicion.llamadas.get(servicio, 0)
+    return registro
+
+
+def server_timing(registro):
+    partes = [f"total;dur={registro['total_ms']}"]
+    if registro['muestreada']:
+        partes.append(f"db;dur={registro['db_ms']};desc=\"{registro['consultas']} consultas\"")
+        partes.append(f"tpl;dur={registro['tpl_ms']}")
+        partes += [
+            f"{servicio};dur={registro[f'{servicio}_ms']}"
+            for servicio in SERVICIOS if registro[f'{servicio}_llamadas']
+        ]
+    return ', '.join(partes)
+
+
+def mostrar_timing(request, modo):
+    if modo == 'staff':
+        usuario = getattr(request, 'user', None)
+        return settings.DEBUG or bool(usuario is not None and usuario.is_staff)
+    return bool(modo)
+
+
+async def amostrar_timing(request, modo):
+    """``mostrar_timing`` para vistas asíncronas: el usuario se carga con ``auser()``."""
+    if modo == 'staff' and not settings.DEBUG and hasattr(request, 'auser'):
+        return (await request.auser()).is_staff
+    return mostrar_timing(request, modo)
+
+
+def _restaurar(token):
+    # Un generador cerrado por el recolector puede acabar en otro contexto
+    try:
+        _medicion.reset(token)
+    except ValueError:
+        pass
+
+
+class MedicionMiddleware:
+    """
+    Mide cada petición; ver el docstring del módulo. Síncrono y asíncrono: la
+    ``Medicion`` queda en el contexto de la petición, que heredan sus tareas y
+    los hilos de ``sync_to_async``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config, medicion, token = self._abrir()
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        registro = self._terminar(request, response, inicio, config, medicion)
+        if registro is not None and mostrar_timing(request, config['SERVER_TIMING']):
+            response['Server-Timing'] = server_timing(registro)
+        return response
+
+    async def __acall__(self, request):
+        config, medicion, token = self._abrir()
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        registro = self._terminar(request, response, inicio, config, medicion)
+        if registro is not None and await amostrar_timing(request, config['SERVER_TIMING']):
+            response['Server-Timing'] = server_timing(registro)
+        return response
+
+    def _abrir(self):
+        config = get_config()
+        medicion = Medicion() if random.random() < config['SAMPLE_RATE'] else None
+        return config, medicion, _medicion.set(medicion)
+
+    def _terminar(self, request, response, inicio, config, medicion):
+        """
+        Registro para ``Server-Timing``. En streaming (salvo ficheros) el log y
+        el buffer esperan al final del cuerpo.
+        """
+        total = time.perf_counter() - inicio
+        if not response.streaming or isinstance(response, FileResponse):
+            return self._registrar(request, response, total, config, medicion)
+        contenido = response.streaming_content
+        medir_cuerpo = self._amedir_cuerpo if response.is_async else self._medir_cuerpo
+        response.streaming_content = medir_cuerpo(contenido, request, response, inicio, config, medicion)
+        return None if medicion is None else registro_de(request, response, total, medicion)
+
+    def _medir_cuerpo(self, contenido, request, response, inicio, config, medicion):
+        token = _medicion.set(medicion)
+        try:
+            yield from contenido
+        finally:
+            _restaurar(token)
+            self._registrar(request, response, time.perf_counter() - inicio, config, medicion)
+
+    async def _amedir_cuerpo(self, contenido, request, response, inicio, config, medicion):
+        token = _medicion.set(medicion)
+        try:
+            async for parte in contenido:
+                yield parte
+        finally:
+            _restaurar(token)
+            self._registrar(request, response, time.perf_counter() - inicio, config, medicion)
+
+    def _registrar(self, request, response, total, config, medicion):
+        """Log y buffer de lentas; devuelve el registro (``None`` si no se midió ni fue lenta)."""
+        lenta = total * 1000 >= config['SLOW_MS']
+        if medicion is None and not lenta:
+            return None
+        registro = registro_de(request, response, total, medicion)
+        if lenta:
+            _guardar_lenta(registro, config['BUFFER_SIZE'])
+            logger.warning(json.dumps(registro))
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(registro))
+        return registro
@@ -0,0 +1,148 @@
+"""
+Búsqueda de texto completo sobre ``Place`` con SQLite FTS5.
+
+La tabla virtual ``core_place_fts`` indexa nombre, descripción breve, ciudad y
+departamento sin tildes (``remove_diacritics``), de modo que "monteria"
+encuentra "Montería". Cada palabra se busca por prefijo y los resultados se
+ordenan por BM25. Los triggers de SQLite la mantienen sincronizada en cada
+INSERT/UPDATE/DELETE (también en ``bulk_create`` y ``update()``).
+
+Solo se devuelven los ``MAX_RESULTADOS`` más relevantes: el orden se arma con un
+``CASE`` por id y el filtro con ``pk IN``, que no deben crecer con el catálogo.
+Una búsqueda con más coincidencias pierde las menos relevantes (icontains, en
+cambio, no tiene tope).
+
+Con otros motores de base de datos, o si SQLite no trae FTS5, se usa el
+filtro ``icontains`` de siempre.
+"""
+import logging
+import re
+
+from django.db import connection, connections, OperationalError
+from django.db.models import Case, IntegerField, Q, When
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'core_place_fts'
+CAMPOS = ['name', 'short_description', 'city', 'department']
+# Pesos BM25 en el orden de CAMPOS: el nombre pesa más que la descripción
+PESOS = [10.0, 2.0, 5.0, 3.0]
+MAX_RESULTADOS = 500           # tope de coincidencias por búsqueda (las de mayor BM25)
+
+_columnas = ', '.join(CAMPOS)
+_nuevos = ', '.join(f'new.{c}' for c in CAMPOS)
+_viejos = ', '.join(f'old.{c}' for c in CAMPOS)
+
+SQL_TABLA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5({_columnas}, "
+    f"content='core_place', content_rowid='id', tokenize=\"unicode61 remove_diacritics 2\")"
+)
+
+SQL_TRIGGERS = {
+    f'{TABLA}_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA}_ai AFTER INSERT ON core_place BEGIN "
+        f"INSERT INTO {TABLA}(rowid, {_columnas}) VALUES (new.id, {_nuevos}); END"
+    ),
+    f'{TABLA}_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA}_ad AFTER DELETE ON core_place BEGIN "
+        f"INSERT INTO {TABLA}({TABLA}, rowid, {_columnas}) VALUES ('delete', old.id, {_viejos}); END"
+    ),
+    f'{TABLA}_au': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA}_au AFTER UPDATE ON core_place BEGIN "
+        f"INSERT INTO {TABLA}({TABLA}, rowid, {_columnas}) VALUES ('delete', old.id, {_viejos}); "
+        f"INSERT INTO {TABLA}(rowid, {_columnas}) VALUES (new.id, {_nuevos}); END"
+    ),
+}
+
+
+def fts_disponible(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def asegurar_indice(conn=connection):
+    """
+    Crea la tabla FTS y sus triggers si faltan y reconstruye el índice en ese caso.
+    Es idempotente: se llama desde la migración y después de cada ``migrate``,
+    porque SQLite pierde los triggers cuando una migración reconstruye core_place.
+    """
+    if not fts_disponible(conn):
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{TABLA}%'],
+        )
+        existentes = {row[0] for row in cursor.fetchall()}
+        faltan = (set(SQL_TRIGGERS) | {TABLA}) - existentes
+        if not faltan:
+            return False
+        try:
+            cursor.execute(SQL_TABLA)
+        except OperationalError as e:
+            logger.warning('SQLite sin FTS5 (%s); la búsqueda de lugares usará icontains', e)
+            return False
+        for sql in SQL_TRIGGERS.values():
+            cursor.execute(sql)
+        reconstruir_indice(conn)
+    return True
+
+
+def reconstruir_indice(conn=connection):
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLA}({TABLA}) VALUES ('rebuild')")
+
+
+def eliminar_indice(conn=connection):
+    if not fts_disponible(conn):
+        return
+    with conn.cursor() as cursor:
+        for nombre in SQL_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+def consulta_fts(texto):
+    """'san andrés' → '"san"* "andrés"*' (todas las palabras, por prefijo)."""
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{p}"*' for p in palabras)
+
+
+def ids_por_relevancia(texto, conn=connection):
+    """Ids de ``Place`` que coinciden, del más al menos relevante (BM25)."""
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    pesos = ', '.join(str(p) for p in PESOS)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s "
+            f"ORDER BY bm25({TABLA}, {pesos}) LIMIT %s",
+            [consulta, MAX_RESULTADOS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filtro_icontains(texto):
+    return (
+        Q(name__icontains=texto) |
+        Q(short_description__icontains=texto) |
+        Q(city__icontains=texto) |
+        Q(department__icontains=texto)
+    )
+
+
+def buscar_lugares(qs, texto):
+    """Filtra ``qs`` por ``texto`` y lo ordena por relevancia cuando hay FTS5."""
+    # La consulta FTS va a la base de la que lee ``qs`` (``router.db_for_read``: una
+    # réplica en las vistas marcadas) y ``qs`` se fija a esa misma réplica
+    alias = qs.db
+    conn = connections[alias]
+    if fts_disponible(conn):
+        try:
+            ids = ids_por_relevancia(texto, conn)
+        except OperationalError as e:
+            logger.warning('Búsqueda FTS no disponible (%s); se usa icontains', e)
+        else:
+            orden = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(ids)], output_field=IntegerField())
+            return qs.using(alias).filter(pk__in=ids).order_by(orden) if ids else qs.none()
+    return qs.filter(filtro_icontains(texto))
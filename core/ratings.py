@@ -0,0 +1,59 @@
+"""
+Rating de los lugares con contadores incrementales.
+
+``Place`` guarda el número de reseñas (``review_count``) y la suma de sus
+calificaciones (``rating_sum``); cada reseña creada, editada o borrada los ajusta
+con un único UPDATE con ``F()``, sin leer las reseñas. El promedio se recalcula
+en ese mismo UPDATE e incluye el rating inicial (``rating_seed``) como 1 voto
+si es mayor que 0. ``reconstruir_ratings`` rehace los contadores desde ``Review``.
+"""
+from django.db.models import Case, Count, DecimalField, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .models import Place, Review
+
+
+def _promedio(delta_suma=0, delta_cantidad=0):
+    """Expresión del nuevo ``rating_average`` a partir de los valores actuales de la fila."""
+    voto_semilla = Case(When(rating_seed__gt=0, then=Value(1)), default=Value(0))
+    suma = Cast(F('rating_sum') + delta_suma, FloatField()) + Cast(F('rating_seed'), FloatField())
+    cantidad = F('review_count') + delta_cantidad + voto_semilla
+    return Case(
+        # Sin reseñas el promedio es el rating inicial
+        When(review_count__gt=-delta_cantidad, then=Round(suma / cantidad, 2)),
+        default=F('rating_seed'),
+        output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def aplicar_voto(place_id, delta_suma, delta_cantidad=0):
+    """Suma ``delta_suma`` a la suma y ``delta_cantidad`` al número de reseñas, atómicamente."""
+    Place.objects.filter(pk=place_id).update(
+        rating_sum=F('rating_sum') + delta_suma,
+        review_count=F('review_count') + delta_cantidad,
+        rating_average=_promedio(delta_suma, delta_cantidad),
+    )
+
+
+def recalcular_promedio(place):
+    """Recalcula el promedio (p. ej. si cambió el rating inicial) y lo deja en ``place``."""
+    Place.objects.filter(pk=place.pk).update(rating_average=_promedio())
+    place.refresh_from_db(fields=Place.CAMPOS_RATING)
+
+
+def rating_actual(place_id):
+    return Place.objects.values_list('rating_average', flat=True).get(pk=place_id)
+
+
+def reconstruir_ratings(places=None):
+    """Rehace contadores y promedio desde ``Review`` en dos UPDATE. Devuelve las filas tocadas."""
+    places = Place.objects.all() if places is None else places
+    reseñas = Review.objects.filter(place=OuterRef('pk')).order_by().values('place')
+    cantidad = reseñas.annotate(n=Count('pk')).values('n')
+    suma = reseñas.annotate(s=Sum('qualification')).values('s')
+    filas = places.update(
+        review_count=Coalesce(Subquery(cantidad), 0),
+        rating_sum=Coalesce(Subquery(suma), 0),
+    )
+    places.update(rating_average=_promedio())
+    return filas
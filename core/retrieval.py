@@ -0,0 +1,226 @@
+"""
+Contexto local para las rutas de IA: lugares (``Place``) y experiencias
+(``TripItem``) de nuestra base que encajan con la ciudad e intereses pedidos.
+
+Los lugares se buscan por ciudad o departamento (FTS, sin tildes). Las
+experiencias de esa ciudad se ordenan por similitud semántica con los
+intereses (índice vectorial) y, si no hay embeddings o falla el proveedor,
+por coincidencia de palabras. Los fragmentos se añaden en ese orden mientras
+quepan en ``TOKEN_BUDGET``.
+
+Si lo local cubre la ruta (al menos ``MIN_ITEMS`` recomendaciones concretas,
+y ``ITEMS_PER_DAY`` por día) no se consulta SerpAPI.
+
+Configuración en ``settings.LOCAL_CONTEXT``::
+
+    LOCAL_CONTEXT = {'ENABLED': True, 'TOKEN_BUDGET': 1200, 'MIN_ITEMS': 6}
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+from .ai_cache import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TOKEN_BUDGET': 1200,    # tokens (aprox.) del contexto local en el prompt
+    'MAX_ITEMS': 20,         # experiencias candidatas por ruta
+    'MIN_ITEMS': 6,          # recomendaciones concretas para prescindir de la web
+    'ITEMS_PER_DAY': 3,
+    'SEMANTIC': True,        # ordenar experiencias con embeddings si los hay
+}
+MAX_DESCRIPCION = 300
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LOCAL_CONTEXT', {})}
+
+
+def estimar_tokens(texto):
+    """Aproximación del tokenizador de OpenAI: ~4 caracteres por token."""
+    return len(texto) // 4 + 1
+
+
+def _recortar(texto, limite=MAX_DESCRIPCION):
+    texto = ' '.join((texto or '').split())
+    return texto if len(texto) <= limite else texto[:limite].rsplit(' ', 1)[0] + '…'
+
+
+def _elementos(lista):
+    """'Feria de Cali, Festival Petronio Álvarez.' → ['Feria de Cali', 'Festival Petronio Álvarez']"""
+    return [e.strip(' .') for e in re.split(r'[,;\n]', lista or '') if e.strip(' .')]
+
+
+def _palabras(*textos):
+    """Raíces (5 letras) de las palabras significativas: 'Gastronómico' y 'gastronomía' coinciden."""
+    return {p[:5] for t in textos for p in normalizar_texto(t).split() if len(p) > 3}
+
+
+def tope_presupuesto(presupuesto):
+    """'$90–150' → 150.0 (el extremo superior del rango); ``None`` si no hay números."""
+    numeros = re.findall(r'\d+(?:[.,]\d+)?', str(presupuesto or ''))
+    return float(numeros[-1].replace(',', '.')) if numeros else None
+
+
+# ============================================
+# RECUPERACIÓN
+# ============================================
+
+def lugares_de_ciudad(ciudad):
+    """``Place`` cuyo nombre, ciudad o departamento es ``ciudad`` (sin tildes ni mayúsculas)."""
+    from .models import Place
+    from .place_search import buscar_lugares
+
+    objetivo = normalizar_texto(ciudad)
+    if not objetivo:
+        return []
+    candidatos = buscar_lugares(Place.objects.prefetch_related('categories'), ciudad)
+    return [
+        p for p in candidatos
+        if objetivo in {normalizar_texto(p.name), normalizar_texto(p.city), normalizar_texto(p.department)}
+    ]
+
+
+def _consulta(params):
+    return '. '.join(filter(None, [
+        ', '.join(params.get('intereses') or []), params.get('evento'), params.get('barrio'),
+    ]))
+
+
+def _ids_semanticos(params, ciudades, candidatos, k):
+    """Ids de ``TripItem`` de ``ciudades`` ordenados por similitud con los intereses."""
+    from .embeddings import embed_consultas
+    from .vectors import get_indice
+
+    consulta = _consulta(params)
+    # Sin vectores que comparar no se paga el embedding de la consulta
+    if not consulta or not any(item.embedding for item in candidatos):
+        return []
+    try:
+        indice = get_indice()
+        if not len(indice):
+            return []
+        vector = embed_consultas([consulta])
+        similitud = {
+            pk: s for ciudad in ciudades
+            for pk, s in indice.buscar(vector, k, filtros={'city': ciudad})[0]
+        }
+    except Exception as e:
+        logger.warning('Contexto local sin búsqueda semántica (%s); se ordena por palabras', e)
+        return []
+    return sorted(similitud, key=similitud.get, reverse=True)[:k]
+
+
+def experiencias_de_ciudad(params, ciudades, config):
+    """``TripItem`` de ``ciudades`` más afines a los intereses, primero los que caben en el presupuesto."""
+    from .models import TripItem
+
+    filtro = Q()
+    for ciudad in ciudades:
+        filtro |= Q(city__iexact=ciudad)
+    candidatos = {item.pk: item for item in TripItem.objects.filter(filtro)}
+    if not candidatos:
+        return []
+
+    semanticos = []
+    if config['SEMANTIC']:
+        semanticos = _ids_semanticos(params, ciudades, candidatos.values(), config['MAX_ITEMS'])
+    posicion = {pk: i for i, pk in enumerate(semanticos)}
+    intereses = _palabras(_consulta(params))
+    tope = tope_presupuesto(params.get('presupuesto'))
+
+    def orden(item):
+        coincidencias = len(intereses & _palabras(item.name, item.description, item.get_place_type_display()))
+        fuera_de_presupuesto = tope is not None and item.estimated_cost is not None and item.estimated_cost > tope
+        return (fuera_de_presupuesto, posicion.get(item.pk, len(posicion)), -coincidencias, item.pk)
+
+    return sorted(candidatos.values(), key=orden)[:config['MAX_ITEMS']]
+
+
+# ============================================
+# FRAGMENTOS Y PRESUPUESTO DE TOKENS
+# ============================================
+
+def fragmento_lugar(place):
+    categorias = ', '.join(c.name for c in place.categories.all()) or place.category
+    lineas = [
+        f"## {place.name} ({', '.join(filter(None, [place.city, place.department]))})",
+        f"Categorías: {categorias}. Calificación: {place.rating_average}/5. "
+        f"Costo estimado: {place.estimated_cost}.",
+        _recortar(place.short_description),
+    ]
+    for titulo, campo in (('Eventos', place.events), ('Restaurantes', place.restaurants), ('Hoteles', place.hotels)):
+        if _elementos(campo):
+            lineas.append(f"{titulo}: {'; '.join(_elementos(campo))}")
+    return '\n'.join(lineas)
+
+
+def fragmento_experiencia(item):
+    detalles = [item.get_place_type_display()]
+    if item.estimated_cost is not None:
+        detalles.append(f"costo estimado {item.estimated_cost} por persona")
+    if item.address:
+        detalles.append(item.address)
+    texto = f"- {item.name} ({'; '.join(detalles)})"
+    if item.description:
+        texto += f": {_recortar(item.description)}"
+    return texto
+
+
+def contexto_local(params):
+    """
+    Devuelve ``{'texto', 'lugares', 'experiencias', 'recomendaciones', 'tokens', 'suficiente'}``.
+    ``recomendaciones`` cuenta experiencias y eventos, restaurantes y hoteles de los lugares incluidos.
+    """
+    config = get_config()
+    vacio = {'texto': '', 'lugares': 0, 'experiencias': 0, 'recomendaciones': 0, 'tokens': 0, 'suficiente': False}
+    if not config['ENABLED'] or not params.get('ciudad'):
+        return vacio
+
+    lugares = lugares_de_ciudad(params['ciudad'])
+    ciudades = {params['ciudad']} | {p.city for p in lugares if p.city}
+    experiencias = experiencias_de_ciudad(params, sorted(ciudades), config)
+
+    partes, tokens = [], 0
+    resultado = dict(vacio)
+    for place in lugares:
+        fragmento = fragmento_lugar(place)
+        if tokens + estimar_tokens(fragmento) > config['TOKEN_BUDGET']:
+            break
+        partes.append(fragmento)
+        tokens += estimar_tokens(fragmento)
+        resultado['lugares'] += 1
+        resultado['recomendaciones'] += sum(
+            len(_elementos(campo)) for campo in (place.events, place.restaurants, place.hotels)
+        )
+
+    encabezado = "## Experiencias registradas"
+    lineas = []
+    for item in experiencias:
+        fragmento = fragmento_experiencia(item)
+        costo = estimar_tokens(fragmento) + (0 if lineas else estimar_tokens(encabezado))
+        if tokens + costo > config['TOKEN_BUDGET']:
+            # Puede caber otra más corta
+            continue
+        lineas.append(fragmento)
+        tokens += costo
+        resultado['experiencias'] += 1
+        resultado['recomendaciones'] += 1
+    if lineas:
+        partes.append('\n'.join([encabezado] + lineas))
+
+    try:
+        dias = max(1, int(params.get('dias') or 1))
+    except (TypeError, ValueError):
+        dias = 1
+    minimo = max(config['MIN_ITEMS'], config['ITEMS_PER_DAY'] * dias)
+    resultado.update(
+        texto='\n\n'.join(partes),
+        tokens=tokens,
+        suficiente=resultado['recomendaciones'] >= minimo,
+    )
+    return resultado
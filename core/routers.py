@@ -0,0 +1,134 @@
+"""
+Lecturas en réplicas para las vistas de solo lectura.
+
+Las vistas marcadas con ``@lee_de_replica`` (index, places, place_detail,
+reviews, public_profile) leen de una de las réplicas de
+``settings.DATABASE_REPLICAS['ALIASES']``; todo lo demás, y cualquier
+escritura, va a ``default``. Fuera de una petición (comandos, shell, tests
+sin middleware) también se lee de ``default``.
+
+Leer lo propio: si una petición escribe (una reseña, el perfil, el login),
+``ReplicaMiddleware`` deja una cookie y durante ``MAX_LAG`` segundos ese
+navegador lee de ``default`` aunque la vista esté marcada. ``MAX_LAG`` debe
+cubrir el retraso de replicación tolerado.
+
+En local, ``SQLITE['REPLICAS']`` (o ``SQLITE_REPLICAS`` en el entorno) añade
+archivos SQLite como réplicas y ``manage.py sync_sqlite_replicas`` los copia
+desde la base principal cada tantos segundos, que hace de retraso de replicación.
+
+Configuración en ``settings.DATABASE_REPLICAS``::
+
+    DATABASE_REPLICAS = {'ALIASES': ['replica_1'], 'MAX_LAG': 5}
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+DEFAULTS = {
+    'ALIASES': [],
+    'MAX_LAG': 5,                 # segundos leyendo de default tras escribir
+    'COOKIE': 'akua_primaria',
+}
+
+# Estado de la petición en curso: {'replica': bool, 'escribio': bool, 'primaria': bool}
+_peticion = ContextVar('akua_replicas', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICAS', {})}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        estado = _peticion.get()
+        if not estado or not estado['replica'] or estado['primaria'] or estado['escribio']:
+            return None
+        aliases = get_config()['ALIASES']
+        return random.choice(aliases) if aliases else None
+
+    def db_for_write(self, model, **hints):
+        estado = _peticion.get()
+        if estado is not None:
+            estado['escribio'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las réplicas tienen los mismos datos que default
+        bases = {'default', *get_config()['ALIASES']}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas se copian de default; no se migran
+        return False if db in get_config()['ALIASES'] else None
+
+
+class ReplicaMiddleware:
+    """
+    Marca la petición y fija en ``default`` al navegador que acaba de escribir.
+    Síncrono y asíncrono: bajo ASGI no obliga a Django a pasar las vistas
+    asíncronas a un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        estado, token = self._abrir(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return self._cerrar(response, estado)
+
+    async def __acall__(self, request):
+        estado, token = self._abrir(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return self._cerrar(response, estado)
+
+    def _abrir(self, request):
+        config = get_config()
+        try:
+            desde = float(request.COOKIES.get(config['COOKIE'], 0))
+        except ValueError:
+            desde = 0
+        estado = {'replica': False, 'escribio': False, 'primaria': time.time() - desde < config['MAX_LAG']}
+        return estado, _peticion.set(estado)
+
+    def _cerrar(self, response, estado):
+        config = get_config()
+        if estado['escribio'] and config['ALIASES']:
+            response.set_cookie(
+                config['COOKIE'], f'{time.time():.3f}', max_age=config['MAX_LAG'],
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def lee_de_replica(view):
+    """Las lecturas de la vista van a una réplica (salvo lectura de lo propio)."""
+    @wraps(view)
+    def envuelta(request, *args, **kwargs):
+        estado = _peticion.get()
+        if estado is None:
+            return view(request, *args, **kwargs)
+        anterior, estado['replica'] = estado['replica'], True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            estado['replica'] = anterior
+    return envuelta
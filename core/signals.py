@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .categories import invalidar_categorias
+from .images import pendiente, programar
+from .models import Category, Place, Review, TripItem, UserProfile
+from .page_cache import etiqueta_lugar, invalidar
+from .perf import instalar_sql
+from .place_search import asegurar_indice
+from .ratings import aplicar_voto, reconstruir_ratings
+from .vectors import invalidar_indice
+
+
+@receiver(connection_created)
+def medir_consultas(sender, connection, **kwargs):
+    instalar_sql(connection)
+
+
+@receiver(post_migrate)
+def recrear_indice_fts(sender, app_config, using, **kwargs):
+    """Las migraciones que reconstruyen core_place en SQLite borran los triggers del índice FTS."""
+    if app_config.label != 'core':
+        return
+    from django.db import connections
+    asegurar_indice(connections[using])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Place)
+@receiver(m2m_changed, sender=Place.categories.through)
+def invalidar_lista_categorias(sender, **kwargs):
+    invalidar_categorias()
+    invalidar('lugares')
+
+
+@receiver(pre_save, sender=Place)
+def recordar_slug_anterior(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._slug_anterior = Place.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidar_paginas_de_lugar(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_slug_anterior', None)} - {None}
+    invalidar('lugares', *(etiqueta_lugar(slug) for slug in slugs))
+
+
+# Antes que ajustar_rating_al_guardar, que actualiza _rating_original
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidar_paginas_de_resena(sender, instance, raw=False, **kwargs):
+    """La calificación cambia en los listados y en el detalle del lugar (y del anterior, si se movió)."""
+    if raw:
+        return
+    ids = {instance.place_id, getattr(instance, '_rating_original', (None, None))[0]} - {None}
+    slugs = Place.objects.filter(pk__in=ids).values_list('slug', flat=True)
+    invalidar('lugares', *(etiqueta_lugar(slug) for slug in slugs))
+
+
+@receiver(post_save, sender=Review)
+def ajustar_rating_al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    original = getattr(instance, '_rating_original', (None, None))
+    if created:
+        aplicar_voto(instance.place_id, instance.qualification, 1)
+    elif None in original:
+        # No se sabe qué había en la BD: se rehace el lugar desde sus reseñas
+        reconstruir_ratings(Place.objects.filter(pk=instance.place_id))
+    elif original[0] != instance.place_id:
+        aplicar_voto(original[0], -original[1], -1)
+        aplicar_voto(instance.place_id, instance.qualification, 1)
+    elif original[1] != instance.qualification:
+        aplicar_voto(instance.place_id, instance.qualification - original[1])
+    instance._rating_original = (instance.place_id, instance.qualification)
+
+
+@receiver(post_delete, sender=Review)
+def ajustar_rating_al_borrar(sender, instance, **kwargs):
+    place_id, calificacion = getattr(instance, '_rating_original', (None, None))
+    if None in (place_id, calificacion):
+        place_id, calificacion = instance.place_id, instance.qualification
+    aplicar_voto(place_id, -calificacion, -1)
+
+
+@receiver(post_save, sender=TripItem)
+@receiver(post_delete, sender=TripItem)
+def invalidar_indice_vectorial(sender, using='default', **kwargs):
+    # Después del commit: otro proceso que reconstruya antes leería los datos viejos
+    transaction.on_commit(invalidar_indice, using=using)
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_save, sender=UserProfile)
+def generar_derivados_de_foto(sender, instance, raw=False, **kwargs):
+    """Miniaturas de la foto nueva o cambiada (se generan después del commit)."""
+    if not raw and pendiente(instance):
+        programar(instance)
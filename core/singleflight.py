@@ -0,0 +1,354 @@
+"""
+Deduplicación de llamadas en curso ("single flight").
+
+Cuando varias peticiones piden la misma ruta a la vez, solo la primera (líder)
+llama a SerpAPI y OpenAI; las demás esperan y reciben el mismo resultado.
+Dentro de un proceso se coordinan hilos (``do``/``do_stream``) o corrutinas
+(``ado``/``ado_stream``). Entre procesos se puede añadir un candado de archivo o
+de base de datos con ``settings.SINGLE_FLIGHT``::
+
+    SINGLE_FLIGHT = {'CROSS_PROCESS': 'file', 'LOCK_TIMEOUT': 120}
+
+El candado entre procesos solo evita llamadas repetidas si la caché de rutas
+es compartida (backend 'file' o 'database'): el proceso que espera vuelve a
+mirar la caché cuando obtiene el candado.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {'CROSS_PROCESS': None, 'LOCK_TIMEOUT': 120, 'LOCATION': None}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SINGLE_FLIGHT', {})}
+
+
+class Cancelado(Exception):
+    """El líder terminó sin resultado (p. ej. el cliente cerró el streaming)."""
+
+
+class _Llamada:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def esperar(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._acalls = {}
+
+    # ---------- hilos ----------
+
+    def _unirse(self, key):
+        """Devuelve ``(llamada, es_lider)``."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Llamada()
+            return call, True
+
+    def _terminar(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+
+    def do(self, key, fn):
+        """Ejecuta ``fn()`` una sola vez por ``key`` a la vez. Devuelve ``(resultado, compartido)``."""
+        call, lider = self._unirse(key)
+        if not lider:
+            return call.esperar(), True
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._terminar(key, call)
+
+    def do_stream(self, key, gen_fn):
+        """
+        Como ``do`` para generadores de texto: el líder entrega los fragmentos a
+        medida que llegan y quienes esperan reciben el texto completo al final.
+        """
+        call, lider = self._unirse(key)
+        if not lider:
+            yield call.esperar()
+            return
+        partes = []
+        try:
+            for fragmento in gen_fn():
+                partes.append(fragmento)
+                yield fragmento
+            call.result = ''.join(partes)
+        except BaseException as e:
+            call.error = e if isinstance(e, Exception) else Cancelado()
+            raise
+        finally:
+            if call.result is None and call.error is None:
+                call.error = Cancelado()
+            self._terminar(key, call)
+
+    # ---------- asyncio ----------
+
+    def _aunirse(self, key):
+        loop = asyncio.get_running_loop()
+        future = self._acalls.get((loop, key))
+        if future is not None:
+            return future, False
+        future = self._acalls[(loop, key)] = loop.create_future()
+        # Evita "Future exception was never retrieved" si nadie esperaba
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future, True
+
+    def _aterminar(self, key, future, result=None, error=None):
+        """Resuelve ``future`` (si aún no lo estaba) y lo retira de las llamadas en curso."""
+        clave = (asyncio.get_running_loop(), key)
+        if self._acalls.get(clave) is future:
+            del self._acalls[clave]
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def ado(self, key, coro_fn):
+        """Versión asíncrona de ``do``."""
+        future, lider = self._aunirse(key)
+        if not lider:
+            return await asyncio.shield(future), True
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self._aterminar(key, future, error=e if isinstance(e, Exception) else Cancelado())
+            raise
+        self._aterminar(key, future, result=result)
+        return result, False
+
+    async def ado_stream(self, key, agen_fn):
+        """Versión asíncrona de ``do_stream``."""
+        future, lider = self._aunirse(key)
+        if not lider:
+            yield await asyncio.shield(future)
+            return
+        partes = []
+        try:
+            async for fragmento in agen_fn():
+                partes.append(fragmento)
+                yield fragmento
+            self._aterminar(key, future, result=''.join(partes))
+        except BaseException as e:
+            self._aterminar(key, future, error=e if isinstance(e, Exception) else Cancelado())
+            raise
+        finally:
+            # Sin efecto si ya se resolvió arriba
+            self._aterminar(key, future, error=Cancelado())
+
+
+# ============================================
+# CANDADOS ENTRE PROCESOS
+# ============================================
+
+class FileLock:
+    """Candado exclusivo sobre ``<LOCATION>/<hash>.lock`` (flock / msvcrt)."""
+
+    def __init__(self, key, timeout, location=None):
+        base = location or os.path.join(settings.BASE_DIR, 'cache', 'locks')
+        os.makedirs(str(base), exist_ok=True)
+        nombre = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        self.path = os.path.join(str(base), f'{nombre}.lock')
+        self.timeout = timeout
+        self._fh = None
+
+    def _intentar(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        self._fh = open(self.path, 'a+')
+        limite = time.monotonic() + self.timeout
+        while not self._intentar():
+            if time.monotonic() > limite:
+                self._fh.close()
+                return False
+            time.sleep(0.05)
+        return True
+
+    def release(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        self._fh.close()
+
+
+def _base_ocupada(error):
+    """``OperationalError`` de SQLite porque otro proceso está escribiendo ("database is locked")."""
+    return 'database is locked' in str(error)
+
+
+class DatabaseLock:
+    """
+    Candado como fila única en ``SingleFlightLock``; expira solo tras ``timeout``.
+    Con SQLite ocupada por otra escritura se reintenta como si el candado
+    estuviera tomado, esperando cada vez un poco más (hasta 1 s).
+    """
+
+    def __init__(self, key, timeout, **options):
+        self.key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        self.timeout = timeout
+        self.owner = uuid.uuid4().hex
+
+    def _intentar(self):
+        from .models import SingleFlightLock
+
+        ahora = timezone.now()
+        try:
+            SingleFlightLock.objects.filter(key=self.key, expires_at__lt=ahora).delete()
+            with transaction.atomic():
+                SingleFlightLock.objects.create(
+                    key=self.key, owner=self.owner,
+                    expires_at=ahora + timedelta(seconds=self.timeout),
+                )
+            return True
+        except IntegrityError:
+            return False
+        except OperationalError as e:
+            if not _base_ocupada(e):
+                raise
+            return False
+
+    def acquire(self):
+        limite = time.monotonic() + self.timeout
+        espera = 0.05
+        while not self._intentar():
+            if time.monotonic() > limite:
+                return False
+            time.sleep(espera)
+            espera = min(espera * 2, 1.0)
+        return True
+
+    def release(self):
+        from .models import SingleFlightLock
+
+        # Si no se logra borrar la fila, el candado expira solo tras ``timeout``
+        espera = 0.05
+        for _ in range(10):
+            try:
+                SingleFlightLock.objects.filter(key=self.key, owner=self.owner).delete()
+                return
+            except OperationalError as e:
+                if not _base_ocupada(e):
+                    raise
+                time.sleep(espera)
+                espera = min(espera * 2, 1.0)
+        logger.warning('No se pudo liberar el candado %s; expira en %s s', self.key[:12], self.timeout)
+
+
+LOCKS = {
+    'file': FileLock,
+    'database': DatabaseLock,
+}
+
+
+def _crear_candado(key):
+    config = get_config()
+    if not config['CROSS_PROCESS']:
+        return None
+    return LOCKS[config['CROSS_PROCESS']](key, config['LOCK_TIMEOUT'], location=config['LOCATION'])
+
+
+@contextmanager
+def candado_entre_procesos(key):
+    """
+    Bloquea ``key`` entre procesos si ``CROSS_PROCESS`` está activo.
+    Devuelve ``True`` si hubo que coordinar con otros procesos. Si el candado
+    no se obtiene dentro de ``LOCK_TIMEOUT`` se continúa sin él.
+    """
+    candado = _crear_candado(key)
+    if candado is None:
+        yield False
+        return
+    obtenido = candado.acquire()
+    if not obtenido:
+        logger.warning('No se obtuvo el candado de %s; se continúa sin él', key[:12])
+    try:
+        yield True
+    finally:
+        if obtenido:
+            candado.release()
+
+
+def _en_hilo(funcion):
+    """
+    ``funcion`` en un hilo del pool, no en el hilo síncrono compartido: la espera
+    del candado puede durar ``LOCK_TIMEOUT``. Esos hilos no pasan por
+    ``request_finished``, así que cierran aquí sus conexiones.
+    """
+    def envoltura():
+        try:
+            return funcion()
+        finally:
+            close_old_connections()
+    return sync_to_async(envoltura, thread_sensitive=False)
+
+
+class acandado_entre_procesos:
+    """Versión asíncrona de ``candado_entre_procesos`` (la espera ocurre en un hilo)."""
+
+    def __init__(self, key):
+        self.key = key
+        self.candado = _crear_candado(key)
+        self.obtenido = False
+
+    async def __aenter__(self):
+        if self.candado is None:
+            return False
+        self.obtenido = await _en_hilo(self.candado.acquire)()
+        if not self.obtenido:
+            logger.warning('No se obtuvo el candado de %s; se continúa sin él', self.key[:12])
+        return True
+
+    async def __aexit__(self, *exc):
+        if self.obtenido:
+            await _en_hilo(self.candado.release)()
@@ -0,0 +1,94 @@
+"""
+Perfil de SQLite para producción: WAL, pragmas ajustados y conexiones persistentes.
+
+Se usa desde ``akua/settings.py`` para armar ``DATABASES`` (solo la biblioteca
+estándar: se importa antes de cargar Django)::
+
+    DATABASES = bases_sqlite(BASE_DIR / 'db.sqlite3', SQLITE)
+
+Con ``ENABLED`` cada conexión ejecuta al abrirse:
+
+- ``journal_mode = WAL``: los lectores no bloquean al escritor ni al revés.
+- ``synchronous = NORMAL``: en WAL no se corrompe la base; como mucho se pierde
+  la última transacción si se va la luz (no si se cae el proceso).
+- ``cache_size`` y ``mmap_size``: más páginas en memoria y lecturas sin copiar.
+- ``busy_timeout`` (``TIMEOUT``): esperar al escritor en vez de fallar con
+  "database is locked".
+
+``TRANSACTION_MODE = 'IMMEDIATE'`` toma el candado de escritura al abrir cada
+``atomic()``: una transacción que lee y luego escribe ya no falla al querer
+promover su candado mientras otra escribe (ahí ``busy_timeout`` no ayuda).
+``CONN_MAX_AGE`` reutiliza la conexión entre peticiones del mismo hilo.
+
+Con ``READONLY`` se añade el alias ``'readonly'`` sobre el mismo archivo con
+``query_only``, y con ``REPLICAS`` (rutas de archivos) los alias ``'replica_1'``,
+``'replica_2'``... para probar réplicas en local. Las vistas de solo lectura
+los usan a través de core/routers.py; en los tests son espejo de ``'default'``.
+
+Sin ``ENABLED`` (por defecto con ``DEBUG``) queda la configuración de Django
+tal cual: así ``runserver`` y los comandos no cambian el modo del
+``db.sqlite3`` del repositorio.
+"""
+DEFAULTS = {
+    'ENABLED': True,
+    'JOURNAL_MODE': 'WAL',
+    'SYNCHRONOUS': 'NORMAL',
+    'CACHE_SIZE_KB': 64 * 1024,           # 64 MB de caché de páginas por conexión
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'TEMP_STORE': 'MEMORY',
+    'TIMEOUT': 10,                        # segundos esperando un candado (busy_timeout)
+    'TRANSACTION_MODE': 'IMMEDIATE',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'READONLY': True,
+    'REPLICAS': [],                       # archivos SQLite copiados de la principal
+}
+
+LECTURA = 'readonly'
+
+
+def pragmas(config, solo_lectura=False):
+    """Sentencias ``PRAGMA`` para ``OPTIONS['init_command']``."""
+    sentencias = [
+        f"PRAGMA journal_mode = {config['JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SYNCHRONOUS']}",
+        f"PRAGMA cache_size = -{int(config['CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size = {int(config['MMAP_SIZE'])}",
+        f"PRAGMA temp_store = {config['TEMP_STORE']}",
+    ]
+    if solo_lectura:
+        # El modo del diario lo fija la conexión de escritura
+        sentencias = sentencias[1:] + ['PRAGMA query_only = ON']
+    return ';'.join(sentencias)
+
+
+def bases_sqlite(nombre, config=None):
+    """``DATABASES`` para el archivo ``nombre`` con el perfil ``config`` (``SQLITE`` en settings)."""
+    config = {**DEFAULTS, **(config or {})}
+    default = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': nombre}
+    espejo = {'TEST': {'MIRROR': 'default'}}
+    if not config['ENABLED']:
+        bases = {'default': default}
+        for i, archivo in enumerate(config['REPLICAS'], 1):
+            bases[f'replica_{i}'] = {**default, 'NAME': archivo, **espejo}
+        return bases
+
+    def conexion(solo_lectura=False, archivo=nombre):
+        return {
+            **default,
+            'NAME': archivo,
+            'CONN_MAX_AGE': config['CONN_MAX_AGE'],
+            'CONN_HEALTH_CHECKS': config['CONN_HEALTH_CHECKS'],
+            'OPTIONS': {
+                'timeout': config['TIMEOUT'],
+                'transaction_mode': None if solo_lectura else config['TRANSACTION_MODE'],
+                'init_command': pragmas(config, solo_lectura),
+            },
+        }
+
+    bases = {'default': conexion()}
+    if config['READONLY']:
+        bases[LECTURA] = {**conexion(solo_lectura=True), **espejo}
+    for i, archivo in enumerate(config['REPLICAS'], 1):
+        bases[f'replica_{i}'] = {**conexion(solo_lectura=True, archivo=archivo), **espejo}
+    return bases
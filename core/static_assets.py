@@ -0,0 +1,232 @@
+"""
+Estáticos para producción: nombres con hash, variantes comprimidas y un
+servidor dentro de la aplicación para despliegues sin nginx delante.
+
+``CompressedManifestStaticFilesStorage`` (``STORAGES['staticfiles']`` con
+``DEBUG = False``) hace lo mismo que ``ManifestStaticFilesStorage``
+(``theme.css`` → ``theme.1a2b3c4d5e6f.css`` y ``staticfiles.json``) y además,
+durante ``collectstatic``, guarda ``.gz`` y ``.br`` de los archivos de texto
+cuando ocupan menos que el original. Brotli requiere el paquete ``brotli``;
+sin él solo se genera gzip.
+
+``ServidorEstaticos`` es un middleware que responde ``STATIC_URL`` desde
+``STATIC_ROOT``: indexa los archivos una vez, elige la variante ``br``/``gzip``
+según ``Accept-Encoding``, responde ``304`` a ``If-None-Match`` y marca los
+archivos con hash como inmutables durante un año.
+
+Configuración en ``settings.STATIC_SERVER``::
+
+    STATIC_SERVER = {'ENABLED': not DEBUG, 'MAX_AGE': 60}
+
+``MAX_AGE`` (segundos) aplica a los archivos sin hash, que el navegador revalida
+con ``ETag``; los que tienen hash se cachean un año.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import threading
+from email.utils import formatdate
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se sirve gzip
+    brotli = None
+
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf'}
+TAMANO_MINIMO = 256
+# Solo se guarda una variante si ahorra al menos un 5 %
+AHORRO_MINIMO = 0.95
+UN_ANO = 60 * 60 * 24 * 365
+
+DEFAULTS = {'ENABLED': True, 'MAX_AGE': 60}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'STATIC_SERVER', {})}
+
+
+# ============================================
+# COMPRESIÓN EN COLLECTSTATIC
+# ============================================
+
+def _escribir(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def comprimir(ruta):
+    """Escribe ``ruta.gz`` y ``ruta.br`` si hace falta y compensan. Devuelve las rutas escritas."""
+    if os.path.splitext(ruta)[1].lower() not in EXTENSIONES_COMPRIMIBLES:
+        return []
+    modificado = os.stat(ruta).st_mtime
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    if len(datos) < TAMANO_MINIMO:
+        return []
+
+    escritas = []
+    compresores = {'.gz': lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compresores['.br'] = lambda d: brotli.compress(d, quality=11)
+    for extension, compresor in compresores.items():
+        destino = ruta + extension
+        if os.path.exists(destino) and os.stat(destino).st_mtime >= modificado:
+            continue
+        comprimido = compresor(datos)
+        if len(comprimido) < len(datos) * AHORRO_MINIMO:
+            _escribir(destino, comprimido)
+            escritas.append(destino)
+        elif os.path.exists(destino):
+            os.remove(destino)
+    return escritas
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest con hash de contenido + variantes ``.gz``/``.br`` precomprimidas."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        nombres = set(paths) | set(self.hashed_files.values()) | {self.manifest_name}
+        for nombre in sorted(nombres):
+            if not self.exists(nombre):
+                continue
+            for ruta in comprimir(self.path(nombre)):
+                yield nombre, os.path.relpath(ruta, self.location), True
+
+
+# ============================================
+# SERVIDOR DENTRO DE LA APLICACIÓN
+# ============================================
+
+class Archivo:
+    __slots__ = ('ruta', 'tamano', 'modificado', 'etag', 'tipo', 'variantes', 'inmutable')
+
+    def __init__(self, ruta, inmutable):
+        estado = os.stat(ruta)
+        self.ruta = ruta
+        self.tamano = estado.st_size
+        self.modificado = formatdate(estado.st_mtime, usegmt=True)
+        self.etag = f'"{estado.st_size:x}-{estado.st_mtime_ns:x}"'
+        self.tipo = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+        if self.tipo.startswith('text/') or self.tipo in ('application/javascript', 'image/svg+xml'):
+            self.tipo += '; charset=utf-8'
+        self.inmutable = inmutable
+        # Codificación → (ruta, tamaño), en orden de preferencia
+        self.variantes = {}
+        for codificacion, extension in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.exists(ruta + extension):
+                self.variantes[codificacion] = (ruta + extension, os.path.getsize(ruta + extension))
+
+
+def indexar(raiz):
+    """``{ruta relativa: Archivo}`` de todo ``raiz``; los nombres del manifest son inmutables."""
+    inmutables = set()
+    try:
+        with open(os.path.join(raiz, ManifestStaticFilesStorage.manifest_name)) as f:
+            inmutables = set(json.load(f).get('paths', {}).values())
+    except (OSError, ValueError):
+        pass
+
+    archivos = {}
+    for carpeta, _, nombres in os.walk(raiz):
+        for nombre in nombres:
+            if nombre.endswith(('.gz', '.br', '.tmp')):
+                continue
+            ruta = os.path.join(carpeta, nombre)
+            relativa = os.path.relpath(ruta, raiz).replace(os.sep, '/')
+            archivos[relativa] = Archivo(ruta, relativa in inmutables)
+    return archivos
+
+
+class ServidorEstaticos:
+    """
+    Middleware: sirve ``STATIC_URL`` desde ``STATIC_ROOT`` con caché HTTP y
+    precompresión. Síncrono y asíncrono, para no obligar a ASGI a usar un hilo
+    por petición.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config['ENABLED'] or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefijo = '/' + settings.STATIC_URL.lstrip('/')
+        self.raiz = str(settings.STATIC_ROOT)
+        self._archivos = None
+        self._lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        respuesta = self.estatico(request)
+        return respuesta if respuesta is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        respuesta = self.estatico(request)
+        return respuesta if respuesta is not None else await self.get_response(request)
+
+    def estatico(self, request):
+        if request.path_info.startswith(self.prefijo):
+            return self.servir(request, request.path_info[len(self.prefijo):])
+        return None
+
+    def archivos(self):
+        # Se indexa una sola vez: collectstatic se ejecuta antes de arrancar
+        if self._archivos is None:
+            with self._lock:
+                if self._archivos is None:
+                    self._archivos = indexar(self.raiz)
+        return self._archivos
+
+    def servir(self, request, relativa):
+        archivo = self.archivos().get(relativa)
+        if archivo is None:
+            return None
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+        aceptadas = {c.split(';')[0].strip() for c in request.headers.get('Accept-Encoding', '').split(',')}
+        codificacion = next((c for c in archivo.variantes if c in aceptadas), None)
+        ruta, tamano = archivo.variantes[codificacion] if codificacion else (archivo.ruta, archivo.tamano)
+        etag = archivo.etag[:-1] + (f'-{codificacion}"' if codificacion else '"')
+
+        cabeceras = {
+            'ETag': etag,
+            'Last-Modified': archivo.modificado,
+            'Cache-Control': (
+                f'public, max-age={UN_ANO}, immutable' if archivo.inmutable
+                else f"public, max-age={self.config['MAX_AGE']}"
+            ),
+        }
+        if archivo.variantes:
+            cabeceras['Vary'] = 'Accept-Encoding'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            respuesta = HttpResponse(status=304)
+        elif request.method == 'HEAD':
+            respuesta = HttpResponse(content_type=archivo.tipo)
+            respuesta['Content-Length'] = tamano
+        else:
+            respuesta = FileResponse(open(ruta, 'rb'), content_type=archivo.tipo)
+            respuesta['Content-Length'] = tamano
+        if codificacion and respuesta.status_code == 200:
+            respuesta['Content-Encoding'] = codificacion
+        for nombre, valor in cabeceras.items():
+            respuesta[nombre] = valor
+        return respuesta
@@ -0,0 +1,81 @@
+"""
+Almacenamiento de fotos direccionado por contenido.
+
+Cada archivo subido se guarda como ``<carpeta de upload_to>/<sha256[:32]>.<ext>``:
+si ya existe un archivo con el mismo contenido se reutiliza en lugar de
+escribir una copia con sufijo aleatorio (``Cali_kzRDbIm.jpeg``). Volver a
+subir la misma foto no ocupa más disco ni crea otra URL para la CDN.
+
+Las ``ImageField`` de fotos usan el alias ``fotos`` de ``settings.STORAGES``
+(``almacen_fotos``); los duplicados que ya existían se unifican con
+``manage.py dedupe_media``.
+
+Dos procesos pueden subir la misma foto a la vez: cada uno escribe en un
+temporal del mismo directorio y lo mueve con ``os.replace`` al nombre final.
+Nadie ve un archivo a medio escribir y, como el contenido es el mismo, da igual
+quién llegue último.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+
+BLOQUE = 1024 * 1024
+LARGO_HASH = 32
+
+
+def hash_contenido(archivo):
+    """sha256 del archivo leyendo por bloques; deja el puntero donde estaba al empezar."""
+    sha = hashlib.sha256()
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+        sha.update(bloque)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    return sha.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` que nombra cada archivo por el hash de su contenido."""
+
+    def nombre_por_contenido(self, name, content):
+        directorio, base = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(base)[1].lower()
+        return posixpath.join(directorio, f'{hash_contenido(content)[:LARGO_HASH]}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.nombre_por_contenido(name, content)
+        if self.exists(name):
+            # Mismo contenido ya guardado: se reutiliza el archivo
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Si el nombre ya existe tiene este mismo contenido: sin sufijos aleatorios
+        return name
+
+    def _save(self, name, content):
+        destino = self.path(name)
+        directorio = os.path.dirname(destino)
+        os.makedirs(directorio, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=directorio, prefix='.subida-')
+        try:
+            with os.fdopen(fd, 'wb') as salida:
+                for bloque in content.chunks():
+                    salida.write(bloque)
+            os.chmod(temporal, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+            os.replace(temporal, destino)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+        return name
+
+
+def almacen_fotos():
+    """Storage de ``Place.photo`` y ``UserProfile.photo`` (alias ``fotos`` de ``STORAGES``)."""
+    return storages['fotos']
@@ -0,0 +1,59 @@
+from django import template
+from django.core.cache import cache
+
+from core.page_cache import activa, clave, contar, etiqueta_lugar, get_config, ttl
+
+register = template.Library()
+
+
+class FragmentoNode(template.Node):
+    def __init__(self, nodelist, nombre, etiquetas, variaciones):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+        self.variaciones = variaciones
+
+    def render(self, context):
+        config = get_config()
+        if not activa(config):
+            return self.nodelist.render(context)
+        nombre = self.nombre.resolve(context)
+        etiquetas = [str(e.resolve(context)) for e in self.etiquetas]
+        k, ultima = clave('fragmento', nombre, etiquetas, *[v.resolve(context) for v in self.variaciones])
+        html = cache.get(k)
+        contar('fragmento', nombre, html is not None)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(k, html, ttl(config['FRAGMENT_TTL'], ultima))
+        return html
+
+
+@register.tag
+def cachear(parser, token):
+    """
+    Cachea un trozo de plantilla hasta que cambie alguna de sus etiquetas
+    (core/page_cache.py). Lo que va después de ``por`` forma parte de la clave::
+
+        {% cachear 'tarjetas_lugares' 'lugares' por request.GET.urlencode %}...{% endcachear %}
+        {% cachear 'detalle_lugar' place|etiqueta_cache por user.is_authenticated %}...{% endcachear %}
+    """
+    partes = token.split_contents()
+    if len(partes) < 2:
+        raise template.TemplateSyntaxError("'cachear' necesita al menos un nombre")
+    nombre, resto = partes[1], partes[2:]
+    corte = resto.index('por') if 'por' in resto else len(resto)
+    etiquetas, variaciones = resto[:corte], resto[corte + 1:]
+    nodelist = parser.parse(('endcachear',))
+    parser.delete_first_token()
+    return FragmentoNode(
+        nodelist,
+        parser.compile_filter(nombre),
+        [parser.compile_filter(e) for e in etiquetas],
+        [parser.compile_filter(v) for v in variaciones],
+    )
+
+
+@register.filter
+def etiqueta_cache(place):
+    """``place|etiqueta_cache`` → ``'lugar:<slug>'``."""
+    return etiqueta_lugar(place.slug)
@@ -0,0 +1,46 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from core.images import TIPOS_MIME, variantes
+
+register = template.Library()
+
+
+def _srcset(lista):
+    return ', '.join(f'{url} {ancho}w' for url, ancho in lista)
+
+
+@register.simple_tag
+def picture(fieldfile, sizes='100vw', **atributos):
+    """
+    ``<picture>`` con AVIF/WebP/JPEG en varios anchos y ``sizes``; el resto de
+    argumentos (``alt``, ``class``, ``style``, ``loading``…) van al ``<img>``.
+    Sin derivados generados todavía, un ``<img>`` con el original.
+
+        {% picture place.photo sizes="(min-width: 992px) 33vw, 100vw" alt=place.name class="card-img-top" %}
+    """
+    if not fieldfile:
+        return ''
+    atributos.setdefault('alt', '')
+    atributos.setdefault('loading', 'lazy')
+    atributos.setdefault('decoding', 'async')
+    por_formato = variantes(fieldfile)
+    jpeg = por_formato.pop('jpeg', None)
+
+    if jpeg:
+        # Respaldo para navegadores sin srcset: el primer ancho de al menos 480 px
+        atributos['src'] = next((url for url, ancho in jpeg if ancho >= 480), jpeg[-1][0])
+        atributos['srcset'] = _srcset(jpeg)
+        atributos['sizes'] = sizes
+    else:
+        atributos['src'] = fieldfile.url
+    img = format_html('<img{}>', format_html_join('', ' {}="{}"', atributos.items()))
+    if not por_formato:
+        return img
+
+    fuentes = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((TIPOS_MIME[formato], _srcset(lista), sizes) for formato, lista in por_formato.items()),
+    )
+    # display: contents → el <img> sigue midiendo contra el contenedor de la tarjeta
+    return format_html('<picture style="display: contents">{}{}</picture>', fuentes, img)
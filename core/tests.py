@@ -1,3 +1,1331 @@
-from django.test import TestCase
+import asyncio
+import html
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, web_search
+from .ai_cache import BACKENDS, ResultCache, get_cache
+from .ann import IndiceIVF
+from .catalog import FORMATOS, importar, leer_filas
+from .categories import separar_categorias
+from .embeddings import generar_embeddings
+from .itinerary import aconsultar_modelo_stream, buscar_contexto, consultar_modelo_stream
+from .models import Place, Review, Route, RouteJob, SingleFlightLock, TripItem, UserProfile
+from .page_cache import estadisticas, reiniciar_estadisticas
+from .perf import MedicionMiddleware, lentas, medir, vaciar_lentas
+from .place_search import buscar_lugares
+from .retrieval import contexto_local
+from .singleflight import LOCKS, DatabaseLock, SingleFlight, acandado_entre_procesos, candado_entre_procesos
+from .sqlite import LECTURA, bases_sqlite
+from .vectors import get_indice
+
+_CACHE = {}
+
+
+def setUpModule():
+    # Caché compartida como la de settings, pero vacía y fuera de cache/ del proyecto
+    _CACHE['dir'] = tempfile.mkdtemp(prefix='akua-cache-')
+    _CACHE['ajustes'] = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': _CACHE['dir'],
+    }})
+    _CACHE['ajustes'].enable()
+
+
+def tearDownModule():
+    _CACHE['ajustes'].disable()
+    shutil.rmtree(_CACHE['dir'], ignore_errors=True)
+
+
+class CarpetaTemporalMixin:
+    """``self.carpeta``: un directorio temporal, borrado al terminar, activo como ``MEDIA_ROOT``."""
+
+    def ajustes_carpeta(self):
+        return {'MEDIA_ROOT': self.carpeta}
+
+    def setUp(self):
+        super().setUp()
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+        ajustes = override_settings(**self.ajustes_carpeta())
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+
+# Sin réplicas: las consultas se cuentan en default
+@override_settings(
+    REVIEWS_PAGE_SIZE=50,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    DATABASE_REPLICAS={'ALIASES': []},
+)
+class ReviewsListQueriesTests(TestCase):
+    """El listado de reseñas no debe hacer una consulta extra por autor (N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.place = Place.objects.create(name='Montería', short_description='Río Sinú', category='Cultural')
+
+    def crear_reviews(self, cantidad):
+        inicio = Review.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            user = User.objects.create_user(f'viajero{i}', password='x')
+            # La mitad con perfil y foto, la otra mitad sin perfil
+            if i % 2:
+                UserProfile.objects.create(user=user, photo=f'profile_photos/{i}.jpg')
+            Review.objects.create(
+                title=f'Reseña {i}', description='Muy bonito', qualification=i % 5 + 1,
+                user=user, place=self.place,
+            )
+
+    def contar_consultas(self, url):
+        self.client.get(url)  # calienta la caché de categorías
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def test_consultas_constantes_en_el_listado(self):
+        self.crear_reviews(2)
+        pocas = self.contar_consultas(reverse('reviews'))
+        self.crear_reviews(20)
+        with self.assertNumQueries(pocas):
+            self.client.get(reverse('reviews'))
+
+    def test_consultas_constantes_en_el_fragmento(self):
+        self.crear_reviews(3)
+        url = reverse('reviews_fragment') + '?size=2'
+        pocas = self.contar_consultas(url)
+        self.crear_reviews(20)
+        with self.assertNumQueries(pocas):
+            self.client.get(url.replace('size=2', 'size=20'))
+
+    def test_cargar_mas_enlaza_la_pagina_siguiente(self):
+        self.crear_reviews(3)
+        response = self.client.get(reverse('reviews'), {'size': 2})
+        enlace = re.search(r'<a href="([^"]+)"[^>]*>Cargar más</a>', response.content.decode())
+        siguiente = self.client.get(html.unescape(enlace.group(1)))
+        self.assertContains(siguiente, 'id="reviewsFeed"')
+        self.assertContains(siguiente, 'Reseña 0')
+        self.assertNotContains(siguiente, 'Reseña 2')
+        self.assertNotContains(siguiente, 'class="reviews-sentinel')
+
+    def test_perfil_publico_en_una_consulta(self):
+        self.crear_reviews(2)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('public_profile', args=['viajero1']))
+
+
+@override_settings(AI_EMBEDDINGS={'BACKEND': 'local', 'BATCH_SIZE': 7, 'CONCURRENCY': 3, 'BACKOFF': 0})
+class GenerarEmbeddingsTests(TestCase):
+    """Relleno por lotes de TripItem.embedding con el backend local (sin red)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        TripItem.objects.bulk_create([
+            TripItem(name=f'Experiencia {i}', description='Paseo en lancha por el río', place_type='site', city='Montería')
+            for i in range(30)
+        ])
+
+    def test_backend_local_determinista(self):
+        from .embeddings import LocalEmbeddings
+
+        a, b = LocalEmbeddings().embed(['Playa en Cartagena']), LocalEmbeddings().embed(['Playa en Cartagena'])
+        self.assertEqual(a, b)
+        self.assertEqual(len(a[0]), 256)
+
+    def test_rellena_solo_los_que_faltan_y_se_puede_reanudar(self):
+        stats = generar_embeddings(limite=10)
+        self.assertEqual(stats['procesados'], 10)
+        self.assertEqual(TripItem.objects.filter(embedding=None).count(), 20)
+
+        stats = generar_embeddings()
+        self.assertEqual(stats['procesados'], 20)
+        self.assertEqual(stats['lotes'], 3)
+        self.assertFalse(TripItem.objects.filter(embedding=None).exists())
+        self.assertEqual(len(TripItem.objects.first().get_embedding()), 256)
+
+    def test_reintenta_errores_transitorios(self):
+        from . import embeddings
+
+        original, fallos = embeddings.embed_textos, []
+
+        def inestable(textos):
+            if len(fallos) < 2:
+                fallos.append(1)
+                raise ConnectionError('timeout')
+            return original(textos)
+
+        with mock.patch.object(embeddings, 'embed_textos', inestable), self.assertLogs('core.embeddings', 'WARNING'):
+            stats = generar_embeddings(concurrency=1)
+        self.assertEqual(len(fallos), 2)
+        self.assertEqual((stats['procesados'], stats['fallidos']), (30, 0))
+
+
+
+@override_settings(AI_EMBEDDINGS={'BACKEND': 'local'})
+class IndiceIVFTests(TestCase):
+    """El IVF en disco: versiones completas y sin las filas borradas en la BD."""
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(VECTOR_INDEX={
+            'BACKEND': 'ivf', 'LOCATION': carpeta, 'NLIST': 4, 'SYNC_INTERVAL': 0, 'REBUILD_RATIO': 10,
+        })
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.carpeta = os.path.join(carpeta, 'ivf')
+        TripItem.objects.bulk_create([
+            TripItem(name=f'Lancha {i}', description='Paseo por el río', place_type='site', city='Montería')
+            for i in range(20)
+        ])
+        generar_embeddings()
+
+    def test_borrados_y_versiones_en_disco(self):
+        indice = get_indice()
+        borrado = TripItem.objects.first().pk
+        vector = indice.vector_de(borrado)
+        TripItem.objects.filter(pk=borrado).delete()
+
+        indice = get_indice()
+        self.assertEqual(len(indice), 19)
+        self.assertIsNone(indice.vector_de(borrado))
+        self.assertNotIn(borrado, [pk for pk, _ in indice.buscar([vector], k=20)[0]])
+
+        # meta.json apunta a una base y unos agregados completos; las versiones viejas se borran
+        for _ in range(3):
+            TripItem.objects.filter(pk=TripItem.objects.last().pk).update(updated_at=timezone.now())
+            get_indice()
+        carpetas = sorted(os.listdir(self.carpeta))
+        self.assertEqual(sum(c.startswith('base-') for c in carpetas), 1)
+        self.assertEqual(sum(c.startswith('agregados-') for c in carpetas), 2)
+        self.assertEqual(len(IndiceIVF.cargar(self.carpeta)), 19)
+
+@override_settings(
+    AI_EMBEDDINGS={'BACKEND': 'local'}, VECTOR_INDEX={'LOCATION': None},
+    LOCAL_CONTEXT={'TOKEN_BUDGET': 400, 'MIN_ITEMS': 6, 'ITEMS_PER_DAY': 3},
+)
+class ContextoLocalTests(TestCase):
+    """Las rutas se apoyan en Place/TripItem y solo buscan en la web si no alcanza."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Place.objects.create(
+            name='Montería', city='Montería', department='Córdoba', short_description='Ribera del Sinú',
+            category='Cultural', events='Festival del Porro, Feria Ganadera', restaurants='Asadero La Ribera',
+        )
+        for i in range(12):
+            TripItem.objects.create(
+                name=f'Lancha {i}' if i % 2 else f'Museo {i}', place_type='site', city='Montería',
+                description='Paseo en lancha por la naturaleza del río' if i % 2 else 'Historia y arte zenú',
+                estimated_cost=50 + i,
+            )
+        generar_embeddings()
+
+    def params(self, **extra):
+        return {
+            'ciudad': 'monteria', 'pais': 'Colombia', 'presupuesto': '$60–90', 'dias': '1',
+            'intereses': ['Naturaleza'], 'evento': '', 'barrio': '', **extra,
+        }
+
+    def test_respeta_el_presupuesto_de_tokens_y_prioriza_intereses(self):
+        local = contexto_local(self.params())
+        self.assertLessEqual(local['tokens'], 400)
+        self.assertIn('Festival del Porro', local['texto'])
+        experiencias = local['texto'].split('## Experiencias registradas')[1]
+        self.assertTrue(experiencias.strip().startswith('- Lancha'))
+
+    def test_sin_busqueda_web_si_lo_local_alcanza(self):
+        with mock.patch('core.web_search.resumen_web') as web:
+            resumen_web, texto_local = buscar_contexto(self.params())
+        web.assert_not_called()
+        self.assertEqual(resumen_web, '')
+        self.assertIn('Montería', texto_local)
+
+    def test_busqueda_de_experiencias_con_sesion_y_embedding_cacheado(self):
+        from . import embeddings
+
+        url = reverse('trip_items_search') + '?q=lancha por el río'
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        get_cache('consultas').clear()
+        self.client.force_login(User.objects.create_user('buscador', password='x'))
+        with mock.patch.object(embeddings, 'embed_textos', wraps=embeddings.embed_textos) as embed:
+            primera = self.client.get(url).json()['resultados']
+            self.assertEqual(self.client.get(url.replace('río', 'RIO')).json()['resultados'], primera)
+        embed.assert_called_once()
+        self.assertTrue(primera[0]['name'].startswith('Lancha'))
+
+    def test_busca_en_la_web_si_faltan_recomendaciones(self):
+        with mock.patch('core.web_search.resumen_web', return_value='web') as web:
+            resumen_web, _ = buscar_contexto(self.params(dias='10'))
+        web.assert_called_once()
+        self.assertEqual(resumen_web, 'web')
+
+    def test_semantica_en_las_ciudades_resueltas_y_sin_embedding_si_no_hay_vectores(self):
+        from . import embeddings
+        from .retrieval import _ids_semanticos
+
+        # 'Córdoba' es el departamento: las experiencias están en Montería
+        items = list(TripItem.objects.all())
+        ids = _ids_semanticos(self.params(ciudad='Córdoba'), ['Córdoba', 'Montería'], items, 4)
+        self.assertEqual(len(ids), 4)
+        self.assertTrue(all(TripItem.objects.get(pk=pk).name.startswith('Lancha') for pk in ids))
+
+        sin_vectores = [TripItem(name='Nueva', city='Montería')]
+        with mock.patch.object(embeddings, 'embed_consultas') as embed:
+            self.assertEqual(_ids_semanticos(self.params(), ['Montería'], sin_vectores, 4), [])
+        embed.assert_not_called()
+
+
+@override_settings(IMAGE_DERIVATIVES={'BACKGROUND': False, 'FORMATS': ['webp', 'jpeg']})
+class DerivadosDeImagenTests(CarpetaTemporalMixin, TestCase):
+    """Las fotos subidas se sirven con srcset de miniaturas con hash en el nombre."""
+
+    def foto(self, color, ancho=600):
+        from PIL import Image
+
+        salida = io.BytesIO()
+        Image.new('RGB', (ancho, ancho // 2), color).save(salida, 'JPEG')
+        return SimpleUploadedFile('cali.jpg', salida.getvalue(), content_type='image/jpeg')
+
+    def test_genera_al_subir_y_cambia_la_url_si_cambia_la_foto(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            place = Place.objects.create(name='Cali', short_description='Salsa', photo=self.foto('red'))
+        place.refresh_from_db()
+        self.assertEqual(place.photo_derivatives['anchos'], [240, 480])
+        html = Template('{% load imagenes %}{% picture p.photo sizes="120px" %}').render(Context({'p': place}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f".{place.photo_derivatives['hash']}.240w.jpeg 240w", html)
+
+        anterior = place.photo_derivatives['hash']
+        place.photo = self.foto('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            place.save()
+        place.refresh_from_db()
+        self.assertNotEqual(place.photo_derivatives['hash'], anterior)
+        self.assertEqual(self.derivados(anterior), [])
+        self.assertEqual(len(self.derivados(place.photo_derivatives['hash'])), self.cuantos(place.photo_derivatives))
+
+    def test_no_borra_derivados_que_otro_lugar_usa(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cali = Place.objects.create(name='Cali', short_description='Salsa', photo=self.foto('red'))
+            Place.objects.create(name='Buga', short_description='Basílica', photo=cali.photo.name)
+        cali.refresh_from_db()
+        anteriores = cali.photo_derivatives
+
+        cali.photo = self.foto('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            cali.save()
+        self.assertEqual(len(self.derivados(anteriores['hash'])), self.cuantos(anteriores))
+
+    def test_una_instancia_vieja_no_pisa_los_derivados(self):
+        from .images import generar_para
+
+        place = Place.objects.create(name='Cali', short_description='Salsa', photo=self.foto('red'))
+        vieja = Place.objects.get(pk=place.pk)
+        derivados = generar_para(Place.objects.get(pk=place.pk))
+
+        vieja.name = 'Santiago de Cali'
+        vieja.save()
+        place.refresh_from_db()
+        self.assertEqual((place.name, place.photo_derivatives), ('Santiago de Cali', derivados))
+
+    @staticmethod
+    def cuantos(derivados):
+        return len(derivados['anchos']) * len(derivados['formatos'])
+
+    def derivados(self, digest):
+        carpeta = os.path.join(settings.MEDIA_ROOT, 'derivados', 'places_photos')
+        return [nombre for nombre in os.listdir(carpeta) if f'.{digest}.' in nombre]
+
+    def test_la_misma_foto_reutiliza_el_archivo(self):
+        foto = self.foto('red')
+        uno = Place.objects.create(name='Cali', short_description='Salsa', photo=foto)
+        foto.seek(0)
+        dos = Place.objects.create(name='Buga', short_description='Basílica', photo=SimpleUploadedFile('otra.JPG', foto.read()))
+        self.assertEqual(uno.photo.name, dos.photo.name)
+        self.assertTrue(uno.photo.name.startswith('places_photos/') and uno.photo.name.endswith('.jpg'))
+
+    def test_subidas_simultaneas_de_la_misma_foto(self):
+        from .storage import almacen_fotos
+
+        storage, foto = almacen_fotos(), self.foto('red')
+        nombre = storage.save('places_photos/cali.jpg', foto)
+        # El otro proceso comprobó antes de que el archivo existiera
+        with mock.patch.object(storage, 'exists', return_value=False):
+            self.assertEqual(storage.save('places_photos/cali.jpg', foto), nombre)
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(nombre))), [os.path.basename(nombre)])
+        foto.seek(0)
+        with storage.open(nombre) as guardada:
+            self.assertEqual(guardada.read(), foto.read())
+
+    def test_sin_derivados_usa_el_original(self):
+        with self.settings(IMAGE_DERIVATIVES={'BACKGROUND': True}):
+            place = Place.objects.create(name='Pasto', short_description='Carnaval', photo=self.foto('green'))
+        html = Template('{% load imagenes %}{% picture p.photo %}').render(Context({'p': place}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(place.photo.url, html)
+
+    def test_descarta_los_formatos_que_pillow_no_escribe(self):
+        from PIL import features
+
+        from . import images
+
+        with mock.patch.object(features, 'check', side_effect=lambda nombre: nombre != 'avif'):
+            with self.assertLogs('core.images', 'WARNING') as logs:
+                soportados = images.formatos_soportados()
+        self.assertEqual(soportados, {'webp', 'jpeg'})
+        self.assertIn('avif', logs.output[0])
+
+        with mock.patch.object(images, 'SOPORTADOS', soportados), \
+                self.settings(IMAGE_DERIVATIVES={'BACKGROUND': False, 'FORMATS': ['avif', 'webp', 'jpeg']}), \
+                self.captureOnCommitCallbacks(execute=True):
+            place = Place.objects.create(name='Cali', short_description='Salsa', photo=self.foto('red'))
+        place.refresh_from_db()
+        self.assertEqual(place.photo_derivatives['formatos'], ['webp', 'jpeg'])
+
+
+class EstaticosTests(CarpetaTemporalMixin, TestCase):
+    def ajustes_carpeta(self):
+        return {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': ['testserver'],
+            'STATIC_ROOT': self.carpeta,
+            'STORAGES': {
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'core.static_assets.CompressedManifestStaticFilesStorage'},
+            },
+            'STATIC_SERVER': {'ENABLED': True},
+        }
+
+    def setUp(self):
+        super().setUp()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_sirve_con_hash_comprimido_y_revalida(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        url = staticfiles_storage.url('core/css/theme.css')
+        self.assertRegex(url, r'/static/core/css/theme\.[0-9a-f]{12}\.css$')
+
+        respuesta = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(respuesta['Content-Encoding'], 'br')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertEqual(respuesta['Vary'], 'Accept-Encoding')
+
+        repetida = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+
+        sin_hash = self.client.get('/static/core/css/theme.css')
+        self.assertNotIn('Content-Encoding', sin_hash)
+        self.assertEqual(sin_hash['Cache-Control'], 'public, max-age=60')
+
+    async def test_sirve_bajo_asgi(self):
+        respuesta = await self.async_client.get('/static/core/css/theme.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual((respuesta.status_code, respuesta['Content-Encoding']), (200, 'gzip'))
+
+
+@override_settings(
+    DATABASE_REPLICAS={'ALIASES': ['replica'], 'MAX_LAG': 5},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ReplicasTests(TransactionTestCase):
+    """Las vistas de solo lectura leen de una réplica salvo justo después de escribir."""
+
+    def setUp(self):
+        # Réplica espejo: otra conexión a la misma base de test (los datos deben estar
+        # confirmados para que los vea, por eso TransactionTestCase)
+        base = connections['default']
+        self.replica = base.__class__(base.settings_dict, 'replica')
+        connections['replica'] = self.replica
+        self.addCleanup(delattr, connections._connections, 'replica')
+        self.addCleanup(self.replica.close)
+
+        self.place = Place.objects.create(name='Cali', short_description='Salsa')
+        self.user = User.objects.create_user('lector', password='x')
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        """``(consultas en la réplica, consultas en default)`` de un GET."""
+        with CaptureQueriesContext(self.replica) as replica, CaptureQueriesContext(connection) as default:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in replica], [q['sql'] for q in default]
+
+    def test_lee_de_la_replica_y_de_default_tras_escribir(self):
+        replica, default = self.get(reverse('places') + '?q=cali')
+        self.assertTrue(any('core_place_fts' in sql for sql in replica))
+        self.assertTrue(any('"core_place"' in sql for sql in replica))
+        self.assertFalse(any('core_place' in sql for sql in default))
+
+        response = self.client.post(reverse('write_review'), {
+            'title': 'Buena', 'place': self.place.pk, 'qualification': 5, 'description': 'Salsa',
+        })
+        self.assertIn('akua_primaria', response.cookies)
+
+        replica, default = self.get(reverse('reviews'))
+        self.assertEqual(replica, [])
+        self.assertTrue(any('core_review' in sql for sql in default))
+
+    def test_las_vistas_sin_marcar_leen_de_default(self):
+        replica, default = self.get(reverse('dashboard'))
+        self.assertEqual(replica, [])
+        self.assertTrue(default)
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': []})
+class CachePaginasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reiniciar_estadisticas()
+        self.cali = Place.objects.create(name='Cali', short_description='Salsa')
+        self.pasto = Place.objects.create(name='Pasto', short_description='Carnaval')
+        self.user = User.objects.create_user('critico', password='x')
+
+    def test_invalida_solo_lo_afectado_por_una_resena(self):
+        detalle_cali = reverse('place_detail', args=['cali'])
+        detalle_pasto = reverse('place_detail', args=['pasto'])
+        for url in (reverse('places'), detalle_cali, detalle_pasto):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        Review.objects.create(title='Buena', description='Salsa', qualification=4, user=self.user, place=self.cali)
+        self.assertEqual(self.client.get(reverse('places'))['X-Cache'], 'MISS')
+        respuesta = self.client.get(detalle_cali)
+        self.assertEqual(respuesta['X-Cache'], 'MISS')
+        self.assertContains(respuesta, '4,00/5.0')
+        self.assertEqual(self.client.get(detalle_pasto)['X-Cache'], 'HIT')
+
+        self.assertEqual(estadisticas()['entradas']['vista:place_detail']['hits'], 3)
+
+    def test_invalidacion_desde_otro_proceso(self):
+        url = reverse('places')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        # Como import_places o generate_synthetic_data: otro proceso, la misma caché
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             "from core.page_cache import invalidar; invalidar('lugares')"],
+            cwd=settings.BASE_DIR, env={**os.environ, 'CACHE_LOCATION': _CACHE['dir']},
+            check=True, capture_output=True,
+        )
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_no_se_activa_con_cache_por_proceso(self):
+        with self.assertLogs('core.page_cache', 'WARNING'), mock.patch('core.page_cache._avisado', False):
+            response = self.client.get(reverse('places'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Cache', response)
+
+    def test_la_clave_depende_de_la_sesion_y_los_parametros(self):
+        self.client.get(reverse('places'))
+        self.assertEqual(self.client.get(reverse('places') + '?q=cali')['X-Cache'], 'MISS')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('places'))['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(reverse('places'))['X-Cache'], 'HIT')
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': []}, PAGE_CACHE={'ENABLED': False})
+class GetCondicionalTests(TestCase):
+    """Una petición repetida sin cambios recibe 304 sin cuerpo ni plantilla."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('repetidor', password='x')
+        cls.places = [
+            Place.objects.create(name=f'Lugar {i}', short_description='Playa y montaña', category='Naturaleza')
+            for i in range(12)
+        ]
+        for place in cls.places:
+            Review.objects.create(title='Bien', description='Bonito', qualification=4, user=cls.user, place=place)
+
+    def test_304_sin_cuerpo_ni_plantilla(self):
+        for url in (reverse('places'), reverse('place_detail', args=['lugar-3']), reverse('reviews')):
+            self.client.get(url)  # reviews deja la cookie CSRF, que entra en su ETag
+            primera = self.client.get(url)
+            self.assertEqual(primera.status_code, 200)
+            repetida = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+            self.assertEqual(repetida.status_code, 304)
+            self.assertEqual(repetida.content, b'')
+            self.assertEqual(repetida.templates, [])
+            self.assertGreater(len(primera.content), 10_000)
+            self.assertIn('private', repetida['Cache-Control'])
+
+    def test_304_por_fecha_y_sin_consultas_de_la_vista(self):
+        url = reverse('place_detail', args=['lugar-3'])
+        primera = self.client.get(url)
+        # Solo la consulta de agregados (sin sesión: ni usuario ni sesión)
+        with self.assertNumQueries(1):
+            repetida = self.client.get(url, HTTP_IF_MODIFIED_SINCE=primera['Last-Modified'])
+        self.assertEqual(repetida.status_code, 304)
+
+    def test_cambios_y_borrados_invalidan_el_etag(self):
+        url = reverse('reviews')
+        etag = self.client.get(url)['ETag']
+        Review.objects.filter(place=self.places[0]).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        detalle = reverse('place_detail', args=['lugar-5'])
+        etag = self.client.get(detalle)['ETag']
+        Review.objects.create(title='Mal', description='Lluvia', qualification=1, user=self.user, place=self.places[5])
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_otro_usuario_no_recibe_la_pagina_del_anterior(self):
+        url = reverse('reviews')
+        self.client.force_login(self.user)
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Mismo navegador, otra sesión: otro usuario y otro token CSRF
+        self.client.logout()
+        self.client.force_login(User.objects.create_user('otro', password='x'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(
+    DATABASE_REPLICAS={'ALIASES': []}, PAGE_CACHE={'ENABLED': False}, PERF={'SERVER_TIMING': True},
+)
+class MedicionTests(TestCase):
+    def setUp(self):
+        vaciar_lentas()
+        Place.objects.create(name='Cali', short_description='Salsa')
+
+    def test_server_timing_con_sql_y_plantillas(self):
+        response = self.client.get(reverse('places'))
+        metricas = dict(parte.split(';', 1) for parte in response['Server-Timing'].split(', '))
+        self.assertEqual(set(metricas), {'total', 'db', 'tpl'})
+        self.assertRegex(metricas['db'], r'^dur=[\d.]+;desc="[1-9]\d* consultas"$')
+        self.assertNotEqual(metricas['tpl'], 'dur=0.0')
+
+    def test_servicios_externos(self):
+        def vista(request):
+            with medir('openai'):
+                with medir('openai'):
+                    time.sleep(0.01)
+            return HttpResponse('ok')
+
+        response = MedicionMiddleware(vista)(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'openai;dur=\d{2,}\.')
+        self.assertNotIn('serpapi', response['Server-Timing'])
+
+    @override_settings(PERF={'SLOW_MS': 0, 'SERVER_TIMING': True}, AI_MODEL={'BACKEND': 'stub', 'STUB_LATENCY': 0.02})
+    async def test_el_stream_del_modelo_se_registra_al_terminar(self):
+        mensajes = [{'role': 'user', 'content': 'Cali'}]
+
+        def vista(request):
+            return StreamingHttpResponse(consultar_modelo_stream(mensajes))
+
+        async def avista(request):
+            return StreamingHttpResponse(aconsultar_modelo_stream(mensajes))
+
+        for middleware in (MedicionMiddleware(vista), MedicionMiddleware(avista)):
+            response = middleware(RequestFactory().get('/'))
+            with self.assertLogs('core.perf', 'WARNING'):
+                if asyncio.iscoroutine(response):
+                    response = await response
+                    contenido = [parte async for parte in response.streaming_content]
+                else:
+                    contenido = await sync_to_async(list)(response.streaming_content)
+            # Las cabeceras salen antes de que hable el modelo
+            self.assertNotIn('openai', response['Server-Timing'])
+            self.assertIn(b'Cali', b''.join(contenido))
+            self.assertGreaterEqual(lentas()[0]['openai_ms'], 20)
+            self.assertEqual(lentas()[0]['openai_llamadas'], 1)
+
+    async def test_server_timing_bajo_asgi(self):
+        response = await self.async_client.get(reverse('places'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* consultas", tpl;dur=')
+
+        async def vista(request):
+            async def llamar():
+                with medir('openai'):
+                    await asyncio.sleep(0.01)
+
+            def buscar():
+                with medir('serpapi'):
+                    time.sleep(0.01)
+
+            await asyncio.gather(asyncio.create_task(llamar()), sync_to_async(buscar)())
+            return HttpResponse('ok')
+
+        response = await MedicionMiddleware(vista)(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'openai;dur=\d{2,}\..*serpapi;dur=\d{2,}\.')
+
+    @override_settings(PERF={'SERVER_TIMING': 'staff'})
+    async def test_server_timing_solo_para_el_staff_bajo_asgi(self):
+        self.assertNotIn('Server-Timing', await self.async_client.get(reverse('places')))
+        admin = await sync_to_async(User.objects.create_user)('admin', password='x', is_staff=True)
+        await self.async_client.aforce_login(admin)
+        self.assertIn('Server-Timing', await self.async_client.get(reverse('places')))
+
+    @override_settings(PERF={'SERVER_TIMING': 'staff'})
+    def test_server_timing_solo_para_el_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('places')))
+        with self.settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('places')))
+
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(reverse('places')))
+
+    @override_settings(PERF={'SLOW_MS': 0, 'SAMPLE_RATE': 0, 'SERVER_TIMING': True})
+    def test_lentas_sin_muestrear_solo_con_total(self):
+        with self.assertLogs('core.perf', 'WARNING'):
+            response = self.client.get(reverse('places'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+        self.assertEqual(lentas()[0]['vista'], 'places')
+        self.assertFalse(lentas()[0]['muestreada'])
+
+    @override_settings(PERF={'SLOW_MS': 0})
+    def test_vista_de_lentas_solo_staff(self):
+        with self.assertLogs('core.perf', 'WARNING'):
+            self.client.get(reverse('places'))
+            self.client.get(reverse('index'))
+        url = reverse('slow_requests')
+        with self.assertLogs('core.perf', 'WARNING'):
+            self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        with self.assertLogs('core.perf', 'WARNING'):
+            peticiones = self.client.get(url, {'vista': 'places'}).json()['peticiones']
+        self.assertEqual(len(peticiones), 1)
+        self.assertGreater(peticiones[0]['consultas'], 0)
+
+
+class DatosSinteticosTests(TestCase):
+    def test_genera_datos_coherentes_y_se_puede_repetir(self):
+        Place.objects.create(name='Playa Blanca', short_description='Arena')
+        for _ in range(2):
+            call_command(
+                'generate_synthetic_data', lugares=30, usuarios=10, resenas=200, rutas=15, stdout=io.StringIO(),
+            )
+
+        self.assertEqual(Place.objects.count(), 61)
+        self.assertEqual(User.objects.filter(username__startswith='sintetico').count(), 20)
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertEqual(Route.objects.count(), 30)
+        # Contadores de rating al día aunque bulk_create no dispara las señales
+        self.assertEqual(sum(Place.objects.values_list('review_count', flat=True)), 400)
+        lugar = Place.objects.exclude(category='').first()
+        self.assertEqual(
+            set(lugar.categories.values_list('name', flat=True)), set(separar_categorias(lugar.category)),
+        )
+        self.assertTrue(buscar_lugares(Place.objects.all(), lugar.name.split()[0]).exists())
+
+
+class CatalogoTests(CarpetaTemporalMixin, TestCase):
+    def importar_csv(self, texto, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return importar(leer_filas(io.StringIO(texto), 'csv'), fotos=f'{self.carpeta}/origen', **kwargs)
+
+    def fotos_locales(self, *colores):
+        from PIL import Image
+
+        os.mkdir(f'{self.carpeta}/origen')
+        for color in colores:
+            Image.new('RGB', (40, 20), color).save(f'{self.carpeta}/origen/{color}.jpg')
+
+    def test_slug_sin_choques_al_guardar(self):
+        Place.objects.create(name='Montería', short_description='Río Sinú')
+        self.assertEqual(Place.objects.create(name='Monteria', short_description='Otra').slug, 'monteria-2')
+
+    def test_importa_valida_y_es_idempotente(self):
+        self.fotos_locales('red')
+        Place.objects.create(name='Montería', short_description='Río Sinú')
+        texto = (
+            'name,short_description,category,estimated_cost,rating_seed,photo\n'
+            'Cali,Salsa,"Cultura, Gastronomía",120000,4.5,red.jpg\n'
+            'Monteria,Ganadería,Naturaleza,,,\n'
+            'Pasto,Carnaval,Cultura,mucho,,\n'
+            ',Sin nombre,,,,\n'
+        )
+        stats = self.importar_csv(texto, lote=2)
+        self.assertEqual((stats['creados'], stats['invalidos']), (2, 2))
+        self.assertTrue(any(e.startswith('línea 4: estimated_cost') for e in stats['errores']))
+
+        cali = Place.objects.get(name='Cali')
+        self.assertEqual(Place.objects.get(name='Monteria').slug, 'monteria-2')
+        self.assertEqual(float(cali.rating_average), 4.5)
+        self.assertEqual(set(cali.categories.values_list('name', flat=True)), {'Cultura', 'Gastronomía'})
+        self.assertTrue(cali.photo.name.startswith('places_photos/') and cali.photo.storage.exists(cali.photo.name))
+
+        stats = self.importar_csv(texto.replace('Pasto,Carnaval,Cultura,mucho', 'Pasto,Carnaval,Cultura,1'), simular=True)
+        self.assertEqual((stats['creados'], stats['sin_cambios']), (1, 2))
+        self.assertFalse(Place.objects.filter(name='Pasto').exists())
+        self.assertEqual(self.importar_csv(texto)['sin_cambios'], 2)
+        self.assertEqual(cali.updated_at, Place.objects.get(pk=cali.pk).updated_at)
+
+    def test_solo_sube_las_fotos_de_las_filas_guardadas(self):
+        self.fotos_locales('red', 'green', 'blue')
+        Place.objects.create(name='Pasto', short_description='Carnaval')
+        texto = (
+            'name,slug,short_description,estimated_cost,photo\n'
+            'Cali,,Salsa,10,red.jpg\n'
+            'Buga,,Basílica,mucho,green.jpg\n'
+            'Pasto,otro-pasto,Nombre repetido,,blue.jpg\n'
+        )
+        self.assertEqual(self.importar_csv(texto, simular=True)['creados'], 1)
+        self.assertFalse(os.path.exists(f'{self.carpeta}/places_photos'))
+
+        stats = self.importar_csv(texto)
+        self.assertEqual((stats['creados'], stats['invalidos']), (1, 2))
+        cali = Place.objects.get(name='Cali')
+        self.assertEqual(os.listdir(f'{self.carpeta}/places_photos'), [os.path.basename(cali.photo.name)])
+
+    def test_actualiza_por_slug_y_recalcula_el_rating(self):
+        cali = Place.objects.create(name='Cali', short_description='Salsa', rating_seed=3)
+        user = User.objects.create_user('critico', password='x')
+        Review.objects.create(title='Bien', description='Salsa', qualification=5, user=user, place=cali)
+        filas = leer_filas(io.StringIO('{"slug": "cali", "rating_seed": "4", "city": "Cali"}\n'), 'jsonl')
+        self.assertEqual(importar(filas)['actualizados'], 1)
+        cali.refresh_from_db()
+        self.assertEqual((cali.city, float(cali.rating_average)), ('Cali', 4.5))
+
+    def test_exportar_e_importar_no_cambia_nada(self):
+        Place.objects.create(name='Cali', short_description='Salsa', category='Cultura', estimated_cost=10)
+        Place.objects.create(name='Pasto', short_description='Carnaval, "negros y blancos"')
+        for formato in FORMATOS:
+            ruta = f'{self.carpeta}/lugares.{formato}'
+            call_command('export_places', ruta, stdout=io.StringIO())
+            salida = io.StringIO()
+            call_command('import_places', ruta, stdout=salida)
+            self.assertIn('0 creados, 0 actualizados, 2 sin cambios', salida.getvalue())
+
+    def test_importar_de_la_entrada_estandar_no_la_cierra(self):
+        entrada = io.StringIO('{"name": "Cali", "short_description": "Salsa"}\n')
+        with mock.patch('sys.stdin', entrada):
+            call_command('import_places', '-', formato='jsonl', stdout=io.StringIO())
+        self.assertFalse(entrada.closed)
+        self.assertTrue(Place.objects.filter(name='Cali').exists())
+
+
+
+class TrabajosDeRutaTests(TestCase):
+    datos = {'ciudad': 'Buenaventura', 'pais': 'Colombia', 'presupuesto': '100', 'dias': '2'}
+
+    def test_el_runner_de_hilos_retoma_lo_abandonado_al_arrancar(self):
+        user = User.objects.create_user('viajero', password='x')
+        hace_rato = timezone.now() - timedelta(hours=1)
+        abandonado = RouteJob.objects.create(user=user, params={}, status='running', started_at=hace_rato)
+        en_curso = RouteJob.objects.create(user=user, params={}, status='running', started_at=timezone.now())
+        pendiente = RouteJob.objects.create(user=user, params={})
+
+        ejecutados = []
+        with mock.patch.object(jobs, '_executor', None), mock.patch.object(jobs, 'ejecutar', ejecutados.append):
+            with self.assertLogs('core.jobs', 'WARNING'):
+                executor = jobs._get_executor()
+            executor.shutdown(wait=True)
+        self.assertCountEqual(ejecutados, [abandonado.pk, pendiente.pk])
+        en_curso.refresh_from_db()
+        self.assertEqual(en_curso.status, 'running')
+
+    @override_settings(ROUTE_JOBS={'WORKERS': 3})
+    def test_el_worker_usa_los_workers_de_la_configuracion(self):
+        with mock.patch('core.management.commands.run_route_worker.ThreadPoolExecutor') as pool:
+            call_command('run_route_worker', once=True, stdout=io.StringIO())
+        pool.assert_called_once_with(max_workers=3)
+
+    def test_el_worker_avisa_si_la_cache_de_rutas_no_es_compartida(self):
+        from .checks import cache_de_rutas_compartida
+
+        with self.settings(ROUTE_JOBS={'RUNNER': 'worker'}, AI_CACHES={'rutas': {'BACKEND': 'memory'}}):
+            self.assertEqual([w.id for w in cache_de_rutas_compartida(None)], ['core.W001'])
+        with self.settings(ROUTE_JOBS={'RUNNER': 'worker'}, AI_CACHES={'rutas': {'BACKEND': 'database'}}):
+            self.assertEqual(cache_de_rutas_compartida(None), [])
+        with self.settings(ROUTE_JOBS={'RUNNER': 'thread'}, AI_CACHES={}):
+            self.assertEqual(cache_de_rutas_compartida(None), [])
+
+    def test_bajo_wsgi_el_formulario_usa_el_trabajo(self):
+        self.client.force_login(User.objects.create_user('viajero', password='x'))
+        self.assertContains(self.client.get(reverse('donde_ir')), 'const STREAMING = false')
+
+        response = self.client.post(reverse('generar_ruta_ai_stream'), self.datos)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(RouteJob.objects.filter(pk=response.json()['job_id']).exists())
+
+    async def entrar(self):
+        user = await sync_to_async(User.objects.create_user)('viajero', password='x')
+        await self.async_client.aforce_login(user)
+        return user
+
+    @override_settings(AI_CACHES={'rutas': {'BACKEND': 'memory'}})
+    async def test_bajo_asgi_la_ruta_en_cache_se_guarda_sin_trabajo(self):
+        from .itinerary import clave_ruta, leer_parametros
+
+        user = await self.entrar()
+        params = leer_parametros(RequestFactory().post('/', self.datos).POST)
+        await sync_to_async(get_cache('rutas').set)(clave_ruta(params), 'Ruta guardada')
+        self.addCleanup(get_cache('rutas').clear)
+
+        response = await self.async_client.post(reverse('generar_ruta_ai'), self.datos)
+        self.assertEqual(response.json(), {'respuesta': 'Ruta guardada', 'cache': True})
+        ruta = await Route.objects.aget(user=user)
+        self.assertEqual((ruta.city, ruta.days, ruta.ai_response), ('Buenaventura', 2, 'Ruta guardada'))
+        self.assertFalse(await RouteJob.objects.aexists())
+
+    @override_settings(AI_CACHES={'rutas': {'BACKEND': 'memory'}})
+    async def test_bajo_asgi_sin_cache_responde_202_con_el_trabajo(self):
+        user = await self.entrar()
+        response = await self.async_client.post(reverse('generar_ruta_ai'), self.datos)
+        self.assertEqual(response.status_code, 202)
+        job = await RouteJob.objects.aget(pk=response.json()['job_id'])
+        self.assertEqual((job.user_id, job.status, job.params['ciudad']), (user.pk, 'pending', 'Buenaventura'))
+        self.assertEqual(response.json()['estado_url'], reverse('route_job_status', args=[job.pk]))
+        self.assertFalse(await Route.objects.aexists())
+
+    @override_settings(
+        AI_CACHES={'rutas': {'BACKEND': 'memory'}}, AI_MODEL={'BACKEND': 'stub'},
+        WEB_SEARCH={'BACKEND': 'stub'}, AI_EMBEDDINGS={'BACKEND': 'local'},
+    )
+    async def test_bajo_asgi_el_formulario_usa_el_stream(self):
+        user = await self.entrar()
+        self.addCleanup(get_cache('rutas').clear)
+        self.assertContains(await self.async_client.get(reverse('donde_ir')), 'const STREAMING = true')
+
+        response = await self.async_client.post(reverse('generar_ruta_ai_stream'), self.datos)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        eventos = b''.join([parte async for parte in response.streaming_content]).decode()
+        nombres = re.findall(r'^event: (\w+)$', eventos, re.M)
+        self.assertEqual((nombres[0], nombres[-1]), ('inicio', 'fin'))
+        self.assertIn('texto', nombres)
+        ruta = await Route.objects.aget(user=user)
+        self.assertIn('Ruta de prueba', ruta.ai_response)
+        self.assertFalse(await RouteJob.objects.aexists())
+
+    async def test_el_stream_registra_el_error_y_lo_envia_como_evento(self):
+        from .views import _aeventos_ruta
+
+        with mock.patch('core.views.agenerar_itinerario_stream', side_effect=RuntimeError('sin modelo')):
+            with self.assertLogs('core.views', 'ERROR') as logs:
+                eventos = [evento async for evento in _aeventos_ruta(None, {})]
+        self.assertIn('Traceback', logs.output[0])
+        self.assertTrue(eventos[-1].startswith('event: error'))
+        self.assertIn('sin modelo', eventos[-1])
+
+
+@override_settings(
+    WEB_SEARCH={'BACKEND': 'stub', 'FRESH_TTL': 3600, 'EMPTY_TTL': 60},
+    AI_CACHES={'busquedas': {'BACKEND': 'memory'}},
+)
+class BusquedaWebTests(TestCase):
+    """Caché stale-while-revalidate de los resúmenes de SerpAPI."""
+
+    params = {'ciudad': 'Cali', 'pais': 'Colombia', 'evento': '', 'intereses': ['Salsa']}
+
+    def setUp(self):
+        get_cache('busquedas').clear()
+
+    def resultados(self, titulo):
+        return {'organic_results': [{'title': titulo, 'snippet': '', 'link': ''}]}
+
+    def buscar(self, *respuestas):
+        """``resumen_web`` con el backend respondiendo ``respuestas``; espera los refrescos en segundo plano."""
+        refrescos, original = [], web_search._refrescar_una_vez
+
+        def refrescar(key, params):
+            refrescos.append(original(key, params))
+            return refrescos[-1]
+
+        backend = mock.Mock(search=mock.Mock(side_effect=respuestas))
+        with mock.patch.object(web_search, 'get_backend', return_value=backend), \
+                mock.patch.object(web_search, '_refrescar_una_vez', refrescar):
+            resumen = web_search.resumen_web(self.params)
+            for futuro in refrescos:
+                futuro.exception()
+        return resumen, backend.search.call_count
+
+    def entrada(self):
+        return get_cache('busquedas').get(web_search.clave_busqueda(self.params), contar=False)
+
+    def test_copia_vieja_se_sirve_y_se_refresca(self):
+        self.assertIn('Primera', self.buscar(self.resultados('Primera'))[0])
+        self.assertEqual(self.buscar()[1], 0)
+
+        entrada = self.entrada()
+        get_cache('busquedas').set(web_search.clave_busqueda(self.params), {**entrada, 'fresh_until': 0})
+        resumen, llamadas = self.buscar(self.resultados('Segunda'))
+        self.assertIn('Primera', resumen)
+        self.assertEqual(llamadas, 1)
+        self.assertIn('Segunda', self.entrada()['resumen'])
+        self.assertGreater(self.entrada()['fresh_until'], time.time() + 3000)
+
+    def test_vacios_y_errores_no_quedan_frescos(self):
+        self.assertEqual(self.buscar({})[0], '')
+        self.assertLess(self.entrada()['fresh_until'], time.time() + 61)
+
+        get_cache('busquedas').clear()
+        with self.assertLogs('core.web_search', 'WARNING'):
+            self.assertEqual(self.buscar({'error': 'Límite de búsquedas alcanzado'})[0], '')
+        self.assertIsNone(self.entrada())
+
+    def test_prewarm_llena_la_cache_por_ciudad(self):
+        for i, ciudad in enumerate(('Cali', 'Pasto', 'Cali')):
+            Place.objects.create(name=f'Lugar {i}', short_description='-', city=ciudad)
+        salida = io.StringIO()
+        call_command('prewarm_search_cache', intereses='Salsa', stdout=salida)
+        self.assertIn('Búsquedas precargadas: 2 (fallidas: 0)', salida.getvalue())
+        self.assertIn('Resultado 1', self.entrada()['resumen'])
+        self.assertEqual(self.buscar()[1], 0)
+
+
+class RatingsTests(TestCase):
+    """Los contadores incrementales coinciden en cada paso con ``rebuild_place_ratings``."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('critico', password='x')
+        self.cali = Place.objects.create(name='Cali', short_description='Salsa', rating_seed=3)
+        self.pasto = Place.objects.create(name='Pasto', short_description='Carnaval')
+
+    def ratings(self):
+        return {
+            p.name: (p.review_count, p.rating_sum, float(p.rating_average))
+            for p in Place.objects.order_by('name')
+        }
+
+    def assertRatings(self, esperados):
+        incrementales = self.ratings()
+        self.assertEqual(incrementales, esperados)
+        call_command('rebuild_place_ratings', stdout=io.StringIO())
+        self.assertEqual(self.ratings(), incrementales)
+
+    def resena(self, place, calificacion):
+        return Review.objects.create(title='-', description='-', qualification=calificacion, user=self.user, place=place)
+
+    def test_crear_editar_mover_y_borrar(self):
+        self.resena(self.cali, 5)
+        self.assertRatings({'Cali': (1, 5, 4.0), 'Pasto': (0, 0, 0.0)})
+
+        mala = self.resena(self.cali, 4)
+        mala.qualification = 1
+        mala.save()
+        self.assertRatings({'Cali': (2, 6, 3.0), 'Pasto': (0, 0, 0.0)})
+
+        # Desde la BD (sin el valor original en memoria) y moviéndola de lugar
+        mala = Review.objects.get(pk=mala.pk)
+        mala.place = self.pasto
+        mala.save()
+        self.assertRatings({'Cali': (1, 5, 4.0), 'Pasto': (1, 1, 1.0)})
+
+        mala.delete()
+        self.assertRatings({'Cali': (1, 5, 4.0), 'Pasto': (0, 0, 0.0)})
+        Review.objects.get(place=self.cali).delete()
+        # Sin reseñas queda el rating inicial
+        self.assertRatings({'Cali': (0, 0, 3.0), 'Pasto': (0, 0, 0.0)})
+
+
+class DedupeMediaTests(CarpetaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(f'{self.carpeta}/places_photos')
+        for nombre, contenido in (('cali.jpg', b'foto'), ('cali_kzRDbIm.jpg', b'foto'), ('pasto.jpg', b'otra')):
+            with open(f'{self.carpeta}/places_photos/{nombre}', 'wb') as f:
+                f.write(contenido)
+        self.cali = Place.objects.create(name='Cali', short_description='Salsa', photo='places_photos/cali.jpg')
+        self.copia = Place.objects.create(name='Cali 2', short_description='Salsa', photo='places_photos/cali_kzRDbIm.jpg')
+
+    def dedupe(self, *args):
+        salida = io.StringIO()
+        with mock.patch('core.management.commands.dedupe_media.programar') as programar:
+            call_command('dedupe_media', *args, stdout=salida)
+        self.copia.refresh_from_db()
+        return salida.getvalue(), programar
+
+    def existe(self, nombre):
+        return os.path.exists(f'{self.carpeta}/places_photos/{nombre}')
+
+    def test_simulacion_no_cambia_nada(self):
+        salida, _ = self.dedupe()
+        self.assertIn('places_photos/cali.jpg (4 bytes) ← places_photos/cali_kzRDbIm.jpg', salida)
+        self.assertIn('simulación', salida)
+        self.assertEqual(self.copia.photo.name, 'places_photos/cali_kzRDbIm.jpg')
+        self.assertTrue(self.existe('cali_kzRDbIm.jpg'))
+
+    def test_reapunta_borra_y_programa_derivados(self):
+        salida, programar = self.dedupe('--aplicar')
+        self.assertIn('1 registros reapuntados, 1 archivos borrados', salida)
+        self.assertEqual(self.copia.photo.name, 'places_photos/cali.jpg')
+        self.assertFalse(self.existe('cali_kzRDbIm.jpg'))
+        self.assertTrue(self.existe('pasto.jpg'))
+        # Ningún registro de cali.jpg tenía derivados: hay que generarlos
+        self.assertEqual([c.args[0].pk for c in programar.call_args_list], [self.copia.pk])
+
+    def test_no_borra_lo_que_sigue_referenciado(self):
+        with mock.patch('core.management.commands.dedupe_media.Command._reapuntar', return_value=0):
+            salida, _ = self.dedupe('--aplicar')
+        self.assertIn('0 archivos borrados', salida)
+        self.assertTrue(self.existe('cali_kzRDbIm.jpg'))
+
+
+class PerfilSqliteTests(SimpleTestCase):
+    # Conexiones propias sobre un archivo temporal (el alias 'readonly' puede existir también en settings)
+    databases = '__all__'
+
+    def test_wal_y_alias_de_solo_lectura(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        conexiones = ConnectionHandler(bases_sqlite(os.path.join(carpeta, 'db.sqlite3'), {'ENABLED': True}))
+        self.addCleanup(conexiones.close_all)
+
+        with conexiones['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('CREATE TABLE lugar (nombre TEXT)')
+            cursor.execute("INSERT INTO lugar VALUES ('Cali')")
+
+        with conexiones[LECTURA].cursor() as cursor:
+            cursor.execute('SELECT nombre FROM lugar')
+            self.assertEqual(cursor.fetchall(), [('Cali',)])
+            with self.assertRaisesMessage(OperationalError, 'readonly'):
+                cursor.execute("INSERT INTO lugar VALUES ('Pasto')")
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': []}, PAGE_CACHE={'ENABLED': False})
+class FiltroCategoriasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Place.objects.create(name='Cali', short_description='Salsa', category='Cultura / Gastronomía')
+        Place.objects.create(name='Pasto', short_description='Carnaval', category='Cultura')
+
+    def test_filtro_sin_distinguir_mayusculas_ni_tildes(self):
+        response = self.client.get(reverse('places'), {'category': ['cultura', 'GASTRONOMIA', 'Cultura']})
+        self.assertEqual([p.name for p in response.context['places']], ['Cali'])
+        self.assertEqual(response.context['selected_category'], ['Cultura', 'Gastronomía'])
+        self.assertIn(('Gastronomía', True), response.context['categories'])
+
+        response = self.client.get(reverse('places'), {'category': 'cultura,inexistente'})
+        self.assertEqual(list(response.context['places']), [])
+
+
+class BusquedaLugaresTests(TestCase):
+    def buscar(self, texto):
+        return list(buscar_lugares(Place.objects.all(), texto).values_list('name', flat=True))
+
+    def test_sin_tildes_ni_mayusculas_y_por_prefijo(self):
+        Place.objects.create(name='Montería', short_description='Río Sinú', city='Montería')
+        Place.objects.create(name='Cali', short_description='Salsa')
+        for texto in ('monteria', 'MONTERÍA', 'monte', 'rio sinu'):
+            self.assertEqual(self.buscar(texto), ['Montería'], texto)
+
+    def test_ordena_por_relevancia_y_respeta_el_tope(self):
+        Place.objects.create(name='Mirador del Cañón', short_description='Vista')
+        Place.objects.create(name='Cascada', short_description='Sendero al mirador')
+        Place.objects.create(name='Laguna', short_description='Mirador y mirador del páramo')
+        self.assertEqual(self.buscar('mirador')[0], 'Mirador del Cañón')
+        self.assertEqual(len(self.buscar('mirador')), 3)
+        with mock.patch('core.place_search.MAX_RESULTADOS', 1):
+            self.assertEqual(self.buscar('mirador'), ['Mirador del Cañón'])
+
+    def test_triggers_al_actualizar_y_borrar(self):
+        lugar = Place.objects.create(name='Cali', short_description='Salsa')
+        lugar.short_description = 'Pacífico'
+        lugar.save()
+        self.assertEqual(self.buscar('salsa'), [])
+        self.assertEqual(self.buscar('pacifico'), ['Cali'])
+
+        Place.objects.filter(pk=lugar.pk).update(city='Santiago')
+        self.assertEqual(self.buscar('santiago'), ['Cali'])
+
+        lugar.delete()
+        self.assertEqual(self.buscar('pacifico'), [])
+
+
+class CacheIATests(TestCase):
+    """Los tres almacenes de core/ai_cache.py con TTL, LRU y contadores."""
+
+    def cache(self, backend, ttl=60, max_entries=2):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        return ResultCache('pruebas', BACKENDS[backend]('pruebas', location=carpeta), ttl, max_entries)
+
+    def test_lru_en_cada_backend(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                cache = self.cache(backend)
+                cache.set('a', {'ruta': [1]})
+                time.sleep(0.01)
+                cache.set('b', 'dos')
+                time.sleep(0.01)
+                self.assertEqual(cache.get('a'), {'ruta': [1]})
+                time.sleep(0.01)
+                cache.set('c', 'tres')
+
+                self.assertIsNone(cache.get('b'))
+                self.assertEqual(cache.get('c'), 'tres')
+                self.assertEqual(cache.stats()['size'], 2)
+                self.assertEqual(cache.evictions, 1)
+                cache.clear()
+                self.assertEqual(cache.backend.count(), 0)
+
+    def test_contadores_y_expiracion(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                cache = self.cache(backend)
+                self.assertIsNone(cache.get('a'))
+                cache.set('a', 1)
+                self.assertEqual(cache.get('a'), 1)
+                self.assertEqual(cache.get('a', contar=False), 1)
+                self.assertEqual((cache.hits, cache.misses), (1, 1))
+                self.assertEqual(cache.stats()['hit_ratio'], 0.5)
+
+                vencida = self.cache(backend, ttl=-1)
+                vencida.set('a', 1)
+                self.assertIsNone(vencida.get('a'))
+                self.assertEqual((vencida.expirations, vencida.misses, vencida.backend.count()), (1, 1, 0))
+
+    def test_base_de_datos_guarda_con_un_upsert(self):
+        backend = self.cache('database').backend
+        backend.set('a', 1, time.time() + 60)
+        # Sin SELECT previo: no hay hueco entre comprobar y escribir
+        with self.assertNumQueries(1):
+            backend.set('a', {'ruta': 2}, time.time() + 60)
+        self.assertEqual(backend.get('a')[0], {'ruta': 2})
+        self.assertEqual(backend.count(), 1)
+
+    def test_archivos_ignora_entradas_borradas_al_expulsar(self):
+        cache = self.cache('file')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        listadas = cache.backend._entries()
+        cache.delete('a')
+        with mock.patch.object(cache.backend, '_entries', return_value=listadas):
+            self.assertEqual(cache.backend.evict(2), 1)
+        self.assertEqual(cache.backend.count(), 0)
+
+
+# Django solo registra la adaptación con DEBUG
+@override_settings(DEBUG=True)
+class MiddlewareAsgiTests(SimpleTestCase):
+    """Bajo ASGI ningún middleware propio debe obligar a Django a pasar las vistas a un hilo."""
+
+    def adaptados(self):
+        registro = logging.getLogger('django.request')
+        with self.assertLogs(registro, 'DEBUG') as logs:
+            registro.debug('cargando middleware')
+            ASGIHandler()
+        return [linea for linea in logs.output if 'adapted' in linea]
+
+    @override_settings(STATIC_SERVER={'ENABLED': True}, STATIC_ROOT=settings.BASE_DIR / 'staticfiles')
+    def test_ningun_middleware_adapta_el_handler(self):
+        self.assertEqual(self.adaptados(), [])
+
+
+class SingleFlightTests(TestCase):
+    """Una sola llamada por clave aunque la pidan muchos a la vez; los errores llegan a todos."""
+
+    def test_hilos_comparten_una_llamada(self):
+        vuelos, llamadas, listo = SingleFlight(), [], threading.Event()
+
+        def lenta():
+            llamadas.append(1)
+            listo.wait(5)
+            return 'ruta'
+
+        with ThreadPoolExecutor(8) as pool:
+            futuros = [pool.submit(vuelos.do, 'k', lenta) for _ in range(8)]
+            time.sleep(0.2)  # que los 8 hayan llegado a la llamada en curso
+            listo.set()
+            resultados = [f.result() for f in futuros]
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(sorted(resultados), [('ruta', False)] + [('ruta', True)] * 7)
+
+    def test_corrutinas_comparten_la_llamada_y_el_error(self):
+        vuelos, llamadas = SingleFlight(), []
+
+        async def lenta(error=None):
+            llamadas.append(1)
+            await asyncio.sleep(0.01)
+            if error:
+                raise error
+            return 'ruta'
+
+        async def varias(n, error=None):
+            return await asyncio.gather(
+                *[vuelos.ado('k', lambda: lenta(error)) for _ in range(n)], return_exceptions=True,
+            )
+
+        self.assertEqual(asyncio.run(varias(5)), [('ruta', False)] + [('ruta', True)] * 4)
+        error = ValueError('SerpAPI caído')
+        self.assertEqual(asyncio.run(varias(5, error)), [error] * 5)
+        self.assertEqual(len(llamadas), 2)
+        # Tras el error la clave queda libre
+        self.assertEqual(asyncio.run(varias(1)), [('ruta', False)])
+
+    def test_el_candado_se_libera_si_falla(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        for tipo in LOCKS:
+            with self.subTest(tipo), override_settings(
+                SINGLE_FLIGHT={'CROSS_PROCESS': tipo, 'LOCK_TIMEOUT': 1, 'LOCATION': carpeta},
+            ):
+                with self.assertRaises(ValueError), candado_entre_procesos('k'):
+                    raise ValueError
+                otro = LOCKS[tipo]('k', 0, location=carpeta)
+                self.assertTrue(otro.acquire())
+                otro.release()
+        self.assertFalse(SingleFlightLock.objects.exists())
+
+    def test_el_candado_asincrono_cierra_las_conexiones_de_sus_hilos(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        hilos = []
+
+        async def usar():
+            async with acandado_entre_procesos('k') as coordinado:
+                return coordinado
+
+        def cerrar():
+            hilos.append(threading.get_ident())
+
+        with override_settings(SINGLE_FLIGHT={'CROSS_PROCESS': 'file', 'LOCK_TIMEOUT': 1, 'LOCATION': carpeta}), \
+                mock.patch('core.singleflight.close_old_connections', side_effect=cerrar):
+            self.assertTrue(asyncio.run(usar()))
+        # Una vez al tomarlo y otra al soltarlo, en hilos del pool
+        self.assertEqual(len(hilos), 2)
+        self.assertNotIn(threading.get_ident(), hilos)
+
+    def test_sqlite_ocupada_cuenta_como_candado_tomado(self):
+        candado = DatabaseLock('k', 5)
+        crear = SingleFlightLock.objects.create
+        fallos = iter([OperationalError('database is locked')] * 2)
+
+        def create(**campos):
+            error = next(fallos, None)
+            if error:
+                raise error
+            return crear(**campos)
+
+        with mock.patch.object(SingleFlightLock.objects, 'create', side_effect=create):
+            self.assertTrue(candado.acquire())
+        self.assertEqual(SingleFlightLock.objects.get().owner, candado.owner)
+        candado.release()
+        self.assertFalse(SingleFlightLock.objects.exists())
@@ -11,12 +11,20 @@ urlpatterns = [
     path('donde-ir/', views.donde_ir, name='donde_ir'),
     path('profile/', views.profile, name='profile'),
     path('reviews/', views.reviews, name='reviews'),
+    path('reviews/more/', views.reviews_fragment, name='reviews_fragment'),
     path('reviews/write/', views.write_review, name='write_review'),
     path('reviews/<int:pk>/edit/', views.edit_review, name='edit_review'),
     path('reviews/<int:pk>/delete/', views.delete_review, name='delete_review'),
     path('users/<str:username>/', views.public_profile, name='public_profile'),
     path("generar_ruta_ai/", views.generar_ruta_ai, name="generar_ruta_ai"),
+    path("generar_ruta_ai/stream/", views.generar_ruta_ai_stream, name="generar_ruta_ai_stream"),
+    path("generar_ruta_ai/cache/", views.ai_cache_stats, name="ai_cache_stats"),
+    path("cache/paginas/", views.page_cache_stats, name="page_cache_stats"),
+    path("perf/lentas/", views.slow_requests, name="slow_requests"),
+    path("generar_ruta_ai/jobs/<uuid:job_id>/", views.route_job_status, name="route_job_status"),
     path('places/', views.places, name='places'),
     path('places/<slug:slug>/', views.place_detail, name='place_detail'),
+    path('trip-items/similar/', views.trip_items_search, name='trip_items_search'),
+    path('trip-items/<int:pk>/similar/', views.trip_item_similar, name='trip_item_similar'),
 ]
 
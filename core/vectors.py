@@ -0,0 +1,462 @@
+"""
+Índice vectorial en memoria para los embeddings de ``TripItem``.
+
+Los embeddings se guardan en ``TripItem.embedding`` como float32 little-endian
+(4 bytes por dimensión, sin pickle). El índice carga todos en una sola matriz
+NumPy contigua con las filas normalizadas, de modo que la similitud coseno de
+un lote de consultas es un único producto de matrices. Junto a cada fila se
+guardan ``place_type``, ciudad y costo estimado para filtrar con máscaras.
+
+Configuración en ``settings.VECTOR_INDEX``::
+
+    VECTOR_INDEX = {'BACKEND': 'exact', 'LOCATION': BASE_DIR / 'cache' / 'vectors'}
+
+Con ``LOCATION`` el índice se guarda en disco (``.npy``) y cada proceso lo abre
+con ``mmap``: se comparte la memoria entre workers y se reconstruye una sola
+vez cuando cambian los datos. Sin ``LOCATION`` cada proceso lo construye en RAM.
+``BACKEND = 'ivf'`` usa el índice aproximado de ``core/ann.py`` para catálogos grandes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .ai_cache import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+DTYPE = np.dtype('<f4')
+DEFAULTS = {
+    'BACKEND': 'exact',
+    'LOCATION': None,
+    'NLIST': None,          # listas del IVF; None = 4·√n
+    'NPROBE': 8,            # listas que se revisan por consulta
+    'SYNC_INTERVAL': 5,     # segundos entre sincronizaciones incrementales del IVF
+    'REBUILD_RATIO': 0.2,   # el IVF se reentrena si lo añadido supera esta fracción
+}
+
+
+def codificar_vector(vector):
+    """Lista de floats → bytes float32."""
+    return np.asarray(vector, dtype=DTYPE).tobytes()
+
+
+def decodificar_vector(datos):
+    """Bytes float32 → vector NumPy (vista de solo lectura, sin copia)."""
+    return np.frombuffer(datos, dtype=DTYPE)
+
+
+def normalizar_filas(matriz):
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return matriz / normas
+
+
+def top_k(puntajes, k):
+    """Posiciones de los ``k`` mayores puntajes de cada fila, de mayor a menor."""
+    k = min(k, puntajes.shape[1])
+    if k <= 0:
+        return np.empty((puntajes.shape[0], 0), dtype=np.int64)
+    mejores = np.argpartition(-puntajes, k - 1, axis=1)[:, :k]
+    orden = np.argsort(-np.take_along_axis(puntajes, mejores, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(mejores, orden, axis=1)
+
+
+def guardar_npy(carpeta, nombre, arreglo):
+    """Escribe y renombra: quien tenga abierto el archivo anterior con mmap no se ve afectado."""
+    temporal = os.path.join(carpeta, f'{nombre}.{os.getpid()}.tmp')
+    with open(temporal, 'wb') as f:
+        np.save(f, arreglo)
+    os.replace(temporal, os.path.join(carpeta, nombre))
+
+
+def guardar_json(carpeta, nombre, datos):
+    temporal = os.path.join(carpeta, f'{nombre}.{os.getpid()}.tmp')
+    with open(temporal, 'w') as f:
+        json.dump(datos, f)
+    os.replace(temporal, os.path.join(carpeta, nombre))
+
+
+# ============================================
+# ATRIBUTOS PARA FILTRAR
+# ============================================
+
+class Vocabulario:
+    """Textos ↔ códigos enteros; ``-1`` es el texto vacío."""
+
+    def __init__(self, valores=()):
+        self.valores = list(valores)
+        self._codigos = {v: i for i, v in enumerate(self.valores)}
+
+    def codigo(self, valor, crear=True):
+        if not valor:
+            return -1
+        if valor not in self._codigos:
+            if not crear:
+                return None
+            self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return self._codigos[valor]
+
+
+class Atributos:
+    """
+    ``place_type``, ciudad y costo de cada fila, alineados con la matriz.
+    Los textos se guardan como códigos y el costo como float32 (NaN = sin
+    costo; esas filas no pasan el filtro ``max_cost``).
+    """
+
+    CAMPOS = ('tipos', 'ciudades', 'costos')
+
+    def __init__(self, tipos, ciudades, costos, vocab_tipos=None, vocab_ciudades=None):
+        self.tipos = tipos
+        self.ciudades = ciudades
+        self.costos = costos
+        self.vocab_tipos = vocab_tipos or Vocabulario()
+        self.vocab_ciudades = vocab_ciudades or Vocabulario()
+
+    @classmethod
+    def vacios(cls, n=0):
+        return cls(np.full(n, -1, np.int32), np.full(n, -1, np.int32), np.full(n, np.nan, np.float32))
+
+    def codificar(self, tipos, ciudades, costos):
+        """Atributos de un lote de filas nuevas con el mismo vocabulario (se amplía si hace falta)."""
+        return Atributos(
+            np.array([self.vocab_tipos.codigo(t) for t in tipos], dtype=np.int32),
+            np.array([self.vocab_ciudades.codigo(normalizar_texto(c)) for c in ciudades], dtype=np.int32),
+            np.array([np.nan if c is None else float(c) for c in costos], dtype=np.float32),
+            self.vocab_tipos, self.vocab_ciudades,
+        )
+
+    def tomar(self, posiciones):
+        return Atributos(
+            self.tipos[posiciones], self.ciudades[posiciones], self.costos[posiciones],
+            self.vocab_tipos, self.vocab_ciudades,
+        )
+
+    def unir(self, otros):
+        """Concatena filas con el mismo vocabulario."""
+        return Atributos(
+            *(np.concatenate([getattr(self, c), getattr(otros, c)]) for c in self.CAMPOS),
+            self.vocab_tipos, self.vocab_ciudades,
+        )
+
+    def mascara(self, filtros, posiciones=None):
+        """Filas que cumplen ``filtros`` (``place_type``, ``city``, ``max_cost``); ``None`` si no hay filtros."""
+        if not filtros:
+            return None
+
+        def col(arreglo):
+            return arreglo if posiciones is None else arreglo[posiciones]
+
+        n = len(self.tipos) if posiciones is None else len(posiciones)
+        mascara = np.ones(n, dtype=bool)
+        if filtros.get('place_type'):
+            codigo = self.vocab_tipos.codigo(filtros['place_type'], crear=False)
+            mascara &= col(self.tipos) == (-2 if codigo is None else codigo)
+        if filtros.get('city'):
+            codigo = self.vocab_ciudades.codigo(normalizar_texto(filtros['city']), crear=False)
+            mascara &= col(self.ciudades) == (-2 if codigo is None else codigo)
+        if filtros.get('max_cost') is not None:
+            mascara &= col(self.costos) <= float(filtros['max_cost'])
+        return mascara
+
+    def guardar(self, carpeta, prefijo=''):
+        for campo in self.CAMPOS:
+            guardar_npy(carpeta, f'{prefijo}{campo}.npy', getattr(self, campo))
+        guardar_json(carpeta, f'{prefijo}vocab.json', {
+            'tipos': self.vocab_tipos.valores, 'ciudades': self.vocab_ciudades.valores,
+        })
+
+    @classmethod
+    def cargar(cls, carpeta, prefijo=''):
+        with open(os.path.join(carpeta, f'{prefijo}vocab.json')) as f:
+            vocab = json.load(f)
+        return cls(
+            *(np.load(os.path.join(carpeta, f'{prefijo}{campo}.npy')) for campo in cls.CAMPOS),
+            Vocabulario(vocab['tipos']), Vocabulario(vocab['ciudades']),
+        )
+
+
+def contar_filas():
+    """Cuántos ``TripItem`` tienen embedding (lo que debería tener el índice)."""
+    from .models import TripItem
+
+    return TripItem.objects.exclude(embedding=None).count()
+
+
+def ids_con_embedding():
+    from .models import TripItem
+
+    pks = TripItem.objects.exclude(embedding=None).values_list('pk', flat=True)
+    return np.fromiter(pks.iterator(chunk_size=10000), dtype=np.int64)
+
+
+def leer_filas(desde=None):
+    """
+    Lee los embeddings de ``TripItem`` (solo los modificados después de ``desde`` si se da)
+    en una sola pasada sin instanciar modelos. Devuelve
+    ``(ids, matriz, tipos, ciudades, costos, ultima_modificacion)``.
+    """
+    from .models import TripItem
+
+    filas = TripItem.objects.exclude(embedding=None).order_by('pk')
+    if desde is not None:
+        filas = filas.filter(updated_at__gt=desde)
+    ids, crudos, tipos, ciudades, costos = [], [], [], [], []
+    dimension = ultima = None
+    campos = ('pk', 'embedding', 'place_type', 'city', 'estimated_cost', 'updated_at')
+    for pk, datos, tipo, ciudad, costo, modificado in filas.values_list(*campos).iterator(chunk_size=2000):
+        datos = bytes(datos)
+        if dimension is None:
+            dimension = len(datos) // DTYPE.itemsize
+        if not datos or len(datos) != dimension * DTYPE.itemsize:
+            logger.warning('Embedding de TripItem %s con dimensión distinta; se omite', pk)
+            continue
+        ids.append(pk)
+        crudos.append(datos)
+        tipos.append(tipo)
+        ciudades.append(ciudad)
+        costos.append(costo)
+        ultima = modificado if ultima is None else max(ultima, modificado)
+    matriz = np.frombuffer(b''.join(crudos), dtype=DTYPE).reshape(len(ids), dimension or 0)
+    return np.asarray(ids, dtype=np.int64), matriz, tipos, ciudades, costos, ultima
+
+
+# ============================================
+# ÍNDICE EXACTO
+# ============================================
+
+class IndiceVectorial:
+    """Matriz ``(n, d)`` de vectores unitarios y los ids de ``TripItem`` ordenados."""
+
+    def __init__(self, ids, matriz, atributos=None):
+        self.ids = ids
+        self.matriz = matriz
+        self.atributos = atributos if atributos is not None else Atributos.vacios(len(ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1] if self.matriz.ndim == 2 else 0
+
+    @classmethod
+    def desde_vectores(cls, ids, vectores, tipos=None, ciudades=None, costos=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return cls(ids, np.empty((0, 0), dtype=np.float32))
+        matriz = np.asarray(vectores, dtype=np.float32).reshape(len(ids), -1)
+        orden = np.argsort(ids, kind='stable')
+        atributos = None
+        if tipos is not None:
+            atributos = Atributos.vacios().codificar(tipos, ciudades, costos).tomar(orden)
+        return cls(ids[orden], np.ascontiguousarray(normalizar_filas(matriz[orden]), dtype=np.float32), atributos)
+
+    @classmethod
+    def desde_bd(cls):
+        ids, matriz, tipos, ciudades, costos, _ = leer_filas()
+        return cls.desde_vectores(ids, matriz, tipos, ciudades, costos)
+
+    def guardar(self, carpeta):
+        """meta.json va al final; su presencia marca un índice completo."""
+        os.makedirs(carpeta, exist_ok=True)
+        guardar_npy(carpeta, 'ids.npy', self.ids)
+        guardar_npy(carpeta, 'matriz.npy', self.matriz)
+        self.atributos.guardar(carpeta)
+        guardar_json(carpeta, 'meta.json', {'n': len(self), 'dimension': self.dimension})
+
+    @classmethod
+    def cargar(cls, carpeta):
+        """Abre el índice guardado con ``mmap`` (las páginas se leen bajo demanda)."""
+        ids = np.load(os.path.join(carpeta, 'ids.npy'))
+        # Un arreglo vacío no se puede mapear
+        matriz = np.load(os.path.join(carpeta, 'matriz.npy'), mmap_mode='r' if len(ids) else None)
+        return cls(ids, matriz, Atributos.cargar(carpeta))
+
+    def vector_de(self, item_id):
+        pos = np.searchsorted(self.ids, item_id)
+        if pos >= len(self.ids) or self.ids[pos] != item_id:
+            return None
+        return self.matriz[pos]
+
+    def buscar(self, consultas, k=10, excluir=(), filtros=None):
+        """
+        Top-``k`` por similitud coseno para cada fila de ``consultas``.
+        Devuelve una lista (una por consulta) de pares ``(id, similitud)``.
+        """
+        consultas = normalizar_filas(np.atleast_2d(np.asarray(consultas, dtype=np.float32)))
+        if not len(self):
+            return [[] for _ in consultas]
+        if consultas.shape[1] != self.dimension:
+            raise ValueError(f'La consulta tiene dimensión {consultas.shape[1]} y el índice {self.dimension}')
+
+        mascara = self.atributos.mascara(filtros)
+        if excluir:
+            fuera = ~np.isin(self.ids, list(excluir))
+            mascara = fuera if mascara is None else mascara & fuera
+        if mascara is None:
+            posiciones, matriz = None, self.matriz
+        else:
+            posiciones = np.flatnonzero(mascara)
+            matriz = self.matriz[posiciones]
+
+        puntajes = consultas @ matriz.T
+        resultados = []
+        for fila, mejores in zip(puntajes, top_k(puntajes, k)):
+            ids = self.ids[mejores] if posiciones is None else self.ids[posiciones[mejores]]
+            resultados.append([(int(i), float(s)) for i, s in zip(ids, fila[mejores])])
+        return resultados
+
+
+# ============================================
+# ÍNDICE DEL PROCESO
+# ============================================
+
+_state = {'indice': None, 'marca': None, 'sincronizado': 0}
+_state_lock = threading.Lock()
+_version = [0]
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VECTOR_INDEX', {})}
+
+
+def _carpeta(config):
+    location = config['LOCATION']
+    if not location:
+        return None
+    return os.path.join(str(location), config['BACKEND'])
+
+
+def _marca_en_disco(carpeta):
+    try:
+        return os.stat(os.path.join(carpeta, 'meta.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _indice_exacto(carpeta):
+    if carpeta is None:
+        if _state['indice'] is None or _state['marca'] != _version[0]:
+            _state['indice'], _state['marca'] = IndiceVectorial.desde_bd(), _version[0]
+        return _state['indice']
+
+    marca = _marca_en_disco(carpeta)
+    if marca is None:
+        IndiceVectorial.desde_bd().guardar(carpeta)
+        marca = _marca_en_disco(carpeta)
+    if _state['indice'] is None or _state['marca'] != marca:
+        _state['indice'], _state['marca'] = IndiceVectorial.cargar(carpeta), marca
+    return _state['indice']
+
+
+def _indice_ivf(carpeta, config):
+    """IVF persistente: se abre del disco y se pone al día con las filas modificadas."""
+    from .ann import IndiceIVF
+
+    marca = _marca_en_disco(carpeta) if carpeta else 'memoria'
+    if _state['indice'] is None or _state['marca'] != marca:
+        if marca is None:
+            indice = IndiceIVF.desde_bd(nlist=config['NLIST'])
+            indice.guardar(carpeta)
+            marca = _marca_en_disco(carpeta)
+        elif carpeta:
+            indice = IndiceIVF.cargar(carpeta)
+        else:
+            indice = IndiceIVF.desde_bd(nlist=config['NLIST'])
+        _state.update(indice=indice, marca=marca, sincronizado=time.monotonic())
+
+    indice = _state['indice']
+    indice.nprobe = config['NPROBE']
+    if time.monotonic() - _state['sincronizado'] >= config['SYNC_INTERVAL']:
+        _state['sincronizado'] = time.monotonic()
+        if indice.sincronizar():
+            if indice.necesita_reentrenar(config['REBUILD_RATIO']):
+                indice = IndiceIVF.desde_bd(nlist=config['NLIST'])
+                indice.nprobe = config['NPROBE']
+                if carpeta:
+                    indice.guardar(carpeta)
+            elif carpeta and not indice.guardar_agregados(carpeta):
+                # Otro proceso reentrenó y guardó su base: se abre en la próxima consulta
+                _state.update(indice=indice, marca=None)
+                return indice
+            _state.update(indice=indice, marca=_marca_en_disco(carpeta) if carpeta else marca)
+    return indice
+
+
+def get_indice():
+    """Índice al día: se reconstruye, se vuelve a abrir del disco o se pone al día si cambiaron los datos."""
+    config = get_config()
+    carpeta = _carpeta(config)
+    with _state_lock:
+        if config['BACKEND'] == 'ivf':
+            return _indice_ivf(carpeta, config)
+        return _indice_exacto(carpeta)
+
+
+def reconstruir_indice():
+    """Reconstrucción completa del índice configurado (p. ej. tras una carga masiva)."""
+    config = get_config()
+    carpeta = _carpeta(config)
+    with _state_lock:
+        if config['BACKEND'] == 'ivf':
+            from .ann import IndiceIVF
+            indice = IndiceIVF.desde_bd(nlist=config['NLIST'])
+            indice.nprobe = config['NPROBE']
+        else:
+            indice = IndiceVectorial.desde_bd()
+        if carpeta:
+            indice.guardar(carpeta)
+            marca = _marca_en_disco(carpeta)
+        else:
+            marca = 'memoria' if config['BACKEND'] == 'ivf' else _version[0]
+        _state.update(indice=indice, marca=marca, sincronizado=time.monotonic())
+        return indice
+
+
+def invalidar_indice():
+    """
+    Marca el índice exacto como viejo en este proceso y borra su copia en disco
+    para los demás. El IVF no se invalida: se pone al día con ``updated_at``.
+    """
+    config = get_config()
+    if config['BACKEND'] == 'ivf':
+        return
+    with _state_lock:
+        _version[0] += 1
+        carpeta = _carpeta(config)
+        if carpeta:
+            try:
+                os.remove(os.path.join(carpeta, 'meta.json'))
+            except FileNotFoundError:
+                pass
+
+
+@receiver(setting_changed)
+def _reset_indice(setting, **kwargs):
+    if setting == 'VECTOR_INDEX':
+        with _state_lock:
+            _state.update(indice=None, marca=None, sincronizado=0)
+
+
+def similares_a_item(item_id, k=10, filtros=None):
+    indice = get_indice()
+    vector = indice.vector_de(item_id)
+    if vector is None:
+        return None
+    return indice.buscar(vector, k, excluir=[item_id], filtros=filtros)[0]
+
+
+def similares_a_textos(textos, k=10, filtros=None):
+    """Un resultado por texto; los textos sin embedding en caché se convierten en un solo lote."""
+    from .embeddings import embed_consultas
+
+    return get_indice().buscar(embed_consultas(textos), k, filtros=filtros)
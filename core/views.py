@@ -1,57 +1,41 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
-from .models import UserProfile, Place, Review, Route
+from .models import UserProfile, Place, Review, Route, RouteJob, TripItem
 from .forms import UserProfileForm, ReviewForm
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.conf import settings
 import json
-from django.http import JsonResponse
+import logging
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Count, Q, Avg
-from serpapi import GoogleSearch
 import re
+from .ai_cache import all_stats
+from .itinerary import agenerar_itinerario_stream, itinerario_en_cache, leer_parametros
+from .jobs import aencolar, aguardar_ruta
+from .categories import nombres_canonicos, nombres_categorias
+from .conditional import lugar_condicional, lugares_condicional, resenas_condicional
+from .pagination import CursorInvalido, pagina_por_cursor
+from .perf import get_config as config_perf, lentas
+from .place_search import buscar_lugares
+from .ratings import rating_actual
+from .page_cache import cachear_vista, estadisticas as estadisticas_paginas, etiqueta_lugar
+from .routers import lee_de_replica
+from .vectors import similares_a_item, similares_a_textos
+from .web_search import FaltaConfiguracion
 
 User = get_user_model()
-
-# Cargar variables desde apikey.env
-dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'openAI.env')
-load_dotenv(dotenv_path)
-
-# Inicializar cliente de OpenAI con la API key del archivo .env
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-
-# 🆕 FUNCIÓN AUXILIAR PARA ACTUALIZAR RATING (INCLUYE RATING INICIAL)
-def update_place_rating(place):
-    """
-    Actualiza el rating promedio de un lugar.
-    Incluye el rating inicial (ficticio) en el cálculo.
-    El rating inicial cuenta como 1 voto.
-    """
-    reviews = place.reviews.all()
-    
-    if reviews.exists():
-        # Sumar todas las calificaciones de reviews reales
-        total_sum = sum([r.qualification for r in reviews])
-        total_count = reviews.count()
-        
-        # SI el lugar tiene un rating inicial (ficticio), incluirlo como 1 voto
-        if place.rating_average > 0:
-            total_sum += float(place.rating_average)
-            total_count += 1
-        
-        # Calcular nuevo promedio
-        new_average = total_sum / total_count
-        place.rating_average = round(new_average, 2)
-    
-    place.save()
-    return place.rating_average
+logger = logging.getLogger(__name__)
 
 
+@lee_de_replica
+@cachear_vista('index')
 def index(request):
     """Vista principal - Home con lugares top"""
     # Obtener los 6 lugares mejor calificados
@@ -181,7 +165,8 @@ def donde_ir(request):
         "Naturaleza", "Aventura", "Cultura", "Gastronomía", "Vida nocturna",
         "Relax", "Historia", "Deportes", "Arte", "Compras", "Familiar"
     ]
-    return render(request, "core/donde_ir.html", {"tags": tags})
+    # El stream de la ruta solo conviene bajo ASGI (ver generar_ruta_ai_stream)
+    return render(request, "core/donde_ir.html", {"tags": tags, "streaming": isinstance(request, ASGIRequest)})
 
 
 @login_required
@@ -217,9 +202,10 @@ def profile(request):
     return render(request, 'core/profile.html', context)
 
 
+@lee_de_replica
 def public_profile(request, username):
     """Vista del perfil público de un usuario"""
-    user_obj = get_object_or_404(User, username=username)
+    user_obj = get_object_or_404(User.objects.select_related('profile'), username=username)
     profile = getattr(user_obj, 'profile', None)
     
     context = {
@@ -229,16 +215,81 @@ def public_profile(request, username):
     return render(request, 'core/public_profile.html', context)
 
 
+def _filtrar_reviews(request):
+    """Filtros del listado de reseñas (?place=<slug>&category=<nombre>&rating=<1-5>)."""
+    # user__profile: el avatar del autor viene en el mismo JOIN (sin una consulta por tarjeta)
+    qs = Review.objects.select_related('user__profile', 'place')
+    filtros = {}
+    if request.GET.get('place'):
+        filtros['place'] = request.GET['place']
+        qs = qs.filter(place__slug=filtros['place'])
+    if request.GET.get('category'):
+        filtros['category'] = request.GET['category']
+        qs = qs.filter(place__categories__name=filtros['category'])
+    if request.GET.get('rating', '').isdigit():
+        filtros['rating'] = int(request.GET['rating'])
+        qs = qs.filter(qualification=filtros['rating'])
+    return qs, filtros
+
+
+def _pagina_reviews(request):
+    """
+    Una página del listado filtrado y las URLs de la siguiente (o None): el
+    fragmento que pide el scroll infinito y la página completa del enlace
+    "Cargar más" (sin JavaScript).
+    """
+    qs, filtros = _filtrar_reviews(request)
+    try:
+        tamano = int(request.GET.get('size', settings.REVIEWS_PAGE_SIZE))
+    except ValueError:
+        tamano = settings.REVIEWS_PAGE_SIZE
+    tamano = max(1, min(tamano, settings.REVIEWS_MAX_PAGE_SIZE))
+
+    items, cursor = pagina_por_cursor(qs, request.GET.get('cursor'), tamano)
+    siguiente = {'next_url': None, 'next_page_url': None}
+    if cursor:
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        siguiente = {
+            'next_url': f"{reverse('reviews_fragment')}?{params.urlencode()}",
+            'next_page_url': f"{reverse('reviews')}?{params.urlencode()}",
+        }
+    return items, siguiente, filtros
+
+
+@lee_de_replica
+@resenas_condicional
 def reviews(request):
-    """Vista para listar todas las reviews"""
-    reviews_list = Review.objects.select_related('user', 'place').all()
+    """Vista para listar las reviews (una página; el resto llega con scroll infinito o "Cargar más")"""
+    try:
+        reviews_list, siguiente, filtros = _pagina_reviews(request)
+    except CursorInvalido:
+        return HttpResponseBadRequest("Cursor inválido")
     
     context = {
         'reviews': reviews_list,
+        **siguiente,
+        'filters': filtros,
+        'categories': nombres_categorias(),
+        'ratings': [value for value, _ in Review.QUALIFICATION_CHOICES],
     }
     return render(request, 'core/reviews_list.html', context)
 
 
+@lee_de_replica
+@resenas_condicional
+def reviews_fragment(request):
+    """Siguiente página de reseñas como HTML para añadir al final del listado."""
+    try:
+        reviews_list, siguiente, _ = _pagina_reviews(request)
+    except CursorInvalido:
+        return HttpResponseBadRequest("Cursor inválido")
+    return render(request, 'core/partials/review_cards.html', {
+        'reviews': reviews_list,
+        **siguiente,
+    })
+
+
 @login_required
 def write_review(request):
     """Vista para crear una nueva review"""
@@ -249,8 +300,8 @@ def write_review(request):
             review.user = request.user
             review.save()
             
-            # 🆕 ACTUALIZAR RATING (INCLUYE RATING INICIAL)
-            new_rating = update_place_rating(review.place)
+            # El rating del lugar ya se actualizó al guardar (core/ratings.py)
+            new_rating = rating_actual(review.place_id)
             
             messages.success(request, f'¡Tu reseña ha sido publicada! Nuevo rating: {new_rating}/5.0 ⭐')
             return redirect('reviews')
@@ -277,8 +328,8 @@ def edit_review(request, pk):
         if form.is_valid():
             form.save()
             
-            # 🆕 ACTUALIZAR RATING (INCLUYE RATING INICIAL)
-            new_rating = update_place_rating(review.place)
+            # El rating del lugar ya se actualizó al guardar (core/ratings.py)
+            new_rating = rating_actual(review.place_id)
             
             messages.success(request, f"Reseña actualizada correctamente. Nuevo rating: {new_rating}/5.0 ⭐")
             return redirect('reviews')
@@ -296,87 +347,40 @@ def delete_review(request, pk):
         return redirect('reviews')
 
     if request.method == 'POST':
-        place = review.place
+        place_id = review.place_id
         review.delete()
         
-        # 🆕 ACTUALIZAR RATING (INCLUYE RATING INICIAL)
-        new_rating = update_place_rating(place)
+        # El rating del lugar ya se actualizó al borrar (core/ratings.py)
+        new_rating = rating_actual(place_id)
         
         messages.success(request, f"Reseña eliminada. Nuevo rating: {new_rating}/5.0 ⭐")
         return redirect('reviews')
 
 
 @login_required
-def generar_ruta_ai(request):
-    """Toma las opciones del usuario y genera una respuesta de IA."""
+async def generar_ruta_ai(request):
+    """
+    Toma las opciones del usuario y encola la generación de la ruta.
+    Si la combinación ya está en caché responde con la ruta directamente.
+    Es asíncrona: bajo ASGI no ocupa un worker mientras espera la caché o la BD.
+    """
     if request.method == "POST":
         try:
-            ciudad = request.POST.get("ciudad")
-            pais = request.POST.get("pais")
-            presupuesto = request.POST.get("presupuesto")
-            dias = request.POST.get("dias")
-            intereses = request.POST.getlist("intereses")
-            evento = request.POST.get("evento")
-            barrio = request.POST.get("barrio")
-
-            prompt_usuario = (
-                f"Genera una ruta turística personalizada en {ciudad}, {pais}, "
-                f"para {dias} días, con un presupuesto aproximado de {presupuesto} por persona cada día. "
-                f"El viajero está interesado en eventos tipo {evento}. "
-                f"El hospedaje está en la zona {barrio}. "
-                f"Incluye actividades, costos estimados y lugares cercanos relevantes a mi zona de hospedaje." 
-                f"Necesito que devuelvas un texto conciso y completo con la información solicitada. " 
-                f"Separa los días de forma visible en la respuesta, y devuelve una propuesta para cada uno de los {dias} dias"
-                f"y termina siempre con una recomendación final o conclusión."
-            )
-
-            SERPAPI_KEY = os.getenv("SERPAPI_KEY")
-            if not SERPAPI_KEY:
-                return JsonResponse({"error": "Falta la clave SERPAPI_KEY en el archivo .env"}, status=500)
-
-            search = GoogleSearch({
-                "q": f"turismo en {ciudad} {pais} {evento} {', '.join(intereses)} 2025 actividades lugares recomendados",
-                "api_key": SERPAPI_KEY,
-                "num": 5
-            })
-            results = search.get_dict()
-
-            resumen_web = ""
-            if "organic_results" in results:
-                for r in results["organic_results"][:5]:
-                    title = r.get("title", "")
-                    snippet = r.get("snippet", "")
-                    link = r.get("link", "")
-                    resumen_web += f"\n- {title}: {snippet}\n{link}\n"
-
-            prompt_final = (
-                "Usa la siguiente información web reciente para construir una respuesta turística completa:\n"
-                f"{resumen_web}\n\n"
-                f"Solicitud del usuario:\n{prompt_usuario}"
-            )
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Eres un asistente experto en turismo colombiano."},
-                    {"role": "user", "content": prompt_final},
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
-
-            resultado = response.choices[0].message.content
-
-            Route.objects.create(
-                user=request.user,
-                city=ciudad,
-                country=pais,
-                days=int(dias),
-                budget=presupuesto,
-                ai_response=resultado
-            )
-
-            return JsonResponse({"respuesta": resultado})
+            user = await request.auser()
+            params = leer_parametros(request.POST)
+
+            # Combinaciones repetidas se sirven desde la caché sin llamar a SerpAPI/OpenAI
+            resultado = await sync_to_async(itinerario_en_cache)(params)
+            if resultado is not None:
+                await aguardar_ruta(user, params, resultado)
+                return JsonResponse({"respuesta": resultado, "cache": True})
+
+            job = await aencolar(user, params)
+            return JsonResponse({
+                "job_id": str(job.pk),
+                "estado": job.status,
+                "estado_url": reverse('route_job_status', args=[job.pk]),
+            }, status=202)
 
         except Exception as e:
             print(f"Error en generar_ruta_ai: {str(e)}")
@@ -387,73 +391,127 @@ def generar_ruta_ai(request):
     return JsonResponse({"error": "Método no permitido"}, status=405)
 
 
+def _sse(evento, data):
+    return f"event: {evento}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _aeventos_ruta(user, params):
+    """Eventos SSE: inicio → texto* → fin (o error). La ruta se guarda al terminar."""
+    yield _sse('inicio', {})
+    try:
+        partes = []
+        async for fragmento in agenerar_itinerario_stream(params):
+            partes.append(fragmento)
+            yield _sse('texto', {'t': fragmento})
+        await aguardar_ruta(user, params, ''.join(partes))
+        yield _sse('fin', {})
+    except Exception as e:
+        logger.exception("Error en generar_ruta_ai_stream")
+        yield _sse('error', {'error': f"No se pudo generar la ruta: {str(e)}"})
+
+
+@login_required
+async def generar_ruta_ai_stream(request):
+    """
+    Como ``generar_ruta_ai`` pero envía la respuesta del modelo por Server-Sent
+    Events. Solo bajo ASGI: con WSGI el stream tendría ocupado un worker durante
+    toda la búsqueda y la llamada al modelo, así que ahí responde como
+    ``generar_ruta_ai`` (trabajo en segundo plano). donde_ir.html solo usa el
+    stream cuando la página se sirvió por ASGI.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return await generar_ruta_ai(request)
+
+    try:
+        user = await request.auser()
+        params = leer_parametros(request.POST)
+        int(params['dias'])
+    except Exception as e:
+        return JsonResponse({"error": f"No se pudo generar la ruta: {str(e)}"}, status=400)
+
+    response = StreamingHttpResponse(_aeventos_ruta(user, params), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que nginx acumule la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def route_job_status(request, job_id):
+    """Estado de un trabajo de generación; incluye la ruta cuando ya terminó."""
+    job = get_object_or_404(RouteJob.objects.select_related('route'), pk=job_id, user=request.user)
+
+    data = {"job_id": str(job.pk), "estado": job.status}
+    if job.status == 'done':
+        data["respuesta"] = job.route.ai_response if job.route else ""
+    elif job.status == 'error':
+        data["error"] = job.error
+    return JsonResponse(data)
+
+
+@staff_member_required
+def ai_cache_stats(request):
+    """Aciertos, fallos y expulsiones de las cachés de IA de este proceso."""
+    return JsonResponse(all_stats())
+
+
+@staff_member_required
+def page_cache_stats(request):
+    """Aciertos y fallos de la caché de páginas y fragmentos de este proceso."""
+    return JsonResponse(estadisticas_paginas())
+
+
+@staff_member_required
+def slow_requests(request):
+    """Peticiones lentas de este proceso (core/perf.py); filtros ?vista= y ?min_ms=."""
+    peticiones = lentas()
+    vista = request.GET.get('vista')
+    if vista:
+        peticiones = [p for p in peticiones if p['vista'] == vista]
+    try:
+        min_ms = float(request.GET.get('min_ms', 0))
+    except ValueError:
+        return JsonResponse({'error': 'min_ms debe ser un número'}, status=400)
+    peticiones = [p for p in peticiones if p['total_ms'] >= min_ms]
+    config = config_perf()
+    return JsonResponse({
+        'slow_ms': config['SLOW_MS'],
+        'sample_rate': config['SAMPLE_RATE'],
+        'peticiones': peticiones,
+    })
+
+
+@lee_de_replica
+@lugares_condicional
+@cachear_vista('places')
 def places(request):
     # collect selected categories (supports repeated ?category=A&category=B and comma lists)
     selected = request.GET.getlist('category') or []
     if not selected and request.GET.get('category'):
         selected = [s.strip() for s in request.GET.get('category').split(',') if s.strip()]
 
-    # remove duplicates while preserving order (avoid duplicated pills)
-    from collections import OrderedDict
-    selected = list(OrderedDict.fromkeys([s for s in selected if s]))
+    # canonical Category.name (case/accent-insensitive), no duplicates (avoid duplicated pills)
+    selected = nombres_canonicos(selected)
 
     qs = Place.objects.all()
 
     # search bar: filter by text query
     search_query = request.GET.get('q', '').strip()
     if search_query:
-        qs = qs.filter(
-            Q(name__icontains=search_query) |
-            Q(short_description__icontains=search_query) |
-            Q(city__icontains=search_query) |
-            Q(department__icontains=search_query)
-    )
+        # FTS5 (sin tildes, por prefijo y ordenado por relevancia) con icontains de respaldo
+        qs = buscar_lugares(qs, search_query)
 
 
-    # detect whether Place has a ManyToManyField named 'categories'
-    has_m2m = False
-    try:
-        Place._meta.get_field('categories')
-        has_m2m = True
-    except Exception:
-        has_m2m = False
-
     if selected:
-        if has_m2m:
-            # require place to have at least all selected categories (AND)
-            qs = qs.annotate(
-                _match_count=Count('categories', filter=Q(categories__name__in=selected), distinct=True)
-            ).filter(_match_count=len(selected))
-        else:
-            # assume categories are in a comma-separated 'category' text field; require each to appear (AND)
-            for cat in selected:
-                qs = qs.filter(category__icontains=cat)
-
-    # build list of available categories for the filter UI
-    if has_m2m:
-        Category = Place._meta.get_field('categories').related_model
-        categories_list = list(Category.objects.values_list('name', flat=True).distinct())
-    else:
-        import re
-
-        def split_raw_categories(raw):
-            """
-            Separa una cadena de categorías tipo:
-            'Naturaleza / Aventura, Cultura & Gastronomía'
-            en ['Naturaleza', 'Aventura', 'Cultura', 'Gastronomía']
-            """
-            # Separadores típicos: coma, slash, ampersand, ' y '
-            parts = re.split(r'[,/&]| y ', raw, flags=re.IGNORECASE)
-            return [p.strip() for p in parts if p.strip()]
-
-        cats = set()
-        for raw in Place.objects.values_list('category', flat=True).distinct():
-            if not raw:
-                continue
-            for p in split_raw_categories(raw):
-                cats.add(p)
-
-        categories_list = sorted(cats)
+        # require place to have at least all selected categories (AND)
+        qs = qs.annotate(
+            _match_count=Count('categories', filter=Q(categories__name__in=selected), distinct=True)
+        ).filter(_match_count=len(selected))
+
+    # list of available categories for the filter UI (cached, invalidated on writes)
+    categories_list = nombres_categorias()
 
     # pass tuples (name, is_selected) to template to avoid fragile template comparisons
     categories = [(c, c in selected) for c in categories_list]
@@ -467,6 +525,9 @@ def places(request):
     return render(request, 'core/places.html', context)
 
 
+@lee_de_replica
+@lugar_condicional
+@cachear_vista('place_detail', etiquetas=lambda request, slug: [etiqueta_lugar(slug)])
 def place_detail(request, slug):
     """Vista de detalle de un lugar específico"""
     place = get_object_or_404(Place, slug=slug)
@@ -474,4 +535,71 @@ def place_detail(request, slug):
     context = {
         'place': place
     }
-    return render(request, 'core/place_detail.html', context)
\ No newline at end of file
+    return render(request, 'core/place_detail.html', context)
+
+# ============================================
+# EXPERIENCIAS SIMILARES (índice vectorial)
+# ============================================
+
+MAX_SIMILARES = 50
+
+
+def _k(request):
+    try:
+        return max(1, min(int(request.GET.get('k', 10)), MAX_SIMILARES))
+    except ValueError:
+        return 10
+
+
+def _filtros_similares(request):
+    """?place_type=hotel&city=Cali&max_cost=200000"""
+    filtros = {
+        'place_type': request.GET.get('place_type', '').strip(),
+        'city': request.GET.get('city', '').strip(),
+    }
+    try:
+        filtros['max_cost'] = float(request.GET['max_cost']) if request.GET.get('max_cost') else None
+    except ValueError:
+        filtros['max_cost'] = None
+    return {campo: valor for campo, valor in filtros.items() if valor not in ('', None)}
+
+
+def _serializar_similares(resultados):
+    items = TripItem.objects.in_bulk([pk for pk, _ in resultados])
+    return [
+        {
+            "id": pk,
+            "name": items[pk].name,
+            "place_type": items[pk].place_type,
+            "city": items[pk].city,
+            "country": items[pk].country,
+            "estimated_cost": items[pk].estimated_cost,
+            "score": round(score, 4),
+        }
+        for pk, score in resultados if pk in items
+    ]
+
+
+@login_required
+def trip_item_similar(request, pk):
+    """Experiencias más parecidas a un TripItem (similitud coseno de sus embeddings), con filtros opcionales."""
+    resultados = similares_a_item(pk, _k(request), _filtros_similares(request))
+    if resultados is None:
+        return JsonResponse({"error": "Este elemento no tiene embedding"}, status=404)
+    return JsonResponse({"resultados": _serializar_similares(resultados)})
+
+
+@login_required
+def trip_items_search(request):
+    """Experiencias más parecidas a un texto libre (?q=...)."""
+    texto = request.GET.get('q', '').strip()
+    if not texto:
+        return JsonResponse({"error": "Falta el parámetro q"}, status=400)
+    try:
+        resultados = similares_a_textos([texto], _k(request), _filtros_similares(request))[0]
+    except FaltaConfiguracion as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    except Exception as e:
+        logger.exception("Error en trip_items_search")
+        return JsonResponse({"error": f"No se pudo completar la búsqueda: {str(e)}"}, status=500)
+    return JsonResponse({"resultados": _serializar_similares(resultados)})
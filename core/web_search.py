@@ -0,0 +1,299 @@
+"""
+Contexto web para las rutas de IA (resultados orgánicos de Google vía SerpAPI).
+
+El resumen de una búsqueda cambia poco para la misma ciudad, tipo de evento e
+intereses, así que se guarda en la caché ``busquedas`` (más longeva que la de
+rutas) con stale-while-revalidate: pasado ``FRESH_TTL`` se sirve la copia
+vieja y se refresca en segundo plano. Una búsqueda lenta o fallida nunca
+bloquea la ruta más de ``TIMEOUT`` segundos; en ese caso se genera sin contexto.
+Los errores de SerpAPI no se guardan, y un resumen vacío solo se da por fresco
+``EMPTY_TTL`` segundos.
+
+Configuración en ``settings.WEB_SEARCH``::
+
+    WEB_SEARCH = {'BACKEND': 'serpapi', 'TIMEOUT': 6, 'FRESH_TTL': 86400, 'EMPTY_TTL': 300}
+
+``BACKEND = 'stub'`` devuelve resultados fijos sin red (tests y benchmarks).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .ai_cache import clave_parametros, get_cache
+from .perf import medir
+
+logger = logging.getLogger(__name__)
+
+
+class FaltaConfiguracion(Exception):
+    """Falta una clave o ajuste necesario para llamar a un servicio externo."""
+
+
+class BusquedaFallida(Exception):
+    """SerpAPI respondió con un error (cuota, parámetros...) en vez de resultados."""
+
+
+def construir_consulta(params):
+    p = params
+    return f"turismo en {p['ciudad']} {p['pais']} {p['evento']} {', '.join(p['intereses'])} 2025 actividades lugares recomendados"
+
+
+def clave_busqueda(params):
+    """Solo ciudad, país, evento e intereses afectan a la búsqueda."""
+    return clave_parametros({
+        'ciudad': params['ciudad'],
+        'pais': params['pais'],
+        'evento': params['evento'],
+        'intereses': params['intereses'],
+    })
+
+
+def formatear_resultados(results):
+    resumen_web = ""
+    if "organic_results" in results:
+        for r in results["organic_results"][:5]:
+            title = r.get("title", "")
+            snippet = r.get("snippet", "")
+            link = r.get("link", "")
+            resumen_web += f"\n- {title}: {snippet}\n{link}\n"
+    return resumen_web
+
+
+# ============================================
+# BACKENDS DE BÚSQUEDA
+# ============================================
+
+class SerpApiBackend:
+    """Google Search a través de SerpAPI (requiere SERPAPI_KEY)."""
+
+    ENDPOINT = "https://serpapi.com/search.json"
+
+    def __init__(self, **options):
+        pass
+
+    def _api_key(self):
+        serpapi_key = os.getenv("SERPAPI_KEY")
+        if not serpapi_key:
+            raise FaltaConfiguracion("Falta la clave SERPAPI_KEY en el archivo .env")
+        return serpapi_key
+
+    def search(self, query):
+        from serpapi import GoogleSearch
+
+        return GoogleSearch({"q": query, "api_key": self._api_key(), "num": 5}).get_dict()
+
+    async def asearch(self, query):
+        """Misma consulta que ``search`` con un cliente HTTP asíncrono (httpx)."""
+        import httpx
+
+        params = {"engine": "google", "q": query, "api_key": self._api_key(), "num": 5, "output": "json"}
+        async with httpx.AsyncClient(timeout=get_config()['TIMEOUT'] * 5) as http:
+            response = await http.get(self.ENDPOINT, params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+class StubBackend:
+    """Resultados deterministas sin red; ``STUB_LATENCY`` simula la espera de SerpAPI."""
+
+    def __init__(self, latency=0, **options):
+        self.latency = latency
+
+    def search(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._resultados(query)
+
+    async def asearch(self, query):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._resultados(query)
+
+    def _resultados(self, query):
+        return {
+            "organic_results": [
+                {
+                    "title": f"Resultado {i} para {query[:60]}",
+                    "snippet": "Actividades, lugares y eventos recomendados por viajeros.",
+                    "link": f"https://example.com/akua/{i}",
+                }
+                for i in range(1, 6)
+            ]
+        }
+
+
+BACKENDS = {
+    'serpapi': SerpApiBackend,
+    'stub': StubBackend,
+}
+
+DEFAULTS = {
+    'BACKEND': 'serpapi',
+    'TIMEOUT': 6,
+    'FRESH_TTL': 60 * 60 * 24,
+    'EMPTY_TTL': 60 * 5,      # un resumen sin resultados se vuelve a buscar pronto
+    'WORKERS': 4,
+    'STUB_LATENCY': 0,
+}
+
+_state = {}
+_state_lock = threading.Lock()
+_inflight = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'WEB_SEARCH', {})}
+
+
+def get_backend():
+    with _state_lock:
+        if 'backend' not in _state:
+            config = get_config()
+            _state['backend'] = BACKENDS[config['BACKEND']](latency=config['STUB_LATENCY'])
+        return _state['backend']
+
+
+def _executor():
+    with _state_lock:
+        if 'executor' not in _state:
+            _state['executor'] = ThreadPoolExecutor(
+                max_workers=get_config()['WORKERS'], thread_name_prefix='web-search'
+            )
+        return _state['executor']
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    if setting == 'WEB_SEARCH':
+        with _state_lock:
+            _state.pop('backend', None)
+
+
+# ============================================
+# BÚSQUEDA CON CACHÉ STALE-WHILE-REVALIDATE
+# ============================================
+
+def _entrada(resultados):
+    """Lo que se guarda en ``busquedas``; los errores de SerpAPI no se guardan."""
+    if 'error' in resultados:
+        raise BusquedaFallida(resultados['error'])
+    resumen = formatear_resultados(resultados)
+    config = get_config()
+    return {
+        'resumen': resumen,
+        'fresh_until': time.time() + (config['FRESH_TTL'] if resumen else config['EMPTY_TTL']),
+    }
+
+
+def refrescar(params):
+    """Consulta el backend y guarda el resumen como fresco. Devuelve el resumen."""
+    entrada = _entrada(get_backend().search(construir_consulta(params)))
+    get_cache('busquedas').set(clave_busqueda(params), entrada)
+    return entrada['resumen']
+
+
+def _refrescar_una_vez(key, params):
+    """Lanza el refresco en segundo plano; si ya hay uno en curso para ``key`` lo reutiliza."""
+    executor = _executor()
+    with _state_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = executor.submit(refrescar, params)
+            _inflight[key] = future
+            future.add_done_callback(lambda f: _terminar_refresco(key, f))
+    return future
+
+
+def _terminar_refresco(key, future):
+    _inflight.pop(key, None)
+    if future.exception() is not None:
+        logger.warning('No se pudo refrescar la búsqueda web %s: %s', key[:12], future.exception())
+
+
+def resumen_web(params):
+    """
+    Resumen de los primeros resultados web para la ruta.
+    Copia fresca → se devuelve; copia vieja → se devuelve y se refresca en
+    segundo plano; sin copia → se espera como mucho ``TIMEOUT`` segundos.
+    """
+    key = clave_busqueda(params)
+    entry = get_cache('busquedas').get(key)
+    if entry is not None:
+        if entry['fresh_until'] < time.time():
+            _refrescar_una_vez(key, params)
+        return entry['resumen']
+
+    future = _refrescar_una_vez(key, params)
+    try:
+        # El refresco corre en otro hilo: se mide lo que la petición espera
+        with medir('serpapi'):
+            return future.result(timeout=get_config()['TIMEOUT'])
+    except (FaltaConfiguracion, ImportError):
+        # Errores de instalación o configuración: que se vean, no se degradan a "sin contexto"
+        raise
+    except TimeoutError:
+        logger.warning('Búsqueda web lenta para %s; se genera la ruta sin contexto web', params['ciudad'])
+    except Exception as e:
+        logger.warning('Búsqueda web fallida para %s: %s', params['ciudad'], e)
+    return ""
+
+
+# ============================================
+# VERSIÓN ASÍNCRONA (vistas bajo ASGI)
+# ============================================
+
+_ainflight = {}
+
+
+async def arefrescar(params):
+    entrada = _entrada(await get_backend().asearch(construir_consulta(params)))
+    await sync_to_async(get_cache('busquedas').set)(clave_busqueda(params), entrada)
+    return entrada['resumen']
+
+
+def _arefrescar_una_vez(key, params):
+    """Una sola tarea de búsqueda por clave en este event loop."""
+    loop = asyncio.get_running_loop()
+    task = _ainflight.get((loop, key))
+    if task is None:
+        task = loop.create_task(arefrescar(params))
+        _ainflight[(loop, key)] = task
+        task.add_done_callback(lambda t: _aterminar_refresco(loop, key, t))
+    return task
+
+
+def _aterminar_refresco(loop, key, task):
+    _ainflight.pop((loop, key), None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning('No se pudo refrescar la búsqueda web %s: %s', key[:12], task.exception())
+
+
+async def aresumen_web(params):
+    """Versión asíncrona de ``resumen_web`` con el mismo comportamiento stale-while-revalidate."""
+    key = clave_busqueda(params)
+    entry = await sync_to_async(get_cache('busquedas').get)(key)
+    if entry is not None:
+        if entry['fresh_until'] < time.time():
+            _arefrescar_una_vez(key, params)
+        return entry['resumen']
+
+    task = _arefrescar_una_vez(key, params)
+    try:
+        # shield: si se agota el tiempo la búsqueda continúa y llena la caché
+        with medir('serpapi'):
+            return await asyncio.wait_for(asyncio.shield(task), get_config()['TIMEOUT'])
+    except (FaltaConfiguracion, ImportError):
+        raise
+    except asyncio.TimeoutError:
+        logger.warning('Búsqueda web lenta para %s; se genera la ruta sin contexto web', params['ciudad'])
+    except Exception as e:
+        logger.warning('Búsqueda web fallida para %s: %s', params['ciudad'], e)
+    return ""